@@ -13,4 +13,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CSA_Project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings
+
+from CSA_app.work_queue import lifespan
+
+# Starts and stops the queue backend (interaction replay and flushing in async mode)
+application = lifespan(django_application)
+
+if settings.CSA_WARM_UP_LLM:
+    from CSA_app.llm_registry import warm_up
+
+    warm_up()
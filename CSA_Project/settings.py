@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'CSA_app.middleware.RequestIdMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -90,13 +91,7 @@ WSGI_APPLICATION = 'CSA_Project.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# DATABASES is built from CSA_DB_PROFILE further down, once the environment is loaded.
 
 
 # Password validation
@@ -151,12 +146,63 @@ import os
 MEDIA_URL = '/media/'  # URL to access media files
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')  # Directory where media files are stored
 
+# Uploads are stored once per distinct content, with WhatsApp/web renditions (see CSA_app/storage.py)
+STORAGES = {
+    "default": {"BACKEND": "CSA_app.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
 from decouple import config, Csv
+from django.core.exceptions import ImproperlyConfigured
 
 # SECURITY
 SECRET_KEY = config("SECRET_KEY")
 DEBUG = config("DEBUG", default=False, cast=bool)
-ALLOWED_HOSTS = config("ALLOWED_HOSTS", cast=Csv)
+ALLOWED_HOSTS = config("ALLOWED_HOSTS", cast=Csv())
+
+# DATABASE
+# "sqlite": the local db.sqlite3 tuned for concurrent workers (see CSA_app/db.py)
+# "postgres": PostgreSQL with persistent, health-checked connections
+CSA_DB_PROFILE = config("CSA_DB_PROFILE", default="sqlite")
+
+if CSA_DB_PROFILE == "postgres":
+    CSA_DB_POOL = config("CSA_DB_POOL", default=False, cast=bool)  # psycopg 3 connection pool instead of persistent connections
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config("CSA_DB_NAME", default="csa"),
+            'USER': config("CSA_DB_USER", default="csa"),
+            'PASSWORD': config("CSA_DB_PASSWORD", default=""),
+            'HOST': config("CSA_DB_HOST", default="localhost"),
+            'PORT': config("CSA_DB_PORT", default="5432"),
+            # The pool manages connection lifetime itself
+            'CONN_MAX_AGE': 0 if CSA_DB_POOL else config("CSA_DB_CONN_MAX_AGE", default=300, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': config("CSA_DB_CONNECT_TIMEOUT", default=5, cast=int),
+                **({'pool': {'min_size': 2, 'max_size': config("CSA_DB_POOL_SIZE", default=10, cast=int)}} if CSA_DB_POOL else {}),
+            },
+        }
+    }
+elif CSA_DB_PROFILE == "sqlite":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config("CSA_DB_NAME", default=str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                # Take the write lock when the transaction starts instead of failing to upgrade a read lock
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': config("CSA_SQLITE_BUSY_TIMEOUT", default=20, cast=int),  # seconds
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unknown CSA_DB_PROFILE {CSA_DB_PROFILE!r}, use 'sqlite' or 'postgres'")
+
+# PRAGMAs applied to every new SQLite connection
+CSA_SQLITE_SYNCHRONOUS = config("CSA_SQLITE_SYNCHRONOUS", default="NORMAL")
+CSA_SQLITE_MMAP_SIZE = config("CSA_SQLITE_MMAP_SIZE", default=268435456, cast=int)  # bytes (256 MB)
+CSA_SQLITE_CACHE_SIZE = config("CSA_SQLITE_CACHE_SIZE", default=-64000, cast=int)  # negative means KiB
 
 # WHATSAPP & INSTAGRAM
 WHATSAPP_ACCESS_TOKEN = config("WHATSAPP_ACCESS_TOKEN")
@@ -164,9 +210,198 @@ WHATSAPP_PHONE_NUMBER_ID = config("WHATSAPP_PHONE_NUMBER_ID")
 AGENT_PHONE_NUMBER = config("AGENT_PHONE_NUMBER")
 WHATSAPP_CHANNEL_LINK = config("WHATSAPP_CHANNEL_LINK")
 INSTAGRAM_LINK = config("INSTAGRAM_LINK")
+WHATSAPP_GRAPH_API_URL = config("WHATSAPP_GRAPH_API_URL", default="https://graph.facebook.com/v18.0")
+WHATSAPP_SEND_CONCURRENCY = config("WHATSAPP_SEND_CONCURRENCY", default=8, cast=int)
+WHATSAPP_SEND_POOL_SIZE = config("WHATSAPP_SEND_POOL_SIZE", default=10, cast=int)
+WHATSAPP_SEND_TIMEOUT = config("WHATSAPP_SEND_TIMEOUT", default=10.0, cast=float)  # seconds
+WHATSAPP_SEND_MAX_RETRIES = config("WHATSAPP_SEND_MAX_RETRIES", default=3, cast=int)
+WHATSAPP_RETRY_AFTER_DEFAULT = config("WHATSAPP_RETRY_AFTER_DEFAULT", default=5.0, cast=float)
+WHATSAPP_RETRY_AFTER_MAX = config("WHATSAPP_RETRY_AFTER_MAX", default=60.0, cast=float)  # longer waits are dropped
 
 # GOOGLE
 GOOGLE_APPLICATION_CREDENTIALS = os.path.join(BASE_DIR, "CSA_app/credentials.json")
 PROJECT_ID = config("PROJECT_ID")
 LOCATION = config("LOCATION")
-GEMINI_API_KEY = config("GEMINI_API_KEY")
+GEMINI_API_KEY = config("GEMINI_API_KEY", default="")  # only needed once a message reaches Gemini
+GEMINI_MODEL = config("GEMINI_MODEL", default="gemini-2.0-flash")
+# Build the Gemini client and chains when a web worker starts instead of on its first message
+CSA_WARM_UP_LLM = config("CSA_WARM_UP_LLM", default=False, cast=bool)
+# Second model tried when the first fails, times out or has its circuit open (e.g. gemini-1.5-flash-8b)
+GEMINI_FALLBACK_MODEL = config("GEMINI_FALLBACK_MODEL", default="")
+
+# LLM RESILIENCE
+# Gemini calls get a deadline and a circuit breaker per model (see CSA_app/resilience.py).
+# When no model answers, turns are handled with local rules and the usual reply templates.
+CSA_LLM_TIMEOUT = config("CSA_LLM_TIMEOUT", default=15.0, cast=float)  # seconds per call
+CSA_LLM_MAX_RETRIES = config("CSA_LLM_MAX_RETRIES", default=1, cast=int)  # retries inside the Gemini client
+CSA_LLM_BREAKER_FAILURES = config("CSA_LLM_BREAKER_FAILURES", default=5, cast=int)  # consecutive, to open the circuit
+CSA_LLM_BREAKER_RESET = config("CSA_LLM_BREAKER_RESET", default=30.0, cast=float)  # seconds open before a probe call
+# Also start the fallback model when the first hasn't answered after this many seconds (0 turns hedging off)
+CSA_LLM_HEDGE_AFTER = config("CSA_LLM_HEDGE_AFTER", default=0.0, cast=float)
+CSA_LLM_MAX_CONCURRENCY = config("CSA_LLM_MAX_CONCURRENCY", default=32, cast=int)  # threads for sync calls
+
+# WEBHOOK QUEUE
+CSA_QUEUE_BACKEND = config("CSA_QUEUE_BACKEND", default="CSA_app.work_queue.DatabaseQueueBackend")
+CSA_QUEUE_MAX_ATTEMPTS = config("CSA_QUEUE_MAX_ATTEMPTS", default=5, cast=int)
+CSA_QUEUE_RETRY_BACKOFF = config("CSA_QUEUE_RETRY_BACKOFF", default=2.0, cast=float)  # seconds, doubled per attempt
+CSA_QUEUE_RETRY_BACKOFF_MAX = config("CSA_QUEUE_RETRY_BACKOFF_MAX", default=300.0, cast=float)
+CSA_QUEUE_VISIBILITY_TIMEOUT = config("CSA_QUEUE_VISIBILITY_TIMEOUT", default=300, cast=int)
+CSA_WORKER_CONCURRENCY = config("CSA_WORKER_CONCURRENCY", default=4, cast=int)
+CSA_WORKER_POLL_INTERVAL = config("CSA_WORKER_POLL_INTERVAL", default=1.0, cast=float)
+CSA_WORKER_HOUSEKEEPING_INTERVAL = config("CSA_WORKER_HOUSEKEEPING_INTERVAL", default=3600, cast=int)
+# Messages a customer sends in quick succession are answered as one turn, in order.
+# A turn starts once the customer has been quiet for CSA_COALESCE_WINDOW seconds (0 answers
+# each message as soon as possible), and at most CSA_COALESCE_MAX_WAIT seconds after its first message.
+CSA_COALESCE_WINDOW = config("CSA_COALESCE_WINDOW", default=2.0, cast=float)
+CSA_COALESCE_MAX_WAIT = config("CSA_COALESCE_MAX_WAIT", default=6.0, cast=float)
+# Conversations one ASGI process runs at once with CSA_QUEUE_BACKEND=CSA_app.work_queue.AsyncioQueueBackend
+CSA_ASYNC_MAX_IN_FLIGHT = config("CSA_ASYNC_MAX_IN_FLIGHT", default=200, cast=int)
+# Seconds the ASGI server waits for running conversations on shutdown
+CSA_ASYNC_SHUTDOWN_TIMEOUT = config("CSA_ASYNC_SHUTDOWN_TIMEOUT", default=10.0, cast=float)
+# Webhooks that could not be queued are written here and queued again by csa_worker
+CSA_WEBHOOK_SPOOL_DIR = config("CSA_WEBHOOK_SPOOL_DIR", default=os.path.join(BASE_DIR, "spool", "webhooks"))
+CSA_WEBHOOK_SPOOL_INTERVAL = config("CSA_WEBHOOK_SPOOL_INTERVAL", default=10.0, cast=float)  # seconds
+
+# METRICS
+# In-process Prometheus metrics, served on /metrics (and by csa_worker --metrics-port)
+CSA_METRICS_ENABLED = config("CSA_METRICS_ENABLED", default=True, cast=bool)
+CSA_METRICS_TOKEN = config("CSA_METRICS_TOKEN", default="")  # required: /metrics is a 404 until set; scrapers send "Authorization: Bearer <token>"
+
+# LOGGING
+# JSON lines written by a background thread (see CSA_app/log.py), rotated by size
+CSA_LOG_LEVEL = config("CSA_LOG_LEVEL", default="INFO")
+CSA_LOG_FILE = config("CSA_LOG_FILE", default=str(BASE_DIR / 'app.log'))
+CSA_LOG_MAX_BYTES = config("CSA_LOG_MAX_BYTES", default=10 * 1024 * 1024, cast=int)
+CSA_LOG_BACKUP_COUNT = config("CSA_LOG_BACKUP_COUNT", default=5, cast=int)
+CSA_LOG_CONSOLE = config("CSA_LOG_CONSOLE", default=False, cast=bool)  # also print readable lines to stderr
+CSA_LOG_DEBUG_SAMPLE_RATE = config("CSA_LOG_DEBUG_SAMPLE_RATE", default=0.1, cast=float)  # share of DEBUG records kept
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'correlation': {'()': 'CSA_app.log.CorrelationFilter'},
+        'sample_debug': {'()': 'CSA_app.log.SamplingFilter', 'rate': CSA_LOG_DEBUG_SAMPLE_RATE},
+    },
+    'formatters': {
+        'json': {'()': 'CSA_app.log.JsonFormatter'},
+        'plain': {'format': '%(asctime)s - %(levelname)s - %(name)s - %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+        'file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': CSA_LOG_FILE,
+            'maxBytes': CSA_LOG_MAX_BYTES,
+            'backupCount': CSA_LOG_BACKUP_COUNT,
+            'encoding': 'utf-8',
+            'formatter': 'json',
+        },
+        # Handlers are configured in name order, so the targets exist before "queue"
+        'queue': {
+            '()': 'CSA_app.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.file'] + (['cfg://handlers.console'] if CSA_LOG_CONSOLE else []),
+            'filters': ['sample_debug', 'correlation'],
+        },
+    },
+    'root': {'handlers': ['queue'], 'level': CSA_LOG_LEVEL},
+}
+
+# WEBHOOK DEDUPLICATION
+CSA_DEDUP_CACHE_SIZE = config("CSA_DEDUP_CACHE_SIZE", default=10000, cast=int)
+CSA_DEDUP_CACHE_TTL = config("CSA_DEDUP_CACHE_TTL", default=3600, cast=int)  # seconds
+CSA_DEDUP_RETENTION_DAYS = config("CSA_DEDUP_RETENTION_DAYS", default=7, cast=int)
+
+# INTENT CLASSIFICATION
+CSA_INTENT_FAST_PATH_THRESHOLD = config("CSA_INTENT_FAST_PATH_THRESHOLD", default=0.9, cast=float)
+CSA_INTENT_MODEL_PATH = config("CSA_INTENT_MODEL_PATH", default=os.path.join(BASE_DIR, "CSA_app/intent_model.pkl"))
+# One structured Gemini call for intent, entities and sentiment instead of two chained calls
+CSA_COMBINED_ANALYSIS = config("CSA_COMBINED_ANALYSIS", default=True, cast=bool)
+
+# LLM RESPONSE CACHE
+CSA_LLM_CACHE_ENABLED = config("CSA_LLM_CACHE_ENABLED", default=True, cast=bool)
+CSA_LLM_CACHE_BACKEND = config("CSA_LLM_CACHE_BACKEND", default="CSA_app.llm_cache.MemoryCacheBackend")
+CSA_LLM_CACHE_TTL = config("CSA_LLM_CACHE_TTL", default=86400, cast=int)  # seconds
+CSA_LLM_CACHE_MAX_ENTRIES = config("CSA_LLM_CACHE_MAX_ENTRIES", default=5000, cast=int)
+CSA_LLM_CACHE_SQLITE_PATH = config("CSA_LLM_CACHE_SQLITE_PATH", default=os.path.join(BASE_DIR, "llm_cache.sqlite3"))
+CSA_LLM_CACHE_REDIS_URL = config("CSA_LLM_CACHE_REDIS_URL", default="redis://localhost:6379/0")
+# Fuzzy matching for the intent and sentiment chains; set to 0 to only use exact matches
+CSA_LLM_CACHE_SIMILARITY_THRESHOLD = config("CSA_LLM_CACHE_SIMILARITY_THRESHOLD", default=0.85, cast=float)
+CSA_LLM_CACHE_FUZZY_INDEX_SIZE = config("CSA_LLM_CACHE_FUZZY_INDEX_SIZE", default=2000, cast=int)
+
+# PROPERTY RECOMMENDATIONS
+CSA_RECOMMENDATION_LIMIT = config("CSA_RECOMMENDATION_LIMIT", default=6, cast=int)
+CSA_RECOMMENDATION_PRICE_SPREAD = config("CSA_RECOMMENDATION_PRICE_SPREAD", default=0.2, cast=float)  # +/- 20% of the budget
+CSA_RECOMMENDATION_PRICE_WEIGHT = config("CSA_RECOMMENDATION_PRICE_WEIGHT", default=1.0, cast=float)
+CSA_RECOMMENDATION_LOCATION_WEIGHT = config("CSA_RECOMMENDATION_LOCATION_WEIGHT", default=1.0, cast=float)
+CSA_RECOMMENDATION_BEDROOMS_WEIGHT = config("CSA_RECOMMENDATION_BEDROOMS_WEIGHT", default=0.5, cast=float)
+
+# PROPERTY CATALOG
+# Serve property lookups and recommendations from an in-memory snapshot instead of the database
+CSA_PROPERTY_CATALOG = config("CSA_PROPERTY_CATALOG", default=True, cast=bool)
+CSA_CATALOG_CHECK_INTERVAL = config("CSA_CATALOG_CHECK_INTERVAL", default=5.0, cast=float)  # seconds between version checks
+# Property identifiers reserved per worker at a time
+CSA_IDENTIFIER_BLOCK_SIZE = config("CSA_IDENTIFIER_BLOCK_SIZE", default=20, cast=int)
+
+# PROPERTY LIST API
+CSA_PROPERTY_API_PAGE_SIZE = config("CSA_PROPERTY_API_PAGE_SIZE", default=20, cast=int)
+CSA_PROPERTY_API_MAX_PAGE_SIZE = config("CSA_PROPERTY_API_MAX_PAGE_SIZE", default=100, cast=int)
+CSA_PROPERTY_API_CACHE_TTL = config("CSA_PROPERTY_API_CACHE_TTL", default=300, cast=int)  # seconds; entries also expire when a property changes
+CSA_PROPERTY_API_MAX_AGE = config("CSA_PROPERTY_API_MAX_AGE", default=60, cast=int)  # Cache-Control max-age for clients and proxies
+
+# CACHE
+# Point this at a shared cache (e.g. django.core.cache.backends.redis.RedisCache) when running several workers
+CACHES = {
+    'default': {
+        'BACKEND': config("CSA_CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': config("CSA_CACHE_LOCATION", default="csa"),
+    }
+}
+
+# CONVERSATION STATE
+CSA_CONVERSATION_CACHE = config("CSA_CONVERSATION_CACHE", default="default")  # alias in CACHES
+CSA_CONVERSATION_CACHE_TTL = config("CSA_CONVERSATION_CACHE_TTL", default=1800, cast=int)  # seconds
+
+# CUSTOMERS
+CSA_DEFAULT_COUNTRY_CODE = config("CSA_DEFAULT_COUNTRY_CODE", default="234")  # for national numbers like 0803...
+CSA_CUSTOMER_CACHE_SIZE = config("CSA_CUSTOMER_CACHE_SIZE", default=10000, cast=int)
+# Saves in the same worker refresh the cache at once; this bounds how stale another worker's changes can be
+CSA_CUSTOMER_CACHE_TTL = config("CSA_CUSTOMER_CACHE_TTL", default=60, cast=int)
+
+# INTERACTION LOG
+CSA_INTERACTION_LOG_BUFFERED = config("CSA_INTERACTION_LOG_BUFFERED", default=True, cast=bool)
+CSA_INTERACTION_BUFFER_SIZE = config("CSA_INTERACTION_BUFFER_SIZE", default=50, cast=int)
+CSA_INTERACTION_FLUSH_INTERVAL = config("CSA_INTERACTION_FLUSH_INTERVAL", default=2.0, cast=float)  # seconds
+CSA_INTERACTION_SPOOL_DIR = config("CSA_INTERACTION_SPOOL_DIR", default=os.path.join(BASE_DIR, "spool"))
+# Without fsync a spooled row survives a process crash (it is in the OS page cache) but not a power loss or
+# kernel crash. With it, every interaction waits on the disk, which costs about as much as the insert it replaces.
+CSA_INTERACTION_SPOOL_FSYNC = config("CSA_INTERACTION_SPOOL_FSYNC", default=False, cast=bool)
+
+# MAKE.COM OUTBOX
+CSA_MAKE_WEBHOOK_URL = config("CSA_MAKE_WEBHOOK_URL", default="https://hook.eu2.make.com/v8aqa65woci0j31chn5iv2kxrh5nqvd9")
+CSA_MAKE_TIMEOUT = config("CSA_MAKE_TIMEOUT", default=15.0, cast=float)  # seconds
+CSA_OUTBOX_BATCH_SIZE = config("CSA_OUTBOX_BATCH_SIZE", default=50, cast=int)
+CSA_OUTBOX_CONCURRENCY = config("CSA_OUTBOX_CONCURRENCY", default=4, cast=int)
+CSA_OUTBOX_MAX_ATTEMPTS = config("CSA_OUTBOX_MAX_ATTEMPTS", default=8, cast=int)
+CSA_OUTBOX_RETRY_BACKOFF = config("CSA_OUTBOX_RETRY_BACKOFF", default=10.0, cast=float)  # seconds, doubled per attempt
+CSA_OUTBOX_RETRY_BACKOFF_MAX = config("CSA_OUTBOX_RETRY_BACKOFF_MAX", default=3600.0, cast=float)
+CSA_OUTBOX_POLL_INTERVAL = config("CSA_OUTBOX_POLL_INTERVAL", default=5.0, cast=float)
+CSA_OUTBOX_VISIBILITY_TIMEOUT = config("CSA_OUTBOX_VISIBILITY_TIMEOUT", default=300, cast=int)
+
+# PROPERTY IMAGES
+CSA_IMAGE_RENDITIONS = config("CSA_IMAGE_RENDITIONS", default=True, cast=bool)  # render on upload
+CSA_IMAGE_WHATSAPP_MAX_SIDE = config("CSA_IMAGE_WHATSAPP_MAX_SIDE", default=1600, cast=int)  # pixels
+CSA_IMAGE_WEB_MAX_SIDE = config("CSA_IMAGE_WEB_MAX_SIDE", default=1024, cast=int)
+CSA_IMAGE_QUALITY = config("CSA_IMAGE_QUALITY", default=80, cast=int)
+CSA_IMAGE_MIN_QUALITY = config("CSA_IMAGE_MIN_QUALITY", default=50, cast=int)
+CSA_IMAGE_MAX_BYTES = config("CSA_IMAGE_MAX_BYTES", default=300 * 1024, cast=int)  # quality is lowered until a rendition fits
+# Public origin of MEDIA_URL (e.g. https://csa.example.com) so WhatsApp can fetch property photos; empty sends text only
+CSA_PUBLIC_BASE_URL = config("CSA_PUBLIC_BASE_URL", default="")
+
+# INBOUND MEDIA
+# Photos customers send are matched to listings by perceptual hash (see CSA_app/media.py)
+CSA_IMAGE_MATCHING = config("CSA_IMAGE_MATCHING", default=True, cast=bool)
+CSA_IMAGE_MATCH_MAX_DISTANCE = config("CSA_IMAGE_MATCH_MAX_DISTANCE", default=10, cast=int)  # differing bits out of 64
+CSA_MEDIA_INBOX_DIR = config("CSA_MEDIA_INBOX_DIR", default=os.path.join(BASE_DIR, "spool", "media"))
+CSA_MEDIA_MAX_BYTES = config("CSA_MEDIA_MAX_BYTES", default=16 * 1024 * 1024, cast=int)
+CSA_MEDIA_CHUNK_SIZE = config("CSA_MEDIA_CHUNK_SIZE", default=64 * 1024, cast=int)
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CSA_Project.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if settings.CSA_WARM_UP_LLM:
+    from CSA_app.llm_registry import warm_up
+
+    warm_up()
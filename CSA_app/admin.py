@@ -1,6 +1,40 @@
 from django.contrib import admin
-from .models import Property
+from django.utils import timezone
+from .models import Property, WebhookJob, DeadLetterJob, OutboxMessage
 
 # Register your models here.
 
-admin.site.register(Property)
\ No newline at end of file
+admin.site.register(Property)
+
+
+@admin.register(WebhookJob)
+class WebhookJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'sender', 'status', 'attempts', 'available_at', 'created_at')
+    list_filter = ('status',)
+
+
+@admin.register(DeadLetterJob)
+class DeadLetterJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'attempts', 'last_error', 'enqueued_at', 'failed_at')
+    actions = ['requeue']
+
+    @admin.action(description="Requeue selected jobs")
+    def requeue(self, request, queryset):
+        from .work_queue import get_queue_backend
+
+        count = get_queue_backend().requeue_dead_letters(queryset)
+        self.message_user(request, f"Requeued {count} job(s).")
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'property', 'status', 'attempts', 'available_at', 'sent_at', 'last_error')
+    list_filter = ('status',)
+    actions = ['retry']
+
+    @admin.action(description="Retry selected messages")
+    def retry(self, request, queryset):
+        count = queryset.exclude(status=OutboxMessage.STATUS_SENT).update(
+            status=OutboxMessage.STATUS_PENDING, attempts=0, available_at=timezone.now(), locked_at=None
+        )
+        self.message_user(request, f"Queued {count} message(s) for another delivery.")
@@ -0,0 +1,154 @@
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import conversation, metrics
+from .log import correlation
+from .media import match_inbound_image
+from .customers import aget_customer
+from .dedup import claim_message, release_message
+from .intent_classifier import fast_path_classify, classifier_stats
+from .llm_registry import get_chain
+from .resilience import ModelUnavailable
+from .schemas import MessageAnalysis, PropertyDetails, parse_property_details
+from .webhook_parser import iter_webhook_events, group_by_sender, StatusUpdate
+from .whatsapp_handler import (
+    conversation_intent, degraded_analysis, degraded_sentiment, handle_status_update, handle_turn, reply_media_url,
+)
+from .whatsapp_sender import asend_whatsapp_message
+
+logger = logging.getLogger(__name__)
+
+# Async twin of whatsapp_handler.process_webhook_payload. Gemini and the Graph API
+# are awaited, so one event loop keeps many conversations in flight; the short
+# database work of a turn (the handlers themselves) runs through sync_to_async.
+
+
+async def aprocess_webhook_payload(data):
+    """Process every message and status update contained in a webhook payload."""
+    messages = []
+    for event in iter_webhook_events(data):
+        if isinstance(event, StatusUpdate):
+            handle_status_update(event)
+        elif await sync_to_async(claim_message)(event.message.get('id')):
+            messages.append(event)
+        else:
+            logger.info("Skipping redelivered message %s from %s", event.message.get('id'), event.sender)
+
+    failed = []
+    for turn in group_by_sender(messages):
+        if len(turn.messages) > 1:
+            metrics.coalesced_messages.inc(len(turn.messages) - 1)
+        try:
+            with correlation(message_id=",".join(turn.message_ids), sender=turn.sender):
+                await aprocess_whatsapp_message(turn.sender, turn.text, turn.full_message)
+        except Exception as e:
+            logger.error("Error processing messages from %s: %s", turn.sender, e, exc_info=True)
+            metrics.turn_failures.inc()
+            for message_id in turn.message_ids:
+                await sync_to_async(release_message)(message_id)
+            failed.append(turn.sender)
+
+    if failed:
+        raise RuntimeError(f"Processing failed for {len(failed)} sender(s): {', '.join(failed)}")
+
+
+async def aprocess_whatsapp_message(sender_phone, message_text, full_message):
+    start = time.perf_counter()
+    with metrics.span("customer_lookup"):
+        customer = await aget_customer(sender_phone)
+    with metrics.span("conversation_state"):
+        state = await sync_to_async(conversation.get_state)(customer)
+
+    intent = conversation_intent(state, message_text, full_message)
+    analysis = None
+    if intent is None:
+        with metrics.span("classify"):
+            intent, analysis = await aclassify_intent(message_text)
+
+    # Ask Gemini here, awaited, for what the handler would otherwise fetch with a blocking call
+    sentiment = None
+    with metrics.span("extract"):
+        if intent == "property_inquiry" and message_text and analysis is None:
+            analysis = await aextract_property_details(message_text)
+        elif intent == "post_inspection_feedback" and not (analysis is not None and analysis.sentiment):
+            try:
+                result = await get_chain("post_inspection").ainvoke({"message": message_text})
+                sentiment = result.content.strip().lower()
+            except ModelUnavailable as e:
+                sentiment = degraded_sentiment(message_text, e)
+
+    image_identifier = None
+    if intent == "property_inquiry" and 'image' in full_message:
+        # Download and hashing block; run them off the event loop
+        image_identifier = await sync_to_async(match_inbound_image, thread_sensitive=False)(full_message['image'])
+
+    response = await sync_to_async(handle_turn)(
+        customer, intent, message_text, full_message, analysis, state,
+        sentiment=sentiment, image_identifier=image_identifier,
+    )
+    media_url = await sync_to_async(reply_media_url)(intent, state)
+    with metrics.span("send"):
+        await asend_whatsapp_message(customer.phone_number, response, media_url=media_url)
+
+    metrics.turns.inc(intent=intent)
+    metrics.turn_seconds.observe(time.perf_counter() - start, intent=intent)
+
+
+async def aclassify_intent(message_text):
+    """``classify_intent`` with the Gemini calls awaited."""
+    start = time.perf_counter()
+    analysis = None
+
+    result = fast_path_classify(message_text)
+    if result:
+        intent, source = result.intent, result.source
+    else:
+        if settings.CSA_COMBINED_ANALYSIS:
+            analysis = await aanalyze_message(message_text)
+
+        if analysis:
+            intent, source = analysis.intent, "llm_combined"
+        else:
+            try:
+                intent_result = await get_chain("intent").ainvoke({"message": message_text})
+                intent, source = intent_result.content.strip(), "llm"
+            except ModelUnavailable as e:
+                analysis = degraded_analysis(message_text, e)
+                intent, source = analysis.intent, "local"
+
+    elapsed = time.perf_counter() - start
+    classifier_stats.record(source, elapsed)
+    logger.info("intent: %s (via %s in %.1fms)", intent, source, elapsed * 1000)
+    return intent, analysis
+
+
+async def aanalyze_message(message_text):
+    try:
+        analysis = await get_chain("message_analysis").ainvoke({"message": message_text})
+    except ModelUnavailable as e:
+        logger.warning("Combined message analysis unavailable: %s", e)
+        return None
+    except Exception as e:
+        logger.error("Combined message analysis failed, falling back to separate chains: %s", e)
+        return None
+
+    if not isinstance(analysis, MessageAnalysis):
+        logger.error("Combined message analysis returned no valid result: %r", analysis)
+        return None
+
+    return analysis
+
+
+async def aextract_property_details(message_text):
+    """The property details in a message, or empty details when the model output is unusable."""
+    try:
+        inquiry_details = await get_chain("property_inquiry").ainvoke({"message": message_text})
+        return parse_property_details(inquiry_details.content)
+    except ModelUnavailable as e:
+        return degraded_analysis(message_text, e, step="extract")
+    except Exception as e:
+        logger.error("Could not extract property details: %s", e, exc_info=True)
+        return PropertyDetails()
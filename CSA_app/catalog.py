@@ -0,0 +1,293 @@
+import heapq
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CatalogVersion, Property, normalize_location
+
+logger = logging.getLogger(__name__)
+
+
+CatalogEntry = namedtuple('CatalogEntry', [
+    'id', 'property_identifier', 'name', 'price', 'location', 'location_normalized', 'bedrooms', 'is_available',
+])
+
+CATALOG_FIELDS = CatalogEntry._fields
+
+
+def clean_identifier(identifier):
+    """Identifiers were saved both as '#12345' and '12345'; the catalog keys on the digits."""
+    return str(identifier).strip().lstrip('#').strip()
+
+
+def current_version():
+    return CatalogVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+def bump_catalog_version():
+    """Tell every worker the catalog changed. Returns the new version.
+
+    Called by the Property signals; code that writes properties without
+    signals (``bulk_create``, ``QuerySet.update``) must call it itself.
+    """
+    with transaction.atomic():
+        updated = CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1, updated_at=timezone.now())
+        if not updated:
+            CatalogVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+    return current_version()
+
+
+Snapshot = namedtuple('Snapshot', ['by_id', 'by_identifier', 'prices', 'ids'])
+
+EMPTY_SNAPSHOT = Snapshot({}, {}, array('d'), array('q'))
+
+
+class PropertyCatalog:
+    """Read-optimized, in-process copy of the property catalog.
+
+    Lookups by identifier go through a dict; budget searches go through a
+    sorted ``array('d')`` of prices of available listings with a parallel
+    ``array('q')`` of ids. All of it lives in one ``Snapshot`` that is never
+    changed: updates build a new one and swap it in with a single assignment,
+    so readers never take the lock and always see one consistent version.
+    Readers bind ``self._snapshot`` once per call.
+
+    The catalog is built on first use and kept current two ways: changes saved
+    by this process are applied incrementally from the Property signals, and
+    a version stamp in ``CatalogVersion`` (checked at most every
+    ``CSA_CATALOG_CHECK_INTERVAL`` seconds) triggers a rebuild when another
+    process changed the catalog.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._snapshot = EMPTY_SNAPSHOT
+        self._version = None
+        self._checked_at = 0.0
+
+    # Loading and freshness
+
+    def load(self):
+        version = current_version()
+        rows = Property.objects.values_list(*CATALOG_FIELDS).iterator(chunk_size=5000)
+        by_id = {row[0]: CatalogEntry(*row) for row in rows}
+        by_identifier = {clean_identifier(entry.property_identifier): entry for entry in by_id.values()}
+        available = sorted((float(entry.price), entry.id) for entry in by_id.values() if entry.is_available)
+        snapshot = Snapshot(
+            by_id, by_identifier, array('d', (price for price, _ in available)), array('q', (pk for _, pk in available)),
+        )
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._version = version
+            self._checked_at = time.monotonic()
+
+        logger.info("Property catalog loaded: %s listings (version %s)", len(by_id), version)
+
+    def ensure_fresh(self):
+        if self._version is None:
+            self.load()
+            return
+
+        if time.monotonic() - self._checked_at < settings.CSA_CATALOG_CHECK_INTERVAL:
+            return
+
+        version = current_version()
+        self._checked_at = time.monotonic()
+        if version != self._version:
+            logger.info("Property catalog version changed (%s -> %s), reloading", self._version, version)
+            self.load()
+
+    # Incremental updates from signals
+
+    def _remove_from_price_index(self, prices, ids, entry):
+        start = bisect_left(prices, float(entry.price))
+        end = bisect_right(prices, float(entry.price))
+        for position in range(start, end):
+            if ids[position] == entry.id:
+                del prices[position]
+                del ids[position]
+                return
+
+    def _without(self, snapshot, old):
+        """Copies of the snapshot's parts with ``old`` taken out."""
+        by_id, by_identifier = dict(snapshot.by_id), dict(snapshot.by_identifier)
+        prices, ids = array('d', snapshot.prices), array('q', snapshot.ids)
+        if old is not None:
+            del by_id[old.id]
+            by_identifier.pop(clean_identifier(old.property_identifier), None)
+            if old.is_available:
+                self._remove_from_price_index(prices, ids, old)
+        return by_id, by_identifier, prices, ids
+
+    def apply_save(self, entry):
+        with self._lock:
+            if self._version is None:
+                return
+            snapshot = self._snapshot
+            by_id, by_identifier, prices, ids = self._without(snapshot, snapshot.by_id.get(entry.id))
+
+            by_id[entry.id] = entry
+            by_identifier[clean_identifier(entry.property_identifier)] = entry
+            if entry.is_available:
+                position = bisect_right(prices, float(entry.price))
+                prices.insert(position, float(entry.price))
+                ids.insert(position, entry.id)
+
+            self._snapshot = Snapshot(by_id, by_identifier, prices, ids)
+
+    def apply_delete(self, pk):
+        with self._lock:
+            old = self._snapshot.by_id.get(pk)
+            if self._version is None or old is None:
+                return
+            self._snapshot = Snapshot(*self._without(self._snapshot, old))
+
+    def mark_version(self, previous, version):
+        """Record a version bump caused by this process, unless another process changed the catalog too."""
+        with self._lock:
+            if self._version == previous and version == previous + 1:
+                self._version = version
+
+    @property
+    def version(self):
+        return self._version
+
+    # Queries
+
+    def get(self, identifier):
+        if not identifier:
+            return None
+        return self._snapshot.by_identifier.get(clean_identifier(identifier))
+
+    def in_price_range(self, low, high):
+        snapshot = self._snapshot
+        start, end = bisect_left(snapshot.prices, float(low)), bisect_right(snapshot.prices, float(high))
+        return [snapshot.by_id[pk] for pk in snapshot.ids[start:end]]
+
+    def recommend(self, budget, location=None, bedrooms=None, limit=None):
+        """Same ranking as ``recommendations.recommend_properties``, computed from memory.
+
+        Candidates are visited outwards from the budget, closest price first, and
+        the walk stops as soon as no remaining listing could beat the current top
+        ``limit``.
+        """
+        limit = limit or settings.CSA_RECOMMENDATION_LIMIT
+        budget = float(budget)
+        spread = budget * settings.CSA_RECOMMENDATION_PRICE_SPREAD or 1.0
+        price_weight = settings.CSA_RECOMMENDATION_PRICE_WEIGHT
+        location_weight = settings.CSA_RECOMMENDATION_LOCATION_WEIGHT
+        bedrooms_weight = settings.CSA_RECOMMENDATION_BEDROOMS_WEIGHT
+
+        location = normalize_location(location)
+        bedrooms = int(bedrooms) if bedrooms else None
+        bonus_bound = (location_weight if location else 0.0) + (bedrooms_weight if bedrooms else 0.0)
+
+        by_id, _, prices, ids = self._snapshot
+        low, high = budget - spread, budget + spread
+        left = bisect_left(prices, budget) - 1
+        right = bisect_left(prices, budget)
+        start, end = bisect_left(prices, low), bisect_right(prices, high)
+
+        best = []  # min-heap of (score, -price, id)
+        while left >= start or right < end:
+            if right >= end or (left >= start and budget - prices[left] <= prices[right] - budget):
+                position, left = left, left - 1
+            else:
+                position, right = right, right + 1
+
+            price = prices[position]
+            price_score = price_weight * (1.0 - abs(price - budget) / spread)
+            if len(best) == limit and price_score + bonus_bound < best[0][0]:
+                break
+
+            entry = by_id[ids[position]]
+            score = price_score
+            if location and location in entry.location_normalized:
+                score += location_weight
+            if bedrooms:
+                if entry.bedrooms == bedrooms:
+                    score += bedrooms_weight
+                elif abs(entry.bedrooms - bedrooms) == 1:
+                    score += bedrooms_weight / 2
+
+            item = (score, -price, entry.id)
+            if len(best) < limit:
+                heapq.heappush(best, item)
+            elif item > best[0]:
+                heapq.heapreplace(best, item)
+
+        return [by_id[pk] for _, _, pk in sorted(best, reverse=True)]
+
+    def __len__(self):
+        return len(self._snapshot.by_id)
+
+
+_catalog = PropertyCatalog()
+
+
+def get_catalog():
+    """Return this worker's catalog, loading or refreshing it when needed."""
+    _catalog.ensure_fresh()
+    return _catalog
+
+
+def find_property(identifier):
+    """Look up a property by identifier, with or without its leading '#'. Returns None when there is none."""
+    if settings.CSA_PROPERTY_CATALOG:
+        return get_catalog().get(identifier)
+
+    identifier = clean_identifier(identifier)
+    return Property.objects.filter(property_identifier__in=[identifier, f"#{identifier}"]).first()
+
+
+# Changes reach the catalog only once their transaction commits, so a rolled-back save leaves no phantom entry
+
+def property_saved(instance):
+    # Copy the fields now, the instance may change again before the commit
+    entry = CatalogEntry(*(getattr(instance, field) for field in CATALOG_FIELDS))
+    transaction.on_commit(lambda: _catalog.apply_save(entry))
+    _bump_after_commit()
+
+
+def property_deleted(instance):
+    pk = instance.pk
+    transaction.on_commit(lambda: _catalog.apply_delete(pk))
+    _bump_after_commit()
+
+
+_pending = threading.local()
+
+
+def _bump_after_commit():
+    """Bump the version once the transaction commits, once per transaction.
+
+    Deleting a queryset sends one signal per row; they all share a single bump.
+    Each signal schedules a callback, but the callbacks of one transaction
+    share a batch (per thread and connection) and only the first to run bumps.
+    A rolled-back transaction drops its callbacks without running them, so its
+    batch stays open and the next transaction's callback does the bump.
+    """
+    alias = transaction.get_connection().alias
+    batches = _pending.__dict__.setdefault('batches', {})
+    batch = batches.get(alias)
+    if batch is None:
+        batch = batches[alias] = {'previous': _catalog.version}
+
+    def bump():
+        if batches.get(alias) is not batch:
+            return
+        del batches[alias]
+        version = bump_catalog_version()
+        if batch['previous'] is not None:
+            _catalog.mark_version(batch['previous'], version)
+
+    transaction.on_commit(bump, using=alias)
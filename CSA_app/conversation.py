@@ -0,0 +1,147 @@
+import logging
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from .models import ConversationState, Interaction
+from .schemas import parse_amount
+
+logger = logging.getLogger(__name__)
+
+# Where the customer is in the conversation
+STAGE_NEW = "new"
+STAGE_INQUIRING = "inquiring"          # asked about properties, no listing identified
+STAGE_VIEWING = "viewing"              # asked about a specific listing
+STAGE_RECOMMENDED = "recommended"      # received recommendations for a budget
+STAGE_FEEDBACK = "feedback"            # gave feedback after an inspection
+STAGE_PAYMENT = "payment"              # shared payment details
+
+# The question our last reply asked
+PENDING_BUDGET = "budget"
+PENDING_PAYMENT_METHOD = "payment_method"
+PENDING_REQUIREMENTS = "requirements"
+
+# A reply that is nothing but an amount: "45m", "₦45,000,000", "my budget is 45 million"
+BARE_AMOUNT_PATTERN = re.compile(
+    r"^\s*(?:my\s+)?(?:budget\s*(?:is|of|:|=)?\s*)?(?:₦|ngn|n)?\s*\d[\d,.]*\s*"
+    r"(?:k|m|mil|million|b|billion|thousand|naira)?\s*\.?\s*$",
+    re.IGNORECASE,
+)
+MONEY_PATTERN = re.compile(
+    r"₦|\bngn\b|\bnaira\b|\bbudget\b|\d\s*(?:k|m|mil|million|b|billion|thousand)\b", re.IGNORECASE
+)
+IDENTIFIER_PATTERN = re.compile(r"\bproperty\s*(?:id\s*)?#?\s*\d{4,}\b|#\s*\d{4,}\b", re.IGNORECASE)
+# National (080...) and international (+234..., 234...) numbers, with or without spaces
+PHONE_PATTERN = re.compile(r"(?:\+|\b00|\b234|\b0)[\d\s-]{9,}\d")
+
+# Words that answer "how would you like to pay?" and "what are you looking for?"
+PAYMENT_ANSWER_PATTERN = re.compile(
+    r"\b(?:cash|transfer|bank|card|cheque|outright|upfront|instal{1,2}ments?|mortgage|monthly|quarterly|"
+    r"spread|plan|deposit|pay\w*)\b",
+    re.IGNORECASE,
+)
+REQUIREMENTS_ANSWER_PATTERN = re.compile(
+    r"\b\d+\s*-?\s*(?:bed|bd|bath)|\b(?:bed(?:room)?s?|bath(?:room)?s?|rooms?|duplex|bungalow|flats?|"
+    r"apartments?|terrace[ds]?|detached|penthouse|studio|self[\s-]?contain\w*|land|plot|pool|parking|garden|"
+    r"gym|furnished|serviced|security|estate|close\s+to|near|around)\b",
+    re.IGNORECASE,
+)
+
+
+def _cache():
+    """The conversation cache, or None when it is local to this process.
+
+    Turns of one customer may run in different worker processes, so a
+    per-process cache could hand back a state older than the database row.
+    """
+    cache = caches[settings.CSA_CONVERSATION_CACHE]
+    return None if isinstance(cache, LocMemCache) else cache
+
+
+def _cache_key(customer_id):
+    return f"csa:conversation:{customer_id}"
+
+
+def get_state(customer):
+    """Return the customer's conversation state, from a shared cache when there is one.
+
+    A customer without a stored state starts from their latest inquiry, so
+    conversations that began before states were tracked keep their property.
+    """
+    cache = _cache()
+    key = _cache_key(customer.pk)
+    state = cache.get(key) if cache is not None else None
+    if state is not None:
+        return state
+
+    state = ConversationState.objects.filter(customer_id=customer.pk).first()
+    if state is None:
+        last_inquiry = (
+            Interaction.objects.filter(customer_id=customer.pk, Interaction_type="inquiry")
+            .order_by('-timestamp').values_list('property_id', flat=True).first()
+        )
+        state = ConversationState(customer_id=customer.pk, property_id=last_inquiry)
+        if last_inquiry:
+            state.stage = STAGE_VIEWING
+
+    if cache is not None:
+        cache.set(key, state, settings.CSA_CONVERSATION_CACHE_TTL)
+    return state
+
+
+def save_state(state):
+    """Write the state to the database, then to the shared cache."""
+    state.save()
+    cache = _cache()
+    if cache is not None:
+        cache.set(_cache_key(state.customer_id), state, settings.CSA_CONVERSATION_CACHE_TTL)
+
+
+def advance(state, stage, property_id=None, pending_question=""):
+    """Move the conversation to ``stage``. The last property is kept unless a new one is given."""
+    state.stage = stage
+    if property_id is not None:
+        state.property_id = property_id
+    state.pending_question = pending_question
+
+
+def looks_like_budget(text):
+    """True when ``text`` is an amount, or talks money without naming a listing or a phone number."""
+    if PHONE_PATTERN.search(text):
+        return False
+    if BARE_AMOUNT_PATTERN.match(text):
+        return True
+    return bool(MONEY_PATTERN.search(text)) and not IDENTIFIER_PATTERN.search(text)
+
+
+def expected_intent(state, message_text):
+    """The intent of a reply that answers our pending question, or None if it doesn't look like one.
+
+    Lets the handler skip classification when the customer does what we asked:
+    sends an amount after we asked for their budget, or names a way to pay or
+    what they are looking for after we asked for payment details or
+    requirements. Anything else is classified as usual.
+    """
+    text = (message_text or "").strip()
+    if not text or not state.pending_question:
+        return None
+
+    if state.pending_question == PENDING_BUDGET:
+        if not looks_like_budget(text):
+            return None
+        try:
+            amount = parse_amount(text)
+        except ValueError:
+            return None
+        # "3 bedrooms" is not a budget
+        return "budget_sharing" if amount and amount >= 1000 else None
+
+    if "?" in text:
+        return None
+    if state.pending_question == PENDING_PAYMENT_METHOD and PAYMENT_ANSWER_PATTERN.search(text):
+        return "payment_method"
+    if state.pending_question == PENDING_REQUIREMENTS and REQUIREMENTS_ANSWER_PATTERN.search(text):
+        return "property_inquiry"
+    return None
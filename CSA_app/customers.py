@@ -0,0 +1,56 @@
+from django.conf import settings
+
+from .lru import LRUCache
+from .models import Customer
+from .phones import normalize_phone
+
+CACHED_FIELDS = ('id', 'name', 'budget', 'phone_number', 'created_at', 'preferences')
+
+# phone number -> row values of the customer, per worker
+_customers = LRUCache(maxsize=settings.CSA_CUSTOMER_CACHE_SIZE, ttl=settings.CSA_CUSTOMER_CACHE_TTL)
+
+
+def _remember(customer):
+    _customers.set(customer.phone_number, tuple(getattr(customer, field) for field in CACHED_FIELDS))
+
+
+def get_customer(phone_number):
+    """Return the customer for a WhatsApp sender, creating them on their first message.
+
+    A returning customer costs no query while cached in this worker, and one
+    query otherwise. Creation relies on the unique phone number, so two workers
+    racing on a customer's first messages end up with the same row.
+    """
+    phone_number = normalize_phone(phone_number)
+    customer = _cached_customer(phone_number)
+    if customer is None:
+        customer, created = Customer.objects.get_or_create(phone_number=phone_number)
+        _remember(customer)
+    return customer
+
+
+async def aget_customer(phone_number):
+    """``get_customer`` for the async pipeline."""
+    phone_number = normalize_phone(phone_number)
+    customer = _cached_customer(phone_number)
+    if customer is None:
+        customer, created = await Customer.objects.aget_or_create(phone_number=phone_number)
+        _remember(customer)
+    return customer
+
+
+def _cached_customer(phone_number):
+    values = _customers.get(phone_number)
+    if values is None:
+        return None
+    # from_db builds a saved instance without a query; copy the JSON so callers can't mutate the cache
+    values = values[:-1] + (dict(values[-1] or {}),)
+    return Customer.from_db('default', CACHED_FIELDS, values)
+
+
+def customer_saved(instance):
+    _remember(instance)
+
+
+def customer_deleted(instance):
+    _customers.discard(instance.phone_number)
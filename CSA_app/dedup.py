@@ -0,0 +1,59 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .lru import LRUCache
+from .models import ProcessedMessage
+
+logger = logging.getLogger(__name__)
+
+# Redeliveries usually arrive within minutes, so most of them stop here without a query.
+_seen_messages = LRUCache(maxsize=settings.CSA_DEDUP_CACHE_SIZE, ttl=settings.CSA_DEDUP_CACHE_TTL)
+
+
+def claim_message(message_id, job_id=None):
+    """Return True the first time a WhatsApp message id is seen and False for redeliveries.
+
+    The in-process cache answers repeats seen by this worker; the unique
+    constraint on ``ProcessedMessage`` settles it across workers. A message
+    already claimed by the same queue job ``job_id`` is claimed again: the job
+    was reclaimed after its worker died or its lease ran out mid-turn, and the
+    message was never answered.
+    """
+    if not message_id:
+        return True
+
+    if not _seen_messages.add(message_id, job_id):
+        return job_id is not None and _seen_messages.get(message_id) == job_id
+
+    try:
+        with transaction.atomic():
+            ProcessedMessage.objects.create(message_id=message_id, job_id=job_id)
+    except IntegrityError:
+        owner = ProcessedMessage.objects.filter(message_id=message_id).values_list('job_id', flat=True).first()
+        _seen_messages.set(message_id, owner)
+        return job_id is not None and owner == job_id
+    except Exception:
+        # Nothing was recorded (e.g. "database is locked"); a retry must be able to claim it
+        _seen_messages.discard(message_id)
+        raise
+
+    return True
+
+
+def release_message(message_id):
+    """Forget a claimed message so a retry of its job can process it again."""
+    _seen_messages.discard(message_id)
+    ProcessedMessage.objects.filter(message_id=message_id).delete()
+
+
+def prune_processed_messages():
+    """Delete message ids older than ``CSA_DEDUP_RETENTION_DAYS``."""
+    cutoff = timezone.now() - timedelta(days=settings.CSA_DEDUP_RETENTION_DAYS)
+    deleted, _ = ProcessedMessage.objects.filter(processed_at__lt=cutoff).delete()
+    if deleted:
+        logger.info("Pruned %s processed message id(s)", deleted)
+    return deleted
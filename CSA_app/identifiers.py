@@ -0,0 +1,94 @@
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import IdentifierSequence, Property
+
+PROPERTY_SEQUENCE = 'property'
+
+# The old generator handed out random numbers between 10000 and 99999
+FIRST_PROPERTY_IDENTIFIER = 100000
+
+
+def numeric_identifier(identifier):
+    """Number of an identifier such as '100042' or '#100042', or None."""
+    digits = identifier.lstrip('#')
+    return int(digits) if digits.isdigit() else None
+
+
+def highest_property_identifier():
+    """Largest numeric identifier in use, ignoring a leading '#'."""
+    highest = 0
+    for identifier in Property.objects.values_list('property_identifier', flat=True).iterator(chunk_size=5000):
+        number = numeric_identifier(identifier)
+        if number is not None:
+            highest = max(highest, number)
+    return highest
+
+
+def allocate_identifiers(count, name=PROPERTY_SEQUENCE):
+    """Reserve ``count`` consecutive numbers from a sequence and return them as a range.
+
+    The increment is a single UPDATE, so concurrent callers (threads, workers or
+    import jobs) always get disjoint ranges. Numbers of a range that is never
+    used are simply skipped.
+    """
+    with transaction.atomic():
+        updated = IdentifierSequence.objects.filter(name=name).update(next_value=F('next_value') + count)
+        if not updated:
+            start = max(highest_property_identifier() + 1, FIRST_PROPERTY_IDENTIFIER)
+            try:
+                with transaction.atomic():
+                    IdentifierSequence.objects.create(name=name, next_value=start + count)
+                return range(start, start + count)
+            except IntegrityError:
+                # Another process created the sequence first
+                IdentifierSequence.objects.filter(name=name).update(next_value=F('next_value') + count)
+        end = IdentifierSequence.objects.filter(name=name).values_list('next_value', flat=True).get()
+    return range(end - count, end)
+
+
+def advance_sequence(minimum, name=PROPERTY_SEQUENCE):
+    """Move a sequence forward so it never hands out a number below ``minimum``.
+
+    Used when identifiers are assigned outside the sequence, e.g. explicit
+    values from an import file. A missing sequence is left alone: it starts
+    past the highest identifier in use when it is created.
+    """
+    IdentifierSequence.objects.filter(name=name, next_value__lt=minimum).update(next_value=minimum)
+
+
+class BlockAllocator:
+    """Hands out identifiers from blocks reserved with ``allocate_identifiers``.
+
+    Saving one property at a time then costs a sequence UPDATE only once per
+    ``block_size`` properties. Inside a transaction a single number is reserved
+    instead: a rollback would also undo the reservation of a cached block, and
+    its numbers could then be handed out twice.
+    """
+
+    def __init__(self, name=PROPERTY_SEQUENCE, block_size=None):
+        self.name = name
+        self.block_size = block_size or settings.CSA_IDENTIFIER_BLOCK_SIZE
+        self._block = iter(())
+        self._lock = threading.Lock()
+
+    def next(self):
+        if transaction.get_connection().in_atomic_block:
+            return allocate_identifiers(1, self.name)[0]
+
+        with self._lock:
+            value = next(self._block, None)
+            if value is None:
+                self._block = iter(allocate_identifiers(self.block_size, self.name))
+                value = next(self._block)
+            return value
+
+
+_property_allocator = BlockAllocator()
+
+
+def next_property_identifier():
+    return _property_allocator.next()
@@ -0,0 +1,212 @@
+import logging
+import os
+import pickle
+import re
+import threading
+from collections import namedtuple, defaultdict
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+INTENTS = (
+    "property_inquiry",
+    "property_recommendation",
+    "budget_sharing",
+    "post_inspection_feedback",
+    "payment_method",
+    "general_query",
+)
+
+Classification = namedtuple('Classification', ['intent', 'confidence', 'source'])
+
+# (intent, pattern, confidence). The first pattern that matches wins.
+RULES = [
+    (
+        "property_inquiry",
+        re.compile(r"\bproperty\s*(?:id\s*)?#?\s*\d{4,}\b|#\d{4,}\b", re.IGNORECASE),
+        0.95,
+    ),
+    (
+        "budget_sharing",
+        re.compile(
+            r"^\s*(?:my\s+)?(?:budget\s*(?:is|of|:|=)?\s*)?(?:₦|ngn|n|\$)?\s*\d[\d,.]*\s*"
+            r"(?:k|m|mil|million|thousand|naira)?\s*\.?\s*$",
+            re.IGNORECASE,
+        ),
+        0.95,
+    ),
+    (
+        "general_query",
+        re.compile(
+            r"^\s*(?:hi+|hello+|hey+|good\s+(?:morning|afternoon|evening|day)|thanks?(?:\s+you)?|"
+            r"thank\s+you(?:\s+so\s+much)?|ok(?:ay)?|alright)\s*[!.?]*\s*$",
+            re.IGNORECASE,
+        ),
+        0.95,
+    ),
+    (
+        "payment_method",
+        re.compile(
+            r"\b(?:bank\s+transfer|instal{1,2}ments?|payment\s+plan|pay\s+outright|outright\s+payment|"
+            r"mortgage|pay\s+(?:by|with|via)\s+(?:card|cash|transfer))\b",
+            re.IGNORECASE,
+        ),
+        0.85,
+    ),
+    (
+        "post_inspection_feedback",
+        re.compile(
+            r"\b(?:after|during|from)\s+the\s+inspection\b|\bi\s+(?:liked|loved|hated|didn'?t\s+like)\s+the\s+"
+            r"(?:house|property|apartment|flat|place)\b",
+            re.IGNORECASE,
+        ),
+        0.85,
+    ),
+]
+
+
+# Looser keyword rules, only used when no model is available (see resilience.py)
+KEYWORD_RULES = [
+    ("post_inspection_feedback", re.compile(r"\binspect", re.IGNORECASE)),
+    ("payment_method", re.compile(r"\bpay|\binstal{1,2}ments?\b|\bmortgage\b", re.IGNORECASE)),
+    ("budget_sharing", re.compile(r"\bbudget\b|\bcan afford\b", re.IGNORECASE)),
+    ("property_recommendation", re.compile(
+        r"\b(?:recommend|looking for|show me|options|bed(?:room)?s?|flats?|duplex|apartments?|houses?|rent|buy)\b",
+        re.IGNORECASE,
+    )),
+]
+
+
+def classify_with_rules(message_text):
+    for intent, pattern, confidence in RULES:
+        if pattern.search(message_text):
+            return Classification(intent, confidence, "rules")
+    return None
+
+
+def classify_with_keywords(message_text):
+    """Best local guess: the rules, then the keyword rules, else ``general_query``. Never returns None."""
+    result = classify_with_rules(message_text)
+    if result:
+        return result
+    for intent, pattern in KEYWORD_RULES:
+        if pattern.search(message_text):
+            return Classification(intent, 0.5, "keywords")
+    return Classification("general_query", 0.0, "keywords")
+
+
+class IntentModel:
+    """Optional TF-IDF + logistic regression model trained on past interactions."""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    @classmethod
+    def train(cls, texts, labels):
+        # scikit-learn is only needed to train or use the model, so it is imported lazily.
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+
+        pipeline = make_pipeline(
+            TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, min_df=1),
+            LogisticRegression(max_iter=1000, class_weight="balanced"),
+        )
+        pipeline.fit(texts, labels)
+        return cls(pipeline)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls(pickle.load(f))
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self.pipeline, f)
+
+    def predict(self, message_text):
+        probabilities = self.pipeline.predict_proba([message_text])[0]
+        best = probabilities.argmax()
+        return Classification(str(self.pipeline.classes_[best]), float(probabilities[best]), "model")
+
+
+_model = None
+_model_loaded = False
+_model_lock = threading.Lock()
+
+
+def get_intent_model():
+    """Load the trained model from ``CSA_INTENT_MODEL_PATH`` once, if there is one."""
+    global _model, _model_loaded
+    if not _model_loaded:
+        with _model_lock:
+            if not _model_loaded:
+                path = settings.CSA_INTENT_MODEL_PATH
+                if path and os.path.exists(path):
+                    try:
+                        _model = IntentModel.load(path)
+                        logger.info("Loaded intent model from %s", path)
+                    except Exception as e:
+                        logger.error("Could not load intent model from %s: %s", path, e)
+                _model_loaded = True
+    return _model
+
+
+def fast_path_classify(message_text, threshold=None):
+    """Classify a message locally. Returns None when the LLM should decide."""
+    if not message_text:
+        return None
+
+    threshold = settings.CSA_INTENT_FAST_PATH_THRESHOLD if threshold is None else threshold
+
+    result = classify_with_rules(message_text)
+    if result and result.confidence >= threshold:
+        return result
+
+    model = get_intent_model()
+    if model is not None:
+        try:
+            result = model.predict(message_text)
+        except Exception as e:
+            logger.error("Intent model prediction failed: %s", e)
+            return None
+        if result.confidence >= threshold:
+            return result
+
+    return None
+
+
+class ClassifierStats:
+    """Counts how many messages each path classified and how long it took."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = defaultdict(int)
+            self.seconds = defaultdict(float)
+
+    def record(self, source, elapsed):
+        with self._lock:
+            self.counts[source] += 1
+            self.seconds[source] += elapsed
+        metrics.intent_sources.inc(source=source)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                source: {
+                    "count": count,
+                    "avg_ms": self.seconds[source] * 1000 / count,
+                }
+                for source, count in self.counts.items()
+            }
+
+
+classifier_stats = ClassifierStats()
@@ -0,0 +1,286 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DataError, IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import metrics
+from .models import Interaction
+
+logger = logging.getLogger(__name__)
+
+
+class InteractionLog:
+    """Buffers Interaction rows and writes them with one ``bulk_create``.
+
+    Each row is appended to a per-process spool file (JSON lines) before it is
+    buffered, so a crash loses nothing: ``recover()`` replays spool files of
+    processes that are gone. Rows carry a ``log_id`` and are inserted with
+    ``ignore_conflicts``, so a spool replayed after its rows already reached
+    the database does not duplicate them. Rows the database rejects, e.g. for
+    a customer deleted while the row was buffered, are moved to a ``.bad``
+    file next to the spools instead of holding back the others.
+
+    The buffer is flushed once it holds ``CSA_INTERACTION_BUFFER_SIZE`` rows,
+    when ``flush_if_due`` runs after ``CSA_INTERACTION_FLUSH_INTERVAL``
+    seconds, and on ``flush()``.
+    """
+
+    def __init__(self, spool_dir=None, buffer_size=None, flush_interval=None):
+        self.spool_dir = str(spool_dir or settings.CSA_INTERACTION_SPOOL_DIR)
+        self.buffer_size = buffer_size or settings.CSA_INTERACTION_BUFFER_SIZE
+        self.flush_interval = flush_interval or settings.CSA_INTERACTION_FLUSH_INTERVAL
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer = []
+        self._oldest = None
+        self._spool = None
+        self._generation = 0
+        self._written_spools = []
+
+    def _spool_path(self, generation):
+        pid, token = _process_owner()
+        return os.path.join(self.spool_dir, f"interactions-{pid}-{token}-{generation}.jsonl")
+
+    def _open_spool(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._generation += 1
+        self._spool = open(self._spool_path(self._generation), 'a', encoding='utf-8')
+
+    def record(self, customer, interaction_type, notes=None, property_id=None):
+        row = {
+            "log_id": uuid.uuid4().hex,
+            "customer_id": customer.pk,
+            "property_id": property_id,
+            "Interaction_type": interaction_type,
+            "notes": notes,
+            "timestamp": timezone.now().isoformat(),
+        }
+        with self._lock:
+            if self._spool is None:
+                self._open_spool()
+            self._spool.write(json.dumps(row) + "\n")
+            self._spool.flush()
+            if settings.CSA_INTERACTION_SPOOL_FSYNC:
+                os.fsync(self._spool.fileno())
+
+            self._buffer.append(row)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._buffer) >= self.buffer_size
+
+        if full:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        if self._oldest is not None and time.monotonic() - self._oldest >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._buffer:
+                    return 0
+                rows, self._buffer, self._oldest = self._buffer, [], None
+                # New rows go to a fresh spool file; this one is removed once its rows are written.
+                # After a failed flush the rows may all be in files closed already.
+                if self._spool is not None:
+                    self._spool.close()
+                    self._written_spools.append(self._spool.name)
+                    self._spool = None
+
+            try:
+                with metrics.span("interaction_flush"):
+                    rejected = write_rows(rows)
+            except Exception as e:
+                logger.error("Could not write %s interaction(s), keeping them for the next flush: %s", len(rows), e)
+                with self._lock:
+                    self._buffer = rows + self._buffer
+                    self._oldest = time.monotonic()
+                return 0
+
+            if rejected:
+                pid, token = _process_owner()
+                self._set_aside(rejected, os.path.join(self.spool_dir, f"interactions-{pid}-{token}.bad"))
+            for path in self._written_spools:
+                os.remove(path)
+            self._written_spools = []
+            return len(rows) - len(rejected)
+
+    def _set_aside(self, rows, path):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+        logger.error("%s interaction(s) were rejected by the database, moved to %s", len(rows), path)
+
+    def recover(self):
+        """Replay spool files left behind by processes that are no longer running.
+
+        Each file is handled on its own: one that cannot be written now is kept
+        for the next run and the others are still replayed.
+        """
+        recovered = 0
+        for path in glob.glob(os.path.join(self.spool_dir, "interactions-*.jsonl")):
+            if _spool_in_use(path):
+                continue
+
+            try:
+                with open(path, encoding='utf-8') as f:
+                    # A crash can leave a partly written last line
+                    rows = []
+                    for line in f:
+                        try:
+                            rows.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            logger.warning("Skipping a damaged line in %s", path)
+            except FileNotFoundError:
+                # Another process starting up replayed it first
+                continue
+            try:
+                rejected = write_rows(rows)
+            except Exception as e:
+                logger.error("Could not replay %s, keeping it for the next run: %s", path, e)
+                continue
+
+            if rejected:
+                self._set_aside(rejected, path[:-len(".jsonl")] + ".bad")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            recovered += len(rows) - len(rejected)
+
+        if recovered:
+            logger.info("Recovered %s interaction(s) from spool files", recovered)
+        return recovered
+
+    def discard(self, customer_ids):
+        """Drop the spooled rows of ``customer_ids``, e.g. before those customers are deleted.
+
+        Call ``flush()`` first: only files no running process writes to are
+        rewritten, which includes this process's spools once they are flushed.
+        Returns the number of rows dropped.
+        """
+        customer_ids = set(customer_ids)
+        dropped = 0
+        for pattern in ("interactions-*.jsonl", "interactions-*.bad"):
+            for path in glob.glob(os.path.join(self.spool_dir, pattern)):
+                pid, _ = _spool_owner(path)
+                if pid != os.getpid() and _process_alive(pid):
+                    continue
+
+                with open(path, encoding='utf-8') as f:
+                    lines = f.readlines()
+                kept = [line for line in lines if _customer_id(line) not in customer_ids]
+                if len(kept) == len(lines):
+                    continue
+                dropped += len(lines) - len(kept)
+                if kept:
+                    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+                        f.writelines(kept)
+                    os.replace(path + ".tmp", path)
+                else:
+                    os.remove(path)
+        return dropped
+
+
+def _customer_id(line):
+    try:
+        return json.loads(line).get("customer_id")
+    except (json.JSONDecodeError, AttributeError):
+        return None
+
+
+_owner = (None, None)
+
+
+def _process_owner():
+    """``(pid, token)`` naming this process's spool files.
+
+    The pid alone is not enough: a container restarted with the same pid
+    (often 1) would take its crashed predecessor's spools for its own. The
+    random token is renewed when the pid changes, i.e. in a forked child.
+    """
+    global _owner
+    pid = os.getpid()
+    if _owner[0] != pid:
+        _owner = (pid, uuid.uuid4().hex)
+    return _owner
+
+
+def _spool_owner(path):
+    """``(pid, token)`` from a spool file name; the token is None in names written before it existed."""
+    parts = os.path.splitext(os.path.basename(path))[0].split("-")
+    return int(parts[1]), (parts[2] if len(parts) >= 4 else None)
+
+
+def _spool_in_use(path):
+    pid, token = _spool_owner(path)
+    if pid == os.getpid():
+        return token == _process_owner()[1]
+    return _process_alive(pid)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Errors that mean a row itself is unusable, as opposed to the database being unavailable
+REJECTED_ROW_ERRORS = (IntegrityError, DataError, ValidationError, KeyError, TypeError, ValueError)
+
+
+def _interaction(row):
+    return Interaction(**dict(row, timestamp=parse_datetime(row["timestamp"])))
+
+
+def write_rows(rows):
+    """Insert spooled rows and return the ones the database rejected.
+
+    If the batch fails, each row is retried on its own so one bad row cannot
+    hold back the rest. Other errors, such as a lost connection, propagate.
+    """
+    try:
+        # Foreign keys may be checked only at commit, so the batch gets its own transaction
+        with transaction.atomic():
+            Interaction.objects.bulk_create([_interaction(row) for row in rows], batch_size=500, ignore_conflicts=True)
+        return []
+    except REJECTED_ROW_ERRORS as e:
+        logger.warning("Batch of %s interaction(s) rejected, writing them one by one: %s", len(rows), e)
+
+    rejected = []
+    for row in rows:
+        try:
+            with transaction.atomic():
+                Interaction.objects.bulk_create([_interaction(row)], ignore_conflicts=True)
+        except REJECTED_ROW_ERRORS as e:
+            logger.warning("Interaction %s rejected: %s", row.get("log_id"), e)
+            rejected.append(row)
+    return rejected
+
+
+interaction_log = InteractionLog()
+
+
+def log_interaction(customer, interaction_type, notes=None, property_id=None):
+    """Record an interaction, buffered when ``CSA_INTERACTION_LOG_BUFFERED`` is on."""
+    if not settings.CSA_INTERACTION_LOG_BUFFERED:
+        return Interaction.objects.create(
+            customer=customer, property_id=property_id, Interaction_type=interaction_type, notes=notes
+        )
+    interaction_log.record(customer, interaction_type, notes, property_id)
@@ -0,0 +1,423 @@
+import json
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import metrics, resilience
+from .lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    """Canonical form of a message used as the cache key.
+
+    "What's available in  Lekki?" and "what's available in lekki" share a key.
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.strip(" .!?")
+
+
+# Backends
+
+class BaseCacheBackend:
+    """Interface for LLM response cache storage. Values are JSON-serializable."""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(BaseCacheBackend):
+    """Per-process LRU with TTL."""
+
+    def __init__(self, max_entries=None, ttl=None):
+        self._cache = LRUCache(
+            maxsize=max_entries or settings.CSA_LLM_CACHE_MAX_ENTRIES,
+            ttl=ttl or settings.CSA_LLM_CACHE_TTL,
+        )
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class SQLiteCacheBackend(BaseCacheBackend):
+    """Cache in a local SQLite file, shared by every worker on the machine.
+
+    Entries expire after the TTL; once the table grows past ``max_entries`` the
+    least recently used rows are evicted.
+    """
+
+    def __init__(self, path=None, max_entries=None, ttl=None):
+        self.path = str(path or settings.CSA_LLM_CACHE_SQLITE_PATH)
+        self.max_entries = max_entries or settings.CSA_LLM_CACHE_MAX_ENTRIES
+        self.ttl = ttl or settings.CSA_LLM_CACHE_TTL
+        self._local = threading.local()
+        self._writes = 0
+
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            with conn:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            return None
+        with conn:
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl, now),
+            )
+        self._writes += 1
+        # Checking the table size on every write would cost a scan, so do it periodically.
+        if self._writes % 100 == 0:
+            self.evict()
+
+    def evict(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM llm_cache")
+
+
+class RedisCacheBackend(BaseCacheBackend):
+    """Cache in Redis or any server speaking its protocol (Valkey, KeyDB, ...).
+
+    Entries expire after the TTL; size-based eviction is left to the server's
+    ``maxmemory-policy`` (``allkeys-lru`` is recommended).
+    """
+
+    prefix = "csa:llm:"
+
+    def __init__(self, url=None, ttl=None):
+        import redis  # optional dependency, only needed for this backend
+
+        self.client = redis.Redis.from_url(url or settings.CSA_LLM_CACHE_REDIS_URL)
+        self.ttl = ttl or settings.CSA_LLM_CACHE_TTL
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=int(self.ttl))
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_cache_backend():
+    """Return the process-wide backend configured by ``CSA_LLM_CACHE_BACKEND``."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.CSA_LLM_CACHE_BACKEND)()
+    return _backend
+
+
+def set_cache_backend(backend):
+    """Replace the process-wide backend, e.g. so a load test doesn't fill the shared cache. Returns the previous one."""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    return previous
+
+
+# Nearest-neighbour lookup
+
+def char_ngrams(text, n=3):
+    padded = f" {text} "
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+NUMBER_PATTERN = re.compile(r"\d+")
+# Words that flip a message's meaning while changing few trigrams: "liked" / "disliked", "is" / "isn't"
+NEGATION_PATTERN = re.compile(
+    r"\b(?:not|no|never|nothing|without|(?:do|does|did|is|are|was|were|ca|can|wo|could|would|should|have|has)n['’]?t|"
+    r"dis\w+|un\w+)\b"
+)
+
+
+def fuzzy_guards(text):
+    """What a fuzzy match must share exactly with the query: its numbers and its negation words."""
+    return NUMBER_PATTERN.findall(text), NEGATION_PATTERN.findall(text)
+
+
+class NGramIndex:
+    """Bounded in-memory index of cached messages for fuzzy lookups.
+
+    Messages are compared by cosine similarity of their character trigrams
+    through an inverted index. Candidates must contain exactly the same numbers
+    and negation words as the query, so "budget is 50m" never matches "budget
+    is 60m" and "I liked the house" never matches "I disliked the house".
+    """
+
+    def __init__(self, max_entries=2000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # text -> (ngrams, norm, guards)
+        self._postings = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def add(self, text):
+        with self._lock:
+            if text in self._entries:
+                self._entries.move_to_end(text)
+                return
+            ngrams = char_ngrams(text)
+            norm = math.sqrt(sum(count * count for count in ngrams.values()))
+            self._entries[text] = (ngrams, norm, fuzzy_guards(text))
+            for gram in ngrams:
+                self._postings[gram].add(text)
+
+            while len(self._entries) > self.max_entries:
+                old_text, (old_ngrams, _, _) = self._entries.popitem(last=False)
+                for gram in old_ngrams:
+                    postings = self._postings[gram]
+                    postings.discard(old_text)
+                    if not postings:
+                        del self._postings[gram]
+
+    def nearest(self, text, threshold):
+        """Return the most similar indexed text scoring at least ``threshold``, or None."""
+        ngrams = char_ngrams(text)
+        norm = math.sqrt(sum(count * count for count in ngrams.values()))
+        guards = fuzzy_guards(text)
+        if not norm:
+            return None
+
+        with self._lock:
+            dots = defaultdict(int)
+            for gram, count in ngrams.items():
+                for candidate in self._postings.get(gram, ()):
+                    dots[candidate] += count * self._entries[candidate][0][gram]
+
+            best, best_score = None, threshold
+            for candidate, dot in dots.items():
+                _, candidate_norm, candidate_guards = self._entries[candidate]
+                if candidate_guards != guards:
+                    continue
+                score = dot / (norm * candidate_norm)
+                if score >= best_score:
+                    best, best_score = candidate, score
+
+        return best
+
+
+# Cached chains
+
+class CacheStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(lambda: {"hits": 0, "fuzzy_hits": 0, "misses": 0})
+
+    def record(self, chain_name, outcome):
+        with self._lock:
+            self.counters[chain_name][outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(counts) for name, counts in self.counters.items()}
+
+
+cache_stats = CacheStats()
+
+
+class CachedChain:
+    """Wraps a langchain runnable and caches its answer per normalized message.
+
+    Plain chat results are cached as their text content, structured results
+    (pydantic models) as their field values, so either comes back in the form the
+    handlers expect. Misses go to ``chain``, or to ``fallback`` (the same chain
+    on a second model) through ``resilience.invoke``; when neither answers in
+    time ``resilience.ModelUnavailable`` is raised.
+    """
+
+    def __init__(self, name, chain, schema=None, fuzzy=False, backend=None, fallback=None):
+        self.name = name
+        self.chain = chain
+        self.fallback = fallback
+        self.schema = schema
+        self.fuzzy = fuzzy
+        self._backend = backend
+        self._index = NGramIndex(max_entries=settings.CSA_LLM_CACHE_FUZZY_INDEX_SIZE) if fuzzy else None
+
+    @property
+    def backend(self):
+        return self._backend or get_cache_backend()
+
+    def _key(self, text):
+        return f"{self.name}:{text}"
+
+    def _serialize(self, result):
+        if self.schema is not None and isinstance(result, self.schema):
+            return {"model": result.model_dump(mode="json", by_alias=True)}
+        content = getattr(result, "content", None)
+        if isinstance(content, str) and content.strip():
+            return {"content": content}
+        return None
+
+    def _deserialize(self, value):
+        if "model" in value and self.schema is not None:
+            return self.schema.model_validate(value["model"])
+        from langchain_core.messages import AIMessage
+
+        return AIMessage(content=value["content"])
+
+    def _lookup(self, text):
+        try:
+            value = self.backend.get(self._key(text))
+            if value is not None:
+                return value, "hits"
+
+            if self._index is not None and settings.CSA_LLM_CACHE_SIMILARITY_THRESHOLD:
+                neighbour = self._index.nearest(text, settings.CSA_LLM_CACHE_SIMILARITY_THRESHOLD)
+                if neighbour is not None:
+                    value = self.backend.get(self._key(neighbour))
+                    if value is not None:
+                        return value, "fuzzy_hits"
+        except Exception as e:
+            logger.error("LLM cache lookup failed for %s: %s", self.name, e)
+
+        return None, "misses"
+
+    def _store(self, text, result):
+        value = self._serialize(result)
+        if value is not None:
+            try:
+                self.backend.set(self._key(text), value)
+                if self._index is not None:
+                    self._index.add(text)
+            except Exception as e:
+                logger.error("LLM cache store failed for %s: %s", self.name, e)
+
+    def _cached(self, text):
+        value, outcome = self._lookup(text)
+        cache_stats.record(self.name, outcome)
+        metrics.llm_calls.inc(chain=self.name, cache=outcome)
+
+        if value is None:
+            return None
+        logger.debug("LLM cache %s for %s", outcome, self.name)
+        return self._deserialize(value)
+
+    @property
+    def providers(self):
+        providers = [("gemini", self.chain)]
+        if self.fallback is not None:
+            providers.append(("fallback", self.fallback))
+        return providers
+
+    def _call(self, inputs, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = resilience.invoke(self.name, self.providers, lambda chain: chain.invoke(inputs, *args, **kwargs))
+        except Exception:
+            metrics.llm_errors.inc(chain=self.name)
+            raise
+        metrics.llm_seconds.observe(time.perf_counter() - start, chain=self.name)
+        metrics.record_llm_result(self.name, result)
+        return result
+
+    async def _acall(self, inputs, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = await resilience.ainvoke(
+                self.name, self.providers, lambda chain: chain.ainvoke(inputs, *args, **kwargs)
+            )
+        except Exception:
+            metrics.llm_errors.inc(chain=self.name)
+            raise
+        metrics.llm_seconds.observe(time.perf_counter() - start, chain=self.name)
+        metrics.record_llm_result(self.name, result)
+        return result
+
+    def invoke(self, inputs, *args, **kwargs):
+        if not settings.CSA_LLM_CACHE_ENABLED:
+            metrics.llm_calls.inc(chain=self.name, cache="disabled")
+            return self._call(inputs, *args, **kwargs)
+
+        text = normalize_text(inputs.get("message"))
+        cached = self._cached(text)
+        if cached is not None:
+            return cached
+
+        result = self._call(inputs, *args, **kwargs)
+        self._store(text, result)
+        return result
+
+    async def ainvoke(self, inputs, *args, **kwargs):
+        if not settings.CSA_LLM_CACHE_ENABLED:
+            metrics.llm_calls.inc(chain=self.name, cache="disabled")
+            return await self._acall(inputs, *args, **kwargs)
+
+        # The SQLite and Redis backends block, keep them off the event loop
+        text = normalize_text(inputs.get("message"))
+        cached = await sync_to_async(self._cached, thread_sensitive=False)(text)
+        if cached is not None:
+            return cached
+
+        result = await self._acall(inputs, *args, **kwargs)
+        await sync_to_async(self._store, thread_sensitive=False)(text, result)
+        return result
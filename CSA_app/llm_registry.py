@@ -0,0 +1,134 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from . import prompts
+from .llm_cache import CachedChain
+from .schemas import MessageAnalysis
+
+logger = logging.getLogger(__name__)
+
+
+def build_gemini_llm(model=None):
+    # langchain and the Gemini client are slow to import, so only load them when a chain is needed.
+    from langchain_google_genai import ChatGoogleGenerativeAI  # Gemini Studio
+
+    if not settings.GEMINI_API_KEY:
+        raise ImproperlyConfigured("GEMINI_API_KEY must be set to call Gemini.")
+
+    # The client's own timeout frees the thread an abandoned call runs on (see resilience.py)
+    return ChatGoogleGenerativeAI(
+        api_key=settings.GEMINI_API_KEY,
+        model=model or settings.GEMINI_MODEL,
+        timeout=settings.CSA_LLM_TIMEOUT,
+        max_retries=settings.CSA_LLM_MAX_RETRIES,
+    )
+
+
+def build_fallback_llm():
+    if not settings.GEMINI_FALLBACK_MODEL:
+        return None
+    return build_gemini_llm(settings.GEMINI_FALLBACK_MODEL)
+
+
+def prompt(template):
+    from langchain_core.prompts import ChatPromptTemplate
+
+    return ChatPromptTemplate.from_template(template)
+
+
+class LLMRegistry:
+    """Creates the process-wide LLM clients and chains the first time they are used.
+
+    Chains are registered as factories taking the LLM, so nothing is built at
+    import time and ``manage.py`` commands that never talk to Gemini don't pay
+    for it. Each chain is wrapped in a ``CachedChain`` (``options`` are passed
+    to it), with the same chain built on the fallback model when there is one.
+    ``set_llm`` swaps the clients (e.g. for a local stand-in) and drops the
+    chains built from the previous ones.
+    """
+
+    def __init__(self, llm_factory, fallback_factory=None):
+        self._llm_factory = llm_factory
+        self._fallback_factory = fallback_factory
+        self._llm = None
+        self._fallback = None
+        self._fallback_loaded = False
+        self._factories = {}
+        self._chains = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, factory, **options):
+        with self._lock:
+            self._factories[name] = (factory, options)
+            self._chains.pop(name, None)
+
+    def get_llm(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = self._llm_factory()
+        return self._llm
+
+    def get_fallback_llm(self):
+        if not self._fallback_loaded:
+            with self._lock:
+                if not self._fallback_loaded:
+                    self._fallback = self._fallback_factory() if self._fallback_factory else None
+                    self._fallback_loaded = True
+        return self._fallback
+
+    def set_llm(self, llm, fallback=None):
+        """Use ``llm`` (and ``fallback``) from now on. ``set_llm(None)`` goes back to building them from settings."""
+        with self._lock:
+            self._llm = llm
+            self._fallback = fallback
+            self._fallback_loaded = llm is not None
+            self._chains.clear()
+
+    def get_chain(self, name):
+        chain = self._chains.get(name)
+        if chain is None:
+            with self._lock:
+                chain = self._chains.get(name)
+                if chain is None:
+                    factory, options = self._factories[name]
+                    fallback = self.get_fallback_llm()
+                    chain = CachedChain(
+                        name, factory(self.get_llm()),
+                        fallback=factory(fallback) if fallback is not None else None, **options,
+                    )
+                    self._chains[name] = chain
+        return chain
+
+    def warm_up(self):
+        """Build the client and every chain now instead of on the first message."""
+        try:
+            for name in list(self._factories):
+                self.get_chain(name)
+        except Exception as e:
+            logger.error("LLM warm-up failed: %s", e)
+            return False
+        logger.info("LLM warm-up done (%s chains)", len(self._chains))
+        return True
+
+
+registry = LLMRegistry(build_gemini_llm, build_fallback_llm)
+
+# Answers are cached per normalized message, see llm_cache.py
+registry.register("intent", lambda llm: prompt(prompts.INTENT_CLASSIFICATION_PROMPT) | llm, fuzzy=True)
+registry.register("property_inquiry", lambda llm: prompt(prompts.PROPERTY_INQUIRY_PROMPT) | llm)
+# Not fuzzy: "I loved the house" and "I hated the house" are close as trigrams but opposite as sentiments
+registry.register("post_inspection", lambda llm: prompt(prompts.POST_INSPECTION_PROMPT) | llm)
+# One structured call that returns intent, entities and sentiment together
+registry.register(
+    "message_analysis",
+    lambda llm: prompt(prompts.MESSAGE_ANALYSIS_PROMPT) | llm.with_structured_output(MessageAnalysis),
+    schema=MessageAnalysis,
+)
+
+get_llm = registry.get_llm
+get_chain = registry.get_chain
+warm_up = registry.warm_up
@@ -0,0 +1,141 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import queue
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Correlation ids of the request or conversation turn being handled. Context
+# variables follow asyncio tasks and sync_to_async calls, so the ids reach
+# every record logged on behalf of a request.
+_correlation = contextvars.ContextVar("csa_log_correlation", default={})
+
+# Attributes every LogRecord has; anything else was passed with ``extra=``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def correlation(**ids):
+    """Attach ids (request_id, message_id, job_id, ...) to every record logged inside the block."""
+    token = _correlation.set({**_correlation.get(), **{key: value for key, value in ids.items() if value}})
+    try:
+        yield
+    finally:
+        _correlation.reset(token)
+
+
+def correlation_ids():
+    return dict(_correlation.get())
+
+
+class CorrelationFilter(logging.Filter):
+    """Copies the current correlation ids onto the record.
+
+    Attach it to the queue handler: it runs on the thread that logged, where
+    the context variables are set, not on the listener thread.
+    """
+
+    def filter(self, record):
+        for key, value in _correlation.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a ``rate`` fraction of the records at or below ``level`` (DEBUG by default)."""
+
+    def __init__(self, rate=1.0, level="DEBUG"):
+        super().__init__()
+        self.rate = float(rate)
+        if not isinstance(level, int):
+            names = logging.getLevelNamesMapping()
+            if str(level).upper() not in names:
+                raise ValueError(f"Unknown level: {level!r}")
+            level = names[str(level).upper()]
+        self.level = level
+
+    def filter(self, record):
+        if record.levelno > self.level or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, correlation ids and ``extra`` fields."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class _Listener(QueueListener):
+
+    def enqueue_sentinel(self):
+        # The listener thread is draining the queue; wait for room rather than
+        # raising queue.Full and losing the records still queued at exit
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+class QueueListenerHandler(QueueHandler):
+    """Hands records to a background thread that writes them to ``handlers``.
+
+    The logging call only formats the message and puts the record on a queue,
+    so file and console I/O never happen on a request or worker thread. Used
+    from ``LOGGING`` with ``cfg://handlers.<name>`` references to the target
+    handlers; the listener is stopped (and the queue drained) at exit.
+    """
+
+    def __init__(self, handlers, queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        # Indexing (not iterating) resolves dictConfig's cfg:// references
+        targets = [handlers[i] for i in range(len(handlers))]
+        self.listener = _Listener(self.queue, *targets, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def prepare(self, record):
+        # Merge the arguments now (they may change before the listener runs) but
+        # keep the message and traceback apart so the target formatter decides the layout.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block the caller on a stalled disk; the record is dropped
+            pass
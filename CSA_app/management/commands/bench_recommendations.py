@@ -0,0 +1,94 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from CSA_app.catalog import bump_catalog_version
+from CSA_app.models import Property, normalize_location
+from CSA_app.recommendations import recommend_properties, recommendation_queryset
+
+LOCATIONS = [
+    "Plot 45, Lekki Phase 1, Lagos", "Ikeja GRA, Lagos", "Victoria Island, Lagos", "Ajah, Lagos",
+    "Yaba, Lagos", "Surulere, Lagos", "Agbowo road, Ibadan", "Bodija, Ibadan", "Apata, Ibadan",
+    "Maitama, Abuja", "Wuse 2, Abuja", "Gwarinpa, Abuja", "GRA, Port Harcourt", "express road",
+]
+
+SEED_PREFIX = "BENCH-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic listings and time budget recommendations against them. "
+        "Run it against a scratch database: seeded rows are removed afterwards unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=100000, help="Number of synthetic listings to seed.")
+        parser.add_argument('--queries', type=int, default=500, help="Number of recommendation queries to time.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded listings.")
+
+    def seed(self, count, rng):
+        batch = []
+        start = time.perf_counter()
+        for i in range(count):
+            location = rng.choice(LOCATIONS)
+            batch.append(Property(
+                name=f"Synthetic listing {i}",
+                description="Seeded by bench_recommendations",
+                price=Decimal(rng.randrange(5_000_000, 95_000_000, 50_000)),
+                location=location,
+                location_normalized=normalize_location(location),
+                bedrooms=rng.randint(1, 6),
+                bathrooms=rng.randint(1, 5),
+                is_available=rng.random() < 0.8,
+                property_identifier=f"{SEED_PREFIX}{i}",
+            ))
+            if len(batch) == 5000:
+                Property.objects.bulk_create(batch)
+                batch = []
+        Property.objects.bulk_create(batch)
+        # bulk_create sends no signals, so tell the in-memory catalog itself
+        bump_catalog_version()
+        return time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        # Leftovers of an earlier --keep run
+        Property.objects.filter(property_identifier__startswith=SEED_PREFIX).delete()
+
+        elapsed = self.seed(options['listings'], rng)
+        self.stdout.write(f"Seeded {options['listings']} listings in {elapsed:.1f}s")
+
+        try:
+            sql, params = recommendation_queryset(40_000_000, "Lekki", 3).values('pk')[:6].query.sql_with_params()
+            with connection.cursor() as cursor:
+                explain = "EXPLAIN QUERY PLAN " if connection.vendor == 'sqlite' else "EXPLAIN "
+                cursor.execute(explain + sql, params)
+                self.stdout.write("Query plan:")
+                for row in cursor.fetchall():
+                    self.stdout.write(f"  {row[-1]}")
+
+            timings = []
+            for _ in range(options['queries']):
+                budget = rng.randrange(5_000_000, 95_000_000, 1_000_000)
+                location = rng.choice([None, "Lekki", "Ikeja", "Ibadan", "Abuja"])
+                bedrooms = rng.choice([None, 2, 3, 4])
+                start = time.perf_counter()
+                recommend_properties(budget, location=location, bedrooms=bedrooms)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            timings.sort()
+            self.stdout.write(
+                f"{len(timings)} queries: "
+                f"p50 {statistics.median(timings):.2f}ms, "
+                f"p95 {timings[int(len(timings) * 0.95) - 1]:.2f}ms, "
+                f"max {timings[-1]:.2f}ms"
+            )
+        finally:
+            if not options['keep']:
+                Property.objects.filter(property_identifier__startswith=SEED_PREFIX).delete()
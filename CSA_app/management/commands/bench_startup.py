@@ -0,0 +1,102 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a web or worker process imports before it can serve its first message.
+STARTUP_SCRIPT = (
+    "import django; django.setup(); "
+    "import CSA_Project.urls; "
+    "import CSA_app.whatsapp_handler"
+)
+
+# Modules whose cumulative import time is tracked in the baseline.
+TRACKED_MODULES = [
+    "django",
+    "requests",
+    "CSA_Project.urls",
+    "CSA_app.views",
+    "CSA_app.whatsapp_handler",
+    "pydantic",
+    "langchain_core",
+    "langchain_google_genai",
+]
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(.+)$")
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, "benchmarks", "startup_baseline.json")
+
+
+def measure_once():
+    """Run the startup script under ``-X importtime`` and return cumulative microseconds per module."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise CommandError(f"Startup script failed:\n{result.stderr[-2000:]}")
+
+    cumulative = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, name = int(match.group(1)), int(match.group(2)), match.group(3)
+        total += self_us
+        cumulative[name.strip()] = cumulative_us
+
+    timings = {module: cumulative.get(module, 0) for module in TRACKED_MODULES}
+    timings["total"] = total
+    return timings
+
+
+class Command(BaseCommand):
+    help = "Measure import-time cost of starting the app (python -X importtime) and compare it to the tracked baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="Number of runs; the median is reported.")
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON file.")
+        parser.add_argument('--update-baseline', action='store_true', help="Write the measurement as the new baseline.")
+        parser.add_argument(
+            '--tolerance', type=float, default=25.0,
+            help="Allowed slowdown of the total, in percent, before the command fails.",
+        )
+
+    def handle(self, *args, **options):
+        runs = [measure_once() for _ in range(options['runs'])]
+        median = {key: int(statistics.median(run[key] for run in runs)) for key in runs[0]}
+
+        baseline = None
+        if os.path.exists(options['baseline']):
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        self.stdout.write(f"{'module':<28}{'ms':>10}{'baseline ms':>14}")
+        for key, value in median.items():
+            previous = baseline.get(key) if baseline else None
+            previous_text = f"{previous / 1000:.1f}" if previous is not None else "-"
+            self.stdout.write(f"{key:<28}{value / 1000:>10.1f}{previous_text:>14}")
+
+        if options['update_baseline']:
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            with open(options['baseline'], 'w') as f:
+                json.dump(median, f, indent=2)
+                f.write("\n")
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        if baseline and baseline.get("total"):
+            slowdown = (median["total"] - baseline["total"]) * 100 / baseline["total"]
+            if slowdown > options['tolerance']:
+                raise CommandError(
+                    f"Startup import time regressed by {slowdown:.0f}% "
+                    f"({baseline['total'] / 1000:.0f}ms -> {median['total'] / 1000:.0f}ms)"
+                )
+            self.stdout.write(self.style.SUCCESS(f"Startup import time within tolerance ({slowdown:+.0f}%)"))
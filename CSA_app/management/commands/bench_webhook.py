@@ -0,0 +1,147 @@
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+from django.test import Client, override_settings
+
+from CSA_app import conversation
+from CSA_app.customers import get_customer
+from CSA_app.dedup import claim_message
+from CSA_app.interaction_log import interaction_log, log_interaction
+from CSA_app.models import Customer, ProcessedMessage, WebhookJob
+from CSA_app.webhook_parser import iter_webhook_events
+from CSA_app.work_queue import DatabaseQueueBackend, Worker, get_queue_backend
+
+SENDER_PREFIX = "23470000"
+
+
+def webhook_payload(sender, text):
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {
+            "contacts": [{"wa_id": sender, "profile": {"name": "Bench"}}],
+            "messages": [{
+                "from": sender, "id": f"bench-{uuid.uuid4().hex}", "timestamp": str(int(time.time())),
+                "type": "text", "text": {"body": text},
+            }],
+        }}]}],
+    }
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class DatabaseTurnWorker(Worker):
+    """Runs the database side of a conversation turn (dedup, customer, state, interaction) without Gemini or WhatsApp."""
+
+    def run_job(self, job):
+        try:
+            for event in iter_webhook_events(job.payload):
+                if not claim_message(event.message.get('id')):
+                    continue
+                customer = get_customer(event.sender)
+                state = conversation.get_state(customer)
+                log_interaction(customer, "genaral_query", notes=event.text)
+                customer.budget = random.randrange(5_000_000, 95_000_000)
+                customer.save(update_fields=["budget"])
+                conversation.advance(state, conversation.STAGE_INQUIRING, pending_question=conversation.PENDING_BUDGET)
+                conversation.save_state(state)
+        except OperationalError as e:
+            self.errors.append(str(e))
+            self.backend.fail(job, str(e))
+        else:
+            self.backend.complete(job)
+        finally:
+            close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure webhook throughput on the configured database profile (CSA_DB_PROFILE): "
+        "concurrent webhook POSTs, then workers draining the queue. Run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Webhook deliveries to send.")
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent webhook senders.")
+        parser.add_argument('--workers', type=int, default=4, help="Worker threads draining the queue.")
+        parser.add_argument('--customers', type=int, default=200, help="Distinct senders.")
+
+    def handle(self, *args, **options):
+        if not isinstance(get_queue_backend(), DatabaseQueueBackend):
+            raise CommandError("bench_webhook needs CSA_QUEUE_BACKEND=CSA_app.work_queue.DatabaseQueueBackend")
+
+        self.stdout.write(f"Profile {settings.CSA_DB_PROFILE} ({connection.vendor})")
+        self.cleanup()
+        try:
+            # Jobs must be due right away for the workers to drain the queue
+            with override_settings(CSA_COALESCE_WINDOW=0):
+                self.ingest(options)
+                self.process(options)
+        finally:
+            self.cleanup()
+
+    def ingest(self, options):
+        senders = [f"{SENDER_PREFIX}{i:05d}" for i in range(options['customers'])]
+        per_thread = options['requests'] // options['threads']
+        latencies, failures = [], []
+        lock = threading.Lock()
+
+        def send():
+            client = Client()
+            own_latencies, own_failures = [], []
+            try:
+                for _ in range(per_thread):
+                    body = json.dumps(webhook_payload(random.choice(senders), "Do you have 3 bedroom flats?"))
+                    start = time.perf_counter()
+                    response = client.post('/', data=body, content_type='application/json')
+                    own_latencies.append((time.perf_counter() - start) * 1000)
+                    if response.status_code != 200:
+                        own_failures.append(response.status_code)
+            finally:
+                close_old_connections()
+            with lock:
+                latencies.extend(own_latencies)
+                failures.extend(own_failures)
+
+        threads = [threading.Thread(target=send) for _ in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        self.stdout.write(
+            f"Ingest: {len(latencies)} webhooks in {elapsed:.2f}s ({len(latencies) / elapsed:,.0f}/s), "
+            f"p50 {statistics.median(latencies):.1f}ms, p95 {percentile(latencies, 0.95):.1f}ms, "
+            f"p99 {percentile(latencies, 0.99):.1f}ms, {len(failures)} failed"
+        )
+
+    def process(self, options):
+        queued = WebhookJob.objects.count()
+        worker = DatabaseTurnWorker(concurrency=options['workers'], poll_interval=0.05)
+        worker.errors = []
+
+        start = time.perf_counter()
+        worker.run(once=True)
+        interaction_log.flush()
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f"Process: {queued} jobs in {elapsed:.2f}s ({queued / elapsed:,.0f}/s), "
+            f"{len(worker.errors)} database errors, {WebhookJob.objects.count()} left in the queue"
+        )
+
+    def cleanup(self):
+        WebhookJob.objects.filter(payload__entry__0__changes__0__value__messages__0__id__startswith="bench-").delete()
+        ProcessedMessage.objects.filter(message_id__startswith="bench-").delete()
+        Customer.objects.filter(phone_number__startswith=f"+{SENDER_PREFIX}").delete()
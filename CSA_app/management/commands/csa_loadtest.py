@@ -0,0 +1,529 @@
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, override_settings
+
+from CSA_app import metrics, resilience
+from CSA_app.intent_classifier import classifier_stats
+from CSA_app.interaction_log import interaction_log
+from CSA_app.llm_cache import MemoryCacheBackend, cache_stats, set_cache_backend
+from CSA_app.llm_registry import registry
+from CSA_app.models import Customer, DeadLetterJob, ProcessedMessage, Property, WebhookJob
+from CSA_app.storage import image_rendition
+from CSA_app.stubs import LOCATIONS, StubChatModel, StubGraphServer
+from CSA_app.work_queue import AsyncioQueueBackend, DatabaseQueueBackend, Worker, get_queue_backend
+from CSA_app.whatsapp_sender import WhatsAppClient, set_client
+
+SENDER_PREFIX = "23471000"
+MESSAGE_PREFIX = "load-"
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+PROVIDERS = ("gemini", "fallback")
+CIRCUIT_STATES = (resilience.CircuitBreaker.OPEN, resilience.CircuitBreaker.HALF_OPEN, resilience.CircuitBreaker.CLOSED)
+FALLBACK_STEPS = ("classify", "extract", "sentiment")
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def latency_summary(values):
+    """p50/p95/p99/max in milliseconds of a list of durations in seconds."""
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_ms": round(statistics.median(values) * 1000, 1),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+        "max_ms": round(values[-1] * 1000, 1),
+    }
+
+
+def format_latency(summary):
+    if not summary["count"]:
+        return "no samples"
+    return f"p50 {summary['p50_ms']}ms, p95 {summary['p95_ms']}ms, p99 {summary['p99_ms']}ms, max {summary['max_ms']}ms"
+
+
+def webhook_payload(sender, message_id, message):
+    """A WhatsApp Cloud API delivery of one inbound message."""
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {
+            "messaging_product": "whatsapp",
+            "contacts": [{"wa_id": sender, "profile": {"name": "Load test"}}],
+            "messages": [{"from": sender, "id": message_id, "timestamp": str(int(time.time())), **message}],
+        }}]}],
+    }
+
+
+def text(body):
+    return {"type": "text", "text": {"body": body}}
+
+
+def image(media_id):
+    return {"type": "image", "image": {"id": media_id, "mime_type": "image/jpeg"}}
+
+
+def conversation_script(rng, identifiers, media_ids):
+    """One synthetic customer's conversation: a list of (expected intent, message)."""
+    location = rng.choice(LOCATIONS)
+    bedrooms = rng.randint(1, 5)
+    # Customer.budget holds up to 99,999,999.99
+    budget = rng.randrange(5, 100, 5)
+    scripts = [
+        [
+            ("general_query", text(rng.choice(["Hi", "Hello", "Good morning"]))),
+            ("property_recommendation", text(rng.choice([
+                f"I'm looking for a {bedrooms} bedroom flat in {location}",
+                f"Do you have {bedrooms} bed apartments in {location}?",
+                f"Please recommend a {bedrooms} bedroom house around {location}",
+            ]))),
+            ("budget_sharing", text(rng.choice([f"My budget is {budget}m", f"{budget} million", f"₦{budget}m"]))),
+            ("payment_method", text(rng.choice(["Can I pay in installments?", "Do you accept bank transfer?"]))),
+        ],
+        [
+            ("property_inquiry", text(f"Is property #{rng.choice(identifiers)} still available?")),
+            ("payment_method", text("Is there a payment plan?")),
+        ],
+        [
+            ("post_inspection_feedback", text(rng.choice([
+                "I loved the house after the inspection",
+                "I didn't like the apartment, the rooms were too small",
+                "After the inspection I think the place is great, what's next?",
+            ]))),
+            ("general_query", text("Thank you")),
+        ],
+    ]
+    if media_ids:
+        scripts.append([
+            ("property_inquiry", image(rng.choice(media_ids))),
+            ("general_query", text("Can I come and see it this weekend?")),
+        ])
+    return list(rng.choice(scripts))
+
+
+class WriteWatcher:
+    """Times the write statements every database connection runs and counts the ones that fail."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = []
+        self.errors = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except DatabaseError as e:
+            with self._lock:
+                self.errors[str(e).split("\n")[0][:80]] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.durations.append(elapsed)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        connection_created.connect(self.install, weak=False)
+        for connection in connections.all():
+            self.install(connection=connection)
+        return self
+
+    def __exit__(self, *exc):
+        connection_created.disconnect(self.install)
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+class Traffic:
+    """Synthetic customers working through scripted conversations.
+
+    Arrivals are open-loop (a new message every so often, whatever the
+    backlog) but each customer waits for the reply to its previous message
+    before sending the next one, like a person would. With ``burst`` a customer
+    sometimes types its next message right away instead; one reply then
+    answers both. Latency is counted from the scheduled send time of the first
+    unanswered message, so a backlog in the driver is part of it.
+    """
+
+    def __init__(self, seed, identifiers, media_ids=(), burst=0.0):
+        self.rng = random.Random(seed)
+        self.identifiers = identifiers
+        self.media_ids = list(media_ids)
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._idle = deque()
+        self._scripts = {}
+        self._outstanding = {}
+        self._customers = 0
+        self._messages = 0
+        self.message_intents = {}
+        self.acks = []
+        self.statuses = Counter()
+        self.replies = defaultdict(list)
+        self.unsolicited = 0
+        self.last_reply_at = None
+
+    def next_payload(self, scheduled_at):
+        with self._lock:
+            if self._idle:
+                sender = self._idle.popleft()
+            else:
+                sender = f"{SENDER_PREFIX}{self._customers:05d}"
+                self._customers += 1
+            if not self._scripts.get(sender):
+                self._scripts[sender] = conversation_script(self.rng, self.identifiers, self.media_ids)
+            intent, message = self._scripts[sender].pop(0)
+
+            message_id = f"{MESSAGE_PREFIX}{self._messages:07d}"
+            self._messages += 1
+            self.message_intents[message_id] = intent
+            self._outstanding.setdefault(sender, (scheduled_at, intent))
+            if self._scripts[sender] and self.rng.random() < self.burst:
+                self._idle.appendleft(sender)
+        return webhook_payload(sender, message_id, message)
+
+    def acked(self, scheduled_at, status):
+        with self._lock:
+            self.acks.append(time.perf_counter() - scheduled_at)
+            self.statuses[status] += 1
+
+    def on_reply(self, payload):
+        sender = "".join(ch for ch in str(payload.get("to", "")) if ch.isdigit())
+        now = time.perf_counter()
+        with self._lock:
+            pending = self._outstanding.pop(sender, None)
+            if pending is None:
+                self.unsolicited += 1
+                return
+            scheduled_at, intent = pending
+            self.replies[intent].append(now - scheduled_at)
+            self.last_reply_at = now
+            if sender not in self._idle:
+                self._idle.append(sender)
+
+    @property
+    def outstanding(self):
+        with self._lock:
+            return len(self._outstanding)
+
+    @property
+    def customers(self):
+        return self._customers
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay synthetic WhatsApp conversations at the webhook at a set rate, with local stand-ins for Gemini "
+        "and the Graph API, and report latency percentiles, throughput, database write contention and LLM "
+        "calls per intent. Uses the configured CSA_QUEUE_BACKEND. Run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rate', type=float, default=20.0, help="Webhooks per second (Poisson arrivals).")
+        parser.add_argument('--duration', type=float, default=30.0, help="Seconds to send traffic for.")
+        parser.add_argument('--concurrency', type=int, default=16, help="Concurrent webhook deliveries (sync mode).")
+        parser.add_argument('--workers', type=int, default=None, help="Worker threads for the database queue.")
+        parser.add_argument('--llm-latency', type=float, default=800.0, help="Stub Gemini latency in ms.")
+        parser.add_argument('--llm-jitter', type=float, default=300.0, help="Standard deviation of that latency in ms.")
+        parser.add_argument('--llm-error-rate', type=float, default=0.0, help="Fraction of Gemini calls that fail.")
+        parser.add_argument(
+            '--fallback', action='store_true', help="Add a second stub model, with the same latency and no errors.",
+        )
+        parser.add_argument(
+            '--burst', type=float, default=0.0,
+            help="Chance that a customer sends its next message without waiting for the reply.",
+        )
+        parser.add_argument('--graph-latency', type=float, default=50.0, help="Stub Graph API latency in ms.")
+        parser.add_argument(
+            '--llm-cache', choices=['memory', 'shared', 'off'], default='memory',
+            help="LLM cache for the run: a fresh in-memory one, the configured one, or none.",
+        )
+        parser.add_argument('--drain-timeout', type=float, default=30.0, help="Seconds to wait for the last replies.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', dest='json_path', help="Also write the report to this file as JSON.")
+
+    def handle(self, *args, **options):
+        backend = get_queue_backend()
+        self.async_mode = isinstance(backend, AsyncioQueueBackend)
+        self.worker = None
+        if isinstance(backend, DatabaseQueueBackend):
+            self.worker = Worker(backend=backend, concurrency=options['workers'], poll_interval=0.05)
+
+        self.cleanup()
+        identifiers = list(Property.objects.filter(is_available=True).values_list('property_identifier', flat=True)[:200])
+        identifiers = [identifier.lstrip('#') for identifier in identifiers] or ["100001"]
+        rng = random.Random(options['seed'])
+
+        model = StubChatModel(
+            latency=options['llm_latency'] / 1000, jitter=options['llm_jitter'] / 1000,
+            error_rate=options['llm_error_rate'], seed=options['seed'],
+        )
+        fallback = StubChatModel(
+            latency=options['llm_latency'] / 1000, jitter=options['llm_jitter'] / 1000, seed=options['seed'] + 1,
+        ) if options['fallback'] else None
+        self.traffic = Traffic(options['seed'], identifiers, burst=options['burst'])
+        stub = StubGraphServer(latency=options['graph_latency'] / 1000, on_message=self.traffic.on_reply)
+        if settings.CSA_IMAGE_MATCHING:
+            self.traffic.media_ids = self.listing_photos(stub, rng)
+
+        client = WhatsAppClient(access_token="stub", phone_number_id="loadtest", api_url=stub.url, max_retries=0)
+        previous_client = set_client(client)
+        previous_cache = set_cache_backend(MemoryCacheBackend()) if options['llm_cache'] == 'memory' else None
+        registry.set_llm(model, fallback=fallback)
+        resilience.reset_breakers()
+        classifier_stats.reset()
+        cache_before = cache_stats.snapshot()
+        resilience_before = self.resilience_counts()
+
+        self.stdout.write(
+            f"{'Async' if self.async_mode else 'Sync'} mode, queue {type(backend).__name__}, "
+            f"{options['rate']:g} webhooks/s for {options['duration']:g}s, Gemini {options['llm_latency']:g}ms "
+            f"± {options['llm_jitter']:g}ms with {options['llm_error_rate']:.0%} errors"
+            f"{' and a fallback model' if fallback else ''}, {options['burst']:.0%} bursts, "
+            f"coalescing window {settings.CSA_COALESCE_WINDOW:g}s, "
+            f"{len(self.traffic.media_ids)} listing photo(s) to forward"
+        )
+        try:
+            with stub, WriteWatcher() as writes, override_settings(
+                CSA_LLM_CACHE_ENABLED=settings.CSA_LLM_CACHE_ENABLED and options['llm_cache'] != 'off',
+            ):
+                start = time.perf_counter()
+                if self.async_mode:
+                    asyncio.run(self.drive_async(options))
+                else:
+                    self.drive(options)
+                elapsed = time.perf_counter() - start
+            report = self.report(options, elapsed, writes, model, fallback, cache_before, resilience_before)
+        finally:
+            registry.set_llm(None)
+            resilience.reset_breakers()
+            set_client(previous_client)
+            client.close()
+            if previous_cache is not None:
+                set_cache_backend(previous_cache)
+            self.cleanup()
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+    def listing_photos(self, stub, rng):
+        """Serve the WhatsApp renditions of a few listing photos as inbound media, as if customers forwarded them."""
+        names = list(Property.objects.exclude(image='').values_list('image', flat=True).distinct()[:200])
+        media_ids = []
+        for name in rng.sample(names, min(len(names), 20)):
+            try:
+                with default_storage.open(image_rendition(name), 'rb') as f:
+                    media_ids.append(stub.add_media(f.read()))
+            except OSError:
+                continue
+        return media_ids
+
+    def schedule(self, rate, duration):
+        """Yield Poisson arrival times (perf_counter values) over ``duration`` seconds."""
+        rng = random.Random(self.traffic.rng.random())
+        start = time.perf_counter()
+        at = start
+        while at < start + duration:
+            yield at
+            at += rng.expovariate(rate)
+
+    def drive(self, options):
+        local = threading.local()
+
+        def deliver(scheduled_at):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            payload = self.traffic.next_payload(scheduled_at)
+            try:
+                response = local.client.post('/', data=json.dumps(payload), content_type='application/json')
+                self.traffic.acked(scheduled_at, response.status_code)
+            finally:
+                close_old_connections()
+
+        worker_thread = None
+        if self.worker is not None:
+            worker_thread = threading.Thread(target=self.worker.run, name="csa-loadtest-worker")
+            worker_thread.start()
+        try:
+            with ThreadPoolExecutor(max_workers=options['concurrency'], thread_name_prefix='csa-loadtest') as pool:
+                for scheduled_at in self.schedule(options['rate'], options['duration']):
+                    time.sleep(max(0.0, scheduled_at - time.perf_counter()))
+                    pool.submit(deliver, scheduled_at)
+            self.wait_for_replies(options['drain_timeout'], time.sleep)
+        finally:
+            if worker_thread is not None:
+                self.worker.stop()
+                worker_thread.join()
+
+    async def drive_async(self, options):
+        client = AsyncClient()
+        deliveries = set()
+
+        async def deliver(scheduled_at):
+            payload = self.traffic.next_payload(scheduled_at)
+            response = await client.post('/', data=json.dumps(payload), content_type='application/json')
+            self.traffic.acked(scheduled_at, response.status_code)
+
+        for scheduled_at in self.schedule(options['rate'], options['duration']):
+            await asyncio.sleep(max(0.0, scheduled_at - time.perf_counter()))
+            task = asyncio.create_task(deliver(scheduled_at))
+            deliveries.add(task)
+            task.add_done_callback(deliveries.discard)
+
+        if deliveries:
+            await asyncio.wait(deliveries)
+        # The conversations run as tasks on this loop, keep it alive until they reply
+        deadline = time.monotonic() + options['drain_timeout']
+        while self.traffic.outstanding and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    def wait_for_replies(self, timeout, sleep):
+        deadline = time.monotonic() + timeout
+        while self.traffic.outstanding and time.monotonic() < deadline:
+            sleep(0.05)
+
+    def resilience_counts(self):
+        return {
+            "circuit": {
+                f"{provider} {state}": metrics.llm_circuit_changes.value(provider=provider, state=state)
+                for provider in PROVIDERS for state in CIRCUIT_STATES
+            },
+            "local_fallbacks": {step: metrics.llm_local_fallbacks.value(step=step) for step in FALLBACK_STEPS},
+        }
+
+    def report(self, options, elapsed, writes, model, fallback, cache_before, resilience_before):
+        traffic = self.traffic
+        sent = len(traffic.acks)
+        replies = [latency for latencies in traffic.replies.values() for latency in latencies]
+        busy = (traffic.last_reply_at or time.perf_counter()) - (time.perf_counter() - elapsed)
+
+        llm_calls = Counter()
+        llm_failures = 0
+        chains = Counter()
+        for call in model.calls:
+            message_id = (call.get("message_id") or "").split(",")[0]
+            llm_calls[traffic.message_intents.get(message_id, "other")] += 1
+            chains[call["chain"]] += 1
+            llm_failures += call["failed"]
+
+        resilience_after = self.resilience_counts()
+        resilience_report = {}
+        for group, counts in resilience_after.items():
+            changes = {name: count - resilience_before[group][name] for name, count in counts.items()}
+            resilience_report[group] = {name: count for name, count in changes.items() if count}
+
+        sent_per_intent = Counter(traffic.message_intents.values())
+        cache_after = cache_stats.snapshot()
+        cache = Counter()
+        for chain, counts in cache_after.items():
+            for outcome, count in counts.items():
+                cache[outcome] += count - cache_before.get(chain, {}).get(outcome, 0)
+
+        report = {
+            "mode": "async" if self.async_mode else "sync",
+            "rate": options['rate'],
+            "duration": options['duration'],
+            "customers": traffic.customers,
+            "webhooks": {"sent": sent, "statuses": dict(traffic.statuses), **latency_summary(traffic.acks)},
+            "replies": {
+                "received": len(replies),
+                "unanswered": traffic.outstanding,
+                "unsolicited": traffic.unsolicited,
+                "per_second": round(len(replies) / busy, 1) if busy > 0 else 0,
+                **latency_summary(replies),
+            },
+            "intents": {
+                intent: {
+                    "sent": sent_per_intent[intent],
+                    "llm_calls": llm_calls[intent],
+                    **latency_summary(traffic.replies.get(intent, [])),
+                }
+                for intent in sorted(sent_per_intent)
+            },
+            "llm": {
+                "calls": sum(chains.values()),
+                "failed": llm_failures,
+                "chains": dict(chains),
+                "fallback_calls": len(fallback.calls) if fallback else 0,
+                **resilience_report,
+                "cache": dict(cache),
+                "classified_by": {source: stats["count"] for source, stats in classifier_stats.snapshot().items()},
+            },
+            "database": {
+                "vendor": connections['default'].vendor,
+                "writes": len(writes.durations),
+                "errors": dict(writes.errors),
+                **latency_summary(writes.durations),
+            },
+            "dead_letters": DeadLetterJob.objects.filter(
+                payload__entry__0__changes__0__value__messages__0__id__startswith=MESSAGE_PREFIX,
+            ).count(),
+        }
+
+        webhooks, replies_report, database = report["webhooks"], report["replies"], report["database"]
+        self.stdout.write(
+            f"Webhooks: {sent} sent to {traffic.customers} customers over {options['duration']:g}s "
+            f"(run took {elapsed:.1f}s), "
+            f"statuses {dict(traffic.statuses)}, ack {format_latency(webhooks)}"
+        )
+        self.stdout.write(
+            f"Replies: {replies_report['received']} ({replies_report['per_second']}/s), "
+            f"{replies_report['unanswered']} unanswered, {replies_report['unsolicited']} extra, "
+            f"end to end {format_latency(replies_report)}"
+        )
+        for intent, row in report["intents"].items():
+            per_turn = row["llm_calls"] / row["sent"] if row["sent"] else 0
+            self.stdout.write(
+                f"  {intent:<26} {row['sent']:>6} sent, {row['llm_calls']:>6} LLM calls ({per_turn:.2f}/message), "
+                f"{format_latency(row)}"
+            )
+        self.stdout.write(
+            f"LLM: {report['llm']['calls']} calls ({llm_failures} failed) {dict(chains)}, "
+            f"cache {dict(cache)}, classified by {report['llm']['classified_by']}"
+        )
+        self.stdout.write(
+            f"Resilience: {report['llm']['fallback_calls']} fallback model calls, "
+            f"circuit changes {resilience_report['circuit']}, local-rule answers {resilience_report['local_fallbacks']}"
+        )
+        self.stdout.write(
+            f"Database ({database['vendor']}): {database['writes']} writes, {format_latency(database)}, "
+            f"{sum(writes.errors.values())} errors {dict(writes.errors) or ''}".rstrip()
+        )
+        if report["dead_letters"]:
+            self.stdout.write(self.style.WARNING(f"{report['dead_letters']} job(s) dead-lettered"))
+        return report
+
+    def cleanup(self):
+        query = {"payload__entry__0__changes__0__value__messages__0__id__startswith": MESSAGE_PREFIX}
+        WebhookJob.objects.filter(**query).delete()
+        DeadLetterJob.objects.filter(**query).delete()
+        ProcessedMessage.objects.filter(message_id__startswith=MESSAGE_PREFIX).delete()
+
+        # Buffered interactions of deleted customers could never be written, and would sit in the spools
+        interaction_log.flush()
+        customers = Customer.objects.filter(phone_number__startswith=f"+{SENDER_PREFIX}")
+        interaction_log.discard(customers.values_list('pk', flat=True))
+        customers.delete()
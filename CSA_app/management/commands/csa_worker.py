@@ -0,0 +1,49 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from CSA_app.llm_registry import warm_up
+from CSA_app.metrics import serve_metrics
+from CSA_app.work_queue import Worker, get_queue_backend
+
+
+class Command(BaseCommand):
+    help = "Process queued WhatsApp webhook payloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, help="Number of jobs processed in parallel.")
+        parser.add_argument('--poll-interval', type=float, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit.")
+        parser.add_argument(
+            '--requeue-dead', action='store_true',
+            help="Move all dead-lettered jobs back onto the queue and exit.",
+        )
+        parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics for this worker on /metrics at this port.")
+        parser.add_argument(
+            '--metrics-address', default='127.0.0.1',
+            help="Address the metrics port listens on (default 127.0.0.1; keep it on an internal network).",
+        )
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            count = get_queue_backend().requeue_dead_letters()
+            self.stdout.write(self.style.SUCCESS(f"Requeued {count} dead-lettered job(s)."))
+            return
+
+        if options['metrics_port']:
+            serve_metrics(options['metrics_port'], options['metrics_address'])
+            self.stdout.write(f"Serving metrics on {options['metrics_address']}:{options['metrics_port']}")
+
+        # Every job needs the Gemini chains, so build them before taking work
+        warm_up()
+
+        worker = Worker(concurrency=options['concurrency'], poll_interval=options['poll_interval'])
+
+        def shutdown(signum, frame):
+            self.stdout.write("Shutting down after in-flight jobs finish...")
+            worker.stop()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        worker.run(once=options['once'])
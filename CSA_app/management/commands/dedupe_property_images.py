@@ -0,0 +1,59 @@
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from CSA_app.models import Property
+from CSA_app.storage import file_digest
+
+
+class Command(BaseCommand):
+    help = (
+        "Move existing property images into the content-addressed store: identical files collapse into one, "
+        "rows are repointed and the WhatsApp/web renditions are generated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-originals', action='store_true', help="Delete the old files once no row uses them.")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing.")
+
+    def handle(self, *args, **options):
+        if not hasattr(default_storage, 'hashed_name'):
+            raise CommandError("The default storage is not CSA_app.storage.ContentAddressedStorage")
+
+        default_image = Property._meta.get_field('image').default
+        names = Property.objects.exclude(image='').values_list('image', flat=True).distinct()
+        stored = set()
+        moved = missing = 0
+
+        for name in names.iterator():
+            if not default_storage.exists(name):
+                self.stderr.write(f"{name} is missing, skipped")
+                missing += 1
+                continue
+
+            with default_storage.open(name, 'rb') as content:
+                if options['dry_run']:
+                    new_name = default_storage.hashed_name(name, file_digest(File(content)))
+                else:
+                    new_name = default_storage.save(name, content)
+                    default_storage.save_renditions(new_name)
+
+            stored.add(new_name)
+            if new_name == name:
+                continue
+            moved += 1
+            self.stdout.write(f"{name} -> {new_name}")
+            if options['dry_run']:
+                continue
+
+            Property.objects.filter(image=name).update(image=new_name)
+            if name == default_image:
+                # New listings without a photo still point at the default name; keep it and render it
+                default_storage.save_renditions(name)
+            elif options['delete_originals']:
+                default_storage.delete(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{moved} file(s) moved into {len(stored)} stored image(s), {missing} missing"
+            + (" (dry run)" if options['dry_run'] else "")
+        ))
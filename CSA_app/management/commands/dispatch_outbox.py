@@ -0,0 +1,46 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from CSA_app.models import OutboxMessage
+from CSA_app.outbox import MakeDispatcher, outbox_status
+
+
+class Command(BaseCommand):
+    help = "Deliver queued property announcements to the Make.com webhook."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Messages claimed per batch.")
+        parser.add_argument('--concurrency', type=int, help="Deliveries in flight at once.")
+        parser.add_argument('--poll-interval', type=float, help="Seconds to wait when nothing is due.")
+        parser.add_argument('--once', action='store_true', help="Deliver everything that is due and exit.")
+        parser.add_argument('--status', action='store_true', help="Print the number of messages per status and exit.")
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help="Give failed messages a fresh retry budget and exit.",
+        )
+
+    def handle(self, *args, **options):
+        if options['status']:
+            for name, count in outbox_status().items():
+                self.stdout.write(f"{name:<10}{count:>8}")
+            return
+
+        if options['retry_failed']:
+            count = OutboxMessage.objects.filter(status=OutboxMessage.STATUS_FAILED).update(
+                status=OutboxMessage.STATUS_PENDING, attempts=0, available_at=timezone.now()
+            )
+            self.stdout.write(self.style.SUCCESS(f"Requeued {count} failed message(s)."))
+            return
+
+        dispatcher = MakeDispatcher(batch_size=options['batch_size'], concurrency=options['concurrency'])
+
+        def shutdown(signum, frame):
+            self.stdout.write("Shutting down after the current batch...")
+            dispatcher.stop()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        dispatcher.run(once=options['once'], poll_interval=options['poll_interval'])
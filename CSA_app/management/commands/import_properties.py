@@ -0,0 +1,157 @@
+import csv
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from CSA_app.catalog import bump_catalog_version
+from CSA_app.identifiers import advance_sequence, allocate_identifiers, numeric_identifier
+from CSA_app.models import Property, normalize_location
+from CSA_app.outbox import enqueue_properties
+
+REQUIRED_FIELDS = ('name', 'price', 'location', 'bedrooms', 'bathrooms')
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'available'}
+
+
+def read_rows(stream, file_format):
+    """Yield (line number, row dict) from a CSV or JSON-lines stream without loading it all."""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if line:
+            yield line_number, json.loads(line)
+
+
+def parse_image_urls(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, list):
+        return value
+    value = str(value).strip()
+    if value.startswith('['):
+        return json.loads(value)
+    return [url.strip() for url in value.split('|') if url.strip()]
+
+
+def build_property(row):
+    """Turn an input row into an unsaved Property. Raises ValueError for unusable rows."""
+    missing = [field for field in REQUIRED_FIELDS if row.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+
+    try:
+        price = Decimal(str(row['price']).replace(',', ''))
+    except InvalidOperation:
+        raise ValueError(f"invalid price {row['price']!r}")
+
+    is_available = row.get('is_available')
+    property_obj = Property(
+        name=str(row['name']).strip(),
+        description=str(row.get('description') or ''),
+        price=price,
+        location=str(row['location']).strip(),
+        bedrooms=int(row['bedrooms']),
+        bathrooms=int(row['bathrooms']),
+        is_available=True if is_available in (None, '') else str(is_available).strip().lower() in TRUE_VALUES,
+        image_urls=parse_image_urls(row.get('image_urls')),
+        property_identifier=str(row.get('property_identifier') or '').strip(),
+    )
+    if row.get('image'):
+        property_obj.image = row['image']
+    property_obj.location_normalized = normalize_location(property_obj.location)
+    return property_obj
+
+
+class Command(BaseCommand):
+    help = (
+        "Import property listings from a CSV or JSON-lines file. Rows are inserted with bulk_create in "
+        "chunks, identifiers come from the property sequence, and Make.com announcements are queued in bulk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file, or '-' for standard input.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Input format; guessed from the file extension by default.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per INSERT chunk.")
+        parser.add_argument('--no-notify', action='store_true', help="Do not queue Make.com announcements.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        if path == '-' and not options['format']:
+            raise CommandError("--format is required when reading from standard input")
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        imported = skipped = 0
+        start = time.perf_counter()
+
+        try:
+            rows = read_rows(stream, file_format)
+            while True:
+                chunk = list(islice(rows, options['batch_size']))
+                if not chunk:
+                    break
+
+                properties = []
+                for line_number, row in chunk:
+                    try:
+                        properties.append(build_property(row))
+                    except (ValueError, TypeError) as e:
+                        skipped += 1
+                        self.stderr.write(f"Line {line_number} skipped: {e}")
+
+                imported += self.insert(properties, notify=not options['no_notify'])
+
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f"{imported} imported, {skipped} skipped ({imported / elapsed:,.0f} rows/s)")
+        except (json.JSONDecodeError, csv.Error) as e:
+            raise CommandError(f"Could not read {path}: {e}")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if imported:
+                # bulk_create sends no signals
+                bump_catalog_version()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} properties in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):,.0f} rows/s), "
+            f"{skipped} skipped"
+        ))
+
+    def insert(self, properties, notify=True):
+        if not properties:
+            return 0
+
+        with transaction.atomic():
+            # Explicit identifiers from the file must not be handed out again by the sequence
+            explicit = [
+                numeric_identifier(property_obj.property_identifier)
+                for property_obj in properties if property_obj.property_identifier
+            ]
+            explicit = [number for number in explicit if number is not None]
+            if explicit:
+                advance_sequence(max(explicit) + 1)
+
+            without_identifier = [property_obj for property_obj in properties if not property_obj.property_identifier]
+            identifiers = allocate_identifiers(len(without_identifier)) if without_identifier else ()
+            for property_obj, identifier in zip(without_identifier, identifiers):
+                property_obj.property_identifier = str(identifier)
+
+            try:
+                created = Property.objects.bulk_create(properties)
+            except IntegrityError as e:
+                raise CommandError(f"Chunk rejected, is a property_identifier already taken? {e}")
+            if notify:
+                enqueue_properties(created)
+
+        return len(created)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from CSA_app.media import get_image_index, stored_image_hash
+from CSA_app.models import ImageHash, Property
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute the perceptual hash of every property image that has none yet. "
+        "Saving a property does this for its photo; run it after bulk imports and loaddata."
+    )
+
+    def handle(self, *args, **options):
+        hashed = set(ImageHash.objects.values_list('name', flat=True))
+        names = Property.objects.exclude(image='').values_list('image', flat=True).distinct()
+        added = failed = 0
+
+        for name in names.iterator():
+            if name in hashed:
+                continue
+            try:
+                stored_image_hash(name)
+            except Exception as e:
+                self.stderr.write(f"{name}: {e}")
+                failed += 1
+            else:
+                added += 1
+
+        index = get_image_index()
+        index.load()
+        self.stdout.write(self.style.SUCCESS(
+            f"{added} image(s) hashed, {failed} failed; {len(index)} listing photo(s) in the index"
+        ))
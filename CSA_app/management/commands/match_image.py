@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from CSA_app.media import get_image_index, match_inbound_image, phash_file
+from CSA_app.stubs import StubGraphServer
+from CSA_app.whatsapp_sender import WhatsAppClient
+
+
+class Command(BaseCommand):
+    help = (
+        "Match an image file against the listing photos. With --via-stub the file goes through the real "
+        "inbound pipeline (Graph metadata, streamed download, hash, index) served by a local stub Graph API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Image file, e.g. a listing photo forwarded from WhatsApp.")
+        parser.add_argument('--via-stub', action='store_true', help="Download it from a local stub Graph API.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        index = get_image_index()
+        self.stdout.write(f"Index: {len(index)} listing photo(s), loaded in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        if options['via_stub']:
+            with open(options['path'], 'rb') as f, StubGraphServer() as stub:
+                media_id = stub.add_media(f.read())
+                client = WhatsAppClient(access_token="stub", phone_number_id="0", api_url=stub.url)
+                try:
+                    start = time.perf_counter()
+                    identifier = match_inbound_image({'id': media_id}, client=client)
+                    elapsed = (time.perf_counter() - start) * 1000
+                finally:
+                    client.close()
+        else:
+            start = time.perf_counter()
+            value = phash_file(options['path'])
+            identifier = index.match(value)
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stdout.write(f"pHash {value:016x}")
+
+        if identifier:
+            self.stdout.write(self.style.SUCCESS(f"Property {identifier} ({elapsed:.1f}ms)"))
+        else:
+            self.stdout.write(f"No matching listing ({elapsed:.1f}ms)")
@@ -0,0 +1,56 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from CSA_app.intent_classifier import IntentModel
+from CSA_app.models import Interaction
+
+# Interaction types written by the handlers and the intent that produced them.
+INTERACTION_INTENTS = {
+    "inquiry": "property_inquiry",
+    "budget_sharing": "budget_sharing",
+    "post_inspection": "post_inspection_feedback",
+    "payment_info": "payment_method",
+    "genaral_query": "general_query",
+    "general_query": "general_query",
+}
+
+NOTE_PREFIXES = re.compile(r"^(?:Feedback|Payment info):\s*")
+NOTE_SUFFIX = re.compile(r"\s*\(Sentiment: \w+\)$")
+
+
+def interaction_text(notes):
+    """Recover the customer's original message from an interaction's notes."""
+    return NOTE_SUFFIX.sub("", NOTE_PREFIXES.sub("", notes or "")).strip()
+
+
+class Command(BaseCommand):
+    help = "Train the local intent model used by the fast-path classifier from logged interactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help="Where to write the model (defaults to CSA_INTENT_MODEL_PATH).")
+        parser.add_argument('--min-samples', type=int, default=50, help="Refuse to train on fewer rows than this.")
+
+    def handle(self, *args, **options):
+        texts, labels = [], []
+        rows = Interaction.objects.filter(Interaction_type__in=INTERACTION_INTENTS).values_list('Interaction_type', 'notes')
+        for interaction_type, notes in rows.iterator():
+            text = interaction_text(notes)
+            if text:
+                texts.append(text)
+                labels.append(INTERACTION_INTENTS[interaction_type])
+
+        if len(texts) < options['min_samples']:
+            raise CommandError(f"Only {len(texts)} usable interactions found, need at least {options['min_samples']}.")
+        if len(set(labels)) < 2:
+            raise CommandError("Training needs interactions from at least two intents.")
+
+        try:
+            model = IntentModel.train(texts, labels)
+        except ImportError:
+            raise CommandError("scikit-learn is required to train the intent model: pip install scikit-learn")
+
+        output = options['output'] or settings.CSA_INTENT_MODEL_PATH
+        model.save(output)
+        self.stdout.write(self.style.SUCCESS(f"Trained on {len(texts)} interactions; model saved to {output}"))
@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from . import metrics
+from .catalog import current_version
+from .models import ImageHash, Property
+
+logger = logging.getLogger(__name__)
+
+
+# Perceptual hashing
+
+HASH_SIZE = 8      # 8x8 low frequencies -> 64-bit hash
+SAMPLE_SIZE = 32   # the image is reduced to 32x32 grey levels first
+
+# DCT-II basis, only the rows for the frequencies the hash keeps
+_DCT = [
+    [math.cos(math.pi * (2 * n + 1) * k / (2 * SAMPLE_SIZE)) for n in range(SAMPLE_SIZE)]
+    for k in range(HASH_SIZE)
+]
+
+
+def phash_image(image):
+    """64-bit perceptual hash (DCT pHash) of a Pillow image.
+
+    Resized, recompressed or lightly edited copies of a photo (what WhatsApp
+    does to a forwarded image) land within a few bits of the original.
+    """
+    from PIL import Image, ImageOps
+
+    image = ImageOps.exif_transpose(image).convert("L").resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.Resampling.LANCZOS)
+    pixels = list(image.getdata())
+    rows = [pixels[y * SAMPLE_SIZE:(y + 1) * SAMPLE_SIZE] for y in range(SAMPLE_SIZE)]
+
+    # Separable 2D DCT restricted to the lowest HASH_SIZE x HASH_SIZE frequencies
+    by_row = [[sum(c * p for c, p in zip(basis, row)) for basis in _DCT] for row in rows]
+    coefficients = [
+        sum(basis[y] * by_row[y][v] for y in range(SAMPLE_SIZE))
+        for basis in _DCT for v in range(HASH_SIZE)
+    ]
+
+    # The DC term is the mean brightness, leave it out of the median
+    median = sorted(coefficients[1:])[len(coefficients) // 2 - 1]
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+
+def phash_file(file):
+    """pHash of an image file (path or binary file object)."""
+    from PIL import Image
+
+    with Image.open(file) as image:
+        # JPEGs decode at a fraction of their size, enough for a 32x32 sample
+        image.draft("L", (SAMPLE_SIZE * 4, SAMPLE_SIZE * 4))
+        return phash_image(image)
+
+
+def stored_image_hash(name):
+    """pHash of a stored image, computed once per file and kept in ``ImageHash``."""
+    row = ImageHash.objects.filter(name=name).values_list('phash', flat=True).first()
+    if row is not None:
+        return int(row, 16)
+
+    with default_storage.open(name, 'rb') as f:
+        value = phash_file(f)
+    ImageHash.objects.get_or_create(name=name, defaults={'phash': f"{value:016x}"})
+    return value
+
+
+# Index of listing photos
+
+class ImageIndex:
+    """pHashes of every listing photo, for matching an inbound image to its property.
+
+    Hashes are precomputed per stored file (``ImageHash``); the index maps them
+    to property identifiers and answers with the closest one within
+    ``CSA_IMAGE_MATCH_MAX_DISTANCE`` bits. A photo shared by several listings
+    (the default image) identifies none of them and is left out. Rebuilt when
+    the catalog version changes, like the property catalog.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = ()
+        self._version = None
+        self._checked_at = 0.0
+
+    def load(self):
+        version = current_version()
+        hashes = dict(ImageHash.objects.values_list('name', 'phash'))
+        photos = {}
+        for identifier, image in Property.objects.exclude(image='').values_list('property_identifier', 'image'):
+            if image in hashes:
+                photos.setdefault(image, []).append(identifier)
+
+        entries = tuple(
+            (int(hashes[image], 16), identifiers[0]) for image, identifiers in photos.items() if len(identifiers) == 1
+        )
+        with self._lock:
+            self._entries = entries
+            self._version = version
+            self._checked_at = time.monotonic()
+        logger.info("Image index loaded: %s listing photos (version %s)", len(entries), version)
+
+    def ensure_fresh(self):
+        if self._version is None:
+            self.load()
+        elif time.monotonic() - self._checked_at >= settings.CSA_CATALOG_CHECK_INTERVAL:
+            self._checked_at = time.monotonic()
+            if current_version() != self._version:
+                self.load()
+
+    def match(self, value, max_distance=None):
+        """Identifier of the listing whose photo is closest to ``value``, or None."""
+        max_distance = settings.CSA_IMAGE_MATCH_MAX_DISTANCE if max_distance is None else max_distance
+        best, best_distance = None, max_distance + 1
+        for photo_hash, identifier in self._entries:
+            distance = (photo_hash ^ value).bit_count()
+            if distance < best_distance:
+                best, best_distance = identifier, distance
+        if best is not None:
+            logger.info("Inbound image matches property %s (distance %s)", best, best_distance)
+        return best
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_index = ImageIndex()
+
+
+def get_image_index():
+    _index.ensure_fresh()
+    return _index
+
+
+def property_saved(instance):
+    """Hash a listing's photo when it is saved, so the index only has to read the table."""
+    if not instance.image:
+        return
+    try:
+        stored_image_hash(instance.image.name)
+    except Exception as e:
+        logger.warning("Could not hash image %s of property %s: %s", instance.image.name, instance.pk, e)
+
+
+# Inbound media
+
+class MediaTooLarge(Exception):
+    pass
+
+
+def download_media(media_id, client=None):
+    """Stream an inbound WhatsApp media file to ``CSA_MEDIA_INBOX_DIR`` and return its path.
+
+    The Graph API first returns the media's metadata (a short-lived URL, the
+    size and SHA-256), then the file is fetched in ``CSA_MEDIA_CHUNK_SIZE``
+    chunks, so memory stays flat whatever the size. Files larger than
+    ``CSA_MEDIA_MAX_BYTES`` are abandoned. The caller removes the file.
+    """
+    from .whatsapp_sender import get_client
+
+    client = client or get_client()
+    timeout = client.timeout
+
+    response = client.session.get(f"{client.api_url}/{media_id}", timeout=timeout)
+    response.raise_for_status()
+    meta = response.json()
+    if int(meta.get('file_size') or 0) > settings.CSA_MEDIA_MAX_BYTES:
+        raise MediaTooLarge(f"media {media_id} is {meta['file_size']} bytes")
+
+    os.makedirs(settings.CSA_MEDIA_INBOX_DIR, exist_ok=True)
+    sha = hashlib.sha256()
+    size = 0
+    with client.session.get(meta['url'], stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        with tempfile.NamedTemporaryFile(dir=settings.CSA_MEDIA_INBOX_DIR, prefix="inbound-", delete=False) as f:
+            try:
+                for chunk in response.iter_content(chunk_size=settings.CSA_MEDIA_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > settings.CSA_MEDIA_MAX_BYTES:
+                        raise MediaTooLarge(f"media {media_id} is over {settings.CSA_MEDIA_MAX_BYTES} bytes")
+                    sha.update(chunk)
+                    f.write(chunk)
+            except BaseException:
+                f.close()
+                os.remove(f.name)
+                raise
+
+    if meta.get('sha256') and meta['sha256'] != sha.hexdigest():
+        logger.warning("Media %s does not match the SHA-256 the Graph API reported", media_id)
+    return f.name
+
+
+def match_inbound_image(image_message, client=None):
+    """Identifier of the listing shown in an inbound WhatsApp image, or None.
+
+    No model call: the photo is downloaded, hashed and looked up in the image
+    index. Any failure just means no match.
+    """
+    media_id = (image_message or {}).get('id')
+    if not media_id or not settings.CSA_IMAGE_MATCHING:
+        return None
+
+    try:
+        with metrics.span("media_download"):
+            path = download_media(media_id, client=client)
+        try:
+            with metrics.span("image_match"):
+                return get_image_index().match(phash_file(path))
+        finally:
+            os.remove(path)
+    except Exception as e:
+        logger.warning("Could not match inbound image %s: %s", media_id, e)
+        return None
@@ -0,0 +1,217 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Seconds; covers fast-path classification (sub-millisecond) up to slow Gemini calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    """Base for the in-process metrics. Values are kept per label tuple."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple([str(labels.get(label, "")) for label in self.labelnames])
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not settings.CSA_METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {value}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not settings.CSA_METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _render_value(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else repr(float(bound))
+            lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', le)])} {cumulative}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "csa_stage_seconds", "Time spent in each stage of a conversation turn.", ["stage"],
+)
+turn_seconds = registry.histogram(
+    "csa_turn_seconds", "Time to process one conversation turn, by intent.", ["intent"],
+)
+turns = registry.counter("csa_turns_total", "Conversation turns processed, by intent.", ["intent"])
+turn_failures = registry.counter("csa_turn_failures_total", "Conversation turns that raised an error.")
+coalesced_messages = registry.counter(
+    "csa_coalesced_messages_total", "Customer messages answered in the same turn as an earlier message.",
+)
+intent_sources = registry.counter(
+    "csa_intent_classifications_total", "Intents classified, by the path that decided them.", ["source"],
+)
+llm_seconds = registry.histogram(
+    "csa_llm_call_seconds", "Duration of Gemini calls (cache misses), by chain.", ["chain"],
+)
+llm_calls = registry.counter(
+    "csa_llm_calls_total", "Chain invocations, by chain and cache outcome.", ["chain", "cache"],
+)
+llm_errors = registry.counter("csa_llm_errors_total", "Gemini calls that raised an error, by chain.", ["chain"])
+llm_tokens = registry.counter(
+    "csa_llm_tokens_total", "Tokens reported by Gemini, by chain and direction.", ["chain", "direction"],
+)
+llm_circuit_changes = registry.counter(
+    "csa_llm_circuit_changes_total", "Circuit breaker state changes, by model provider and new state.", ["provider", "state"],
+)
+llm_local_fallbacks = registry.counter(
+    "csa_llm_local_fallbacks_total", "Answers worked out by local rules because no model answered, by step.", ["step"],
+)
+whatsapp_sends = registry.counter(
+    "csa_whatsapp_messages_total", "Outbound WhatsApp messages, by result.", ["result"],
+)
+
+
+@contextmanager
+def span(stage):
+    """Time a block of a conversation turn into ``csa_stage_seconds``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_llm_result(chain, result):
+    """Count the tokens of a chat model answer, when the model reported them."""
+    usage = getattr(result, "usage_metadata", None)
+    if usage:
+        llm_tokens.inc(usage.get("input_tokens", 0), chain=chain, direction="input")
+        llm_tokens.inc(usage.get("output_tokens", 0), chain=chain, direction="output")
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def serve_metrics(port, address="127.0.0.1"):
+    """Expose ``/metrics`` on its own port from a daemon thread, for processes without a web server (csa_worker).
+
+    Bound to localhost unless ``address`` says otherwise; there is no token check on this port.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="csa-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,45 @@
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .log import correlation, new_request_id
+
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestIdMiddleware:
+    """Gives every request a correlation id for the logs.
+
+    An ``X-Request-ID`` sent by a proxy is reused when it looks sane, otherwise
+    a new id is generated. The id is returned in the response header and
+    stored on queued webhook jobs, so the worker's records carry it too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _request_id(self, request):
+        request_id = request.headers.get('X-Request-ID', '')
+        return request_id if REQUEST_ID_PATTERN.match(request_id) else new_request_id()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        request_id = self._request_id(request)
+        with correlation(request_id=request_id):
+            response = self.get_response(request)
+        response['X-Request-ID'] = request_id
+        return response
+
+    async def __acall__(self, request):
+        request_id = self._request_id(request)
+        with correlation(request_id=request_id):
+            response = await self.get_response(request)
+        response['X-Request-ID'] = request_id
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:33
+
+import re
+
+from django.db import migrations, models
+
+
+def normalize_location(location):
+    # Copy of CSA_app.models.normalize_location as of this migration
+    return " ".join(re.findall(r"[a-z0-9]+", (location or "").lower()))
+
+
+def fill_location_normalized(apps, schema_editor):
+    Property = apps.get_model('CSA_app', 'Property')
+    properties = list(Property.objects.only('id', 'location'))
+    for prop in properties:
+        prop.location_normalized = normalize_location(prop.location)
+    Property.objects.bulk_update(properties, ['location_normalized'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CSA_app', '0009_processedmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='location_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_location_normalized, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['is_available', 'price', 'bedrooms', 'location_normalized'], name='CSA_app_pro_is_avai_9a6b8d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['location_normalized', 'bedrooms'], name='CSA_app_pro_locatio_c2cbfc_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+def start_property_sequence(apps, schema_editor):
+    Property = apps.get_model('CSA_app', 'Property')
+    IdentifierSequence = apps.get_model('CSA_app', 'IdentifierSequence')
+
+    highest = 0
+    for identifier in Property.objects.values_list('property_identifier', flat=True):
+        digits = identifier.lstrip('#')
+        if digits.isdigit():
+            highest = max(highest, int(digits))
+    IdentifierSequence.objects.create(name='property', next_value=max(highest + 1, 100000))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CSA_app', '0012_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentifierSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(start_property_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CSA_app', '0013_identifiersequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['created_at', 'id'], name='CSA_app_pro_created_3380f9_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CSA_app', '0014_property_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationState',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='CSA_app.customer')),
+                ('stage', models.CharField(default='new', max_length=30)),
+                ('pending_question', models.CharField(blank=True, max_length=30)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='interaction',
+            index=models.Index(fields=['customer', 'Interaction_type', 'timestamp'], name='CSA_app_int_custome_b3b0b9_idx'),
+        ),
+        migrations.AddField(
+            model_name='conversationstate',
+            name='property',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='CSA_app.property'),
+        ),
+    ]
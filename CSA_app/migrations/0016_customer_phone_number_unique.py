@@ -0,0 +1,82 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:45
+
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def normalize_phone(raw):
+    # Copy of CSA_app.phones.normalize_phone as of this migration
+    raw = str(raw or '').strip()
+    digits = re.sub(r'\D', '', raw)
+    country_code = str(settings.CSA_DEFAULT_COUNTRY_CODE)
+
+    if raw.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith('0'):
+        digits = country_code + digits[1:]
+    elif len(digits) <= 10:
+        digits = country_code + digits
+
+    if not 8 <= len(digits) <= 15:
+        raise ValueError(f"Not a valid phone number: {raw!r}")
+    return f"+{digits}"
+
+
+def normalize_and_merge_customers(apps, schema_editor):
+    """Normalize phone numbers to E.164 and fold duplicate customers into the oldest one."""
+    Customer = apps.get_model('CSA_app', 'Customer')
+    Interaction = apps.get_model('CSA_app', 'Interaction')
+    ConversationState = apps.get_model('CSA_app', 'ConversationState')
+
+    groups = defaultdict(list)
+    for customer in Customer.objects.order_by('created_at', 'id'):
+        try:
+            phone_number = normalize_phone(customer.phone_number)
+        except ValueError:
+            phone_number = customer.phone_number
+        groups[phone_number].append(customer)
+
+    for phone_number, customers in groups.items():
+        keeper, duplicates = customers[0], customers[1:]
+        for duplicate in duplicates:
+            # The newest budget and preferences win
+            if duplicate.budget is not None:
+                keeper.budget = duplicate.budget
+            keeper.preferences = {**(keeper.preferences or {}), **(duplicate.preferences or {})}
+            keeper.name = keeper.name or duplicate.name
+
+        duplicate_ids = [duplicate.id for duplicate in duplicates]
+        if duplicate_ids:
+            Interaction.objects.filter(customer_id__in=duplicate_ids).update(customer_id=keeper.id)
+            if not ConversationState.objects.filter(customer_id=keeper.id).exists():
+                state = ConversationState.objects.filter(customer_id__in=duplicate_ids).order_by('-updated_at').first()
+                if state is not None:
+                    ConversationState.objects.create(
+                        customer_id=keeper.id, stage=state.stage, property_id=state.property_id,
+                        pending_question=state.pending_question,
+                    )
+            Customer.objects.filter(id__in=duplicate_ids).delete()
+
+        keeper.phone_number = phone_number
+        keeper.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CSA_app', '0015_conversationstate'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_and_merge_customers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customer',
+            name='phone_number',
+            field=models.CharField(max_length=20, unique=True),
+        ),
+    ]
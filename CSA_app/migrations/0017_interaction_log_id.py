@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CSA_app', '0016_customer_phone_number_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interaction',
+            name='log_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='interaction',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
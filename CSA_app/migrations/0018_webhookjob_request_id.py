@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CSA_app', '0017_interaction_log_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookjob',
+            name='request_id',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CSA_app', '0019_imagehash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookjob',
+            name='sender',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='webhookjob',
+            index=models.Index(fields=['sender'], name='CSA_app_web_sender_52ad5b_idx'),
+        ),
+    ]
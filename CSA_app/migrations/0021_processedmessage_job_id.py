@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CSA_app', '0020_webhookjob_sender'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processedmessage',
+            name='job_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,8 +1,15 @@
 from django.db import models
-import random
+from django.utils import timezone
+import re
 import string
 # Create your models here.
 
+
+def normalize_location(location):
+    """Lower-case a location and reduce it to words, e.g. 'Plot 45, Lekki Phase 1' -> 'plot 45 lekki phase 1'."""
+    return " ".join(re.findall(r"[a-z0-9]+", (location or "").lower()))
+
+
 class Property(models.Model):
 
     name = models.CharField(max_length=255)
@@ -16,15 +23,28 @@ class Property(models.Model):
     image_urls = models.JSONField(blank=True, null=True)
     image = models.ImageField(upload_to='property_images/', default='property_images/default.jpg')
     property_identifier = models.CharField(max_length=255, unique=True, blank=True, editable=False)
-    
+    location_normalized = models.CharField(max_length=255, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # bedrooms and location_normalized make the index covering for recommendation scoring
+            models.Index(fields=['is_available', 'price', 'bedrooms', 'location_normalized']),
+            models.Index(fields=['location_normalized', 'bedrooms']),
+            # Cursor pagination of the property list API
+            models.Index(fields=['created_at', 'id']),
+        ]
+
     def generate_property_id(self):
-        """Generate a custom property identifier (e.g., #12345)"""
-        return f"{random.randint(10000, 99999)}"  # Generates a number like #12345
+        """Take the next identifier from the property sequence (e.g., 100042)"""
+        from .identifiers import next_property_identifier
+
+        return f"{next_property_identifier()}"
 
     def save(self, *args, **kwargs):
         """Override the save method to set a custom property identifier"""
         if not self.property_identifier:  # If the property identifier isn't already set
             self.property_identifier = self.generate_property_id()
+        self.location_normalized = normalize_location(self.location)
         super(Property, self).save(*args, **kwargs)
 
 
@@ -35,9 +55,19 @@ class Customer(models.Model):
     
     name = models.CharField(max_length=255)
     budget = models.DecimalField(max_digits=10, decimal_places=2, null=True)
-    phone_number = models.CharField(max_length=20)
+    phone_number = models.CharField(max_length=20, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     preferences = models.JSONField(null=True, blank=True, default=dict)
+
+    def save(self, *args, **kwargs):
+        """Store the phone number in E.164 so every spelling of it maps to one customer"""
+        from .phones import normalize_phone
+
+        try:
+            self.phone_number = normalize_phone(self.phone_number)
+        except ValueError:
+            pass
+        super(Customer, self).save(*args, **kwargs)
     
     def __str__(self):
         return self.phone_number or 'Unknown Customer'
@@ -46,9 +76,151 @@ class Interaction(models.Model):
     
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     property = models.ForeignKey(Property, on_delete=models.CASCADE, null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the interaction happened, not when a buffered row reaches the database
+    timestamp = models.DateTimeField(default=timezone.now)
     Interaction_type = models.CharField(max_length=255)
     notes = models.TextField(null=True)
+    # Lets a replayed interaction spool skip rows that were already written
+    log_id = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'Interaction_type', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f'{self.customer.name} - {self.property.name}'
+
+
+class WebhookJob(models.Model):
+    """An inbound WhatsApp webhook payload waiting to be processed by a worker."""
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+    ]
+
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+    request_id = models.CharField(max_length=64, blank=True, default='')  # correlation id of the webhook request, for the logs
+    # Customer whose messages the payload holds; empty for status updates. A customer's jobs run one at a time.
+    sender = models.CharField(max_length=32, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['sender']),
+        ]
+
+    def __str__(self):
+        return f'Job {self.pk} ({self.status}, attempt {self.attempts})'
+
+
+class DeadLetterJob(models.Model):
+    """A webhook job that kept failing after all of its retries."""
+
+    payload = models.JSONField()
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    enqueued_at = models.DateTimeField()
+    failed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Dead job {self.pk} (failed {self.failed_at:%Y-%m-%d %H:%M})'
+
+
+class ProcessedMessage(models.Model):
+    """Id of a WhatsApp message that has already been handled, used to drop redeliveries."""
+
+    message_id = models.CharField(max_length=255, unique=True)
+    # Queue job that claimed it; the same job reclaimed after a lost lease may claim it again
+    job_id = models.BigIntegerField(null=True, blank=True)
+    processed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.message_id
+
+
+class CatalogVersion(models.Model):
+    """Single-row counter bumped on every Property change so each worker knows when its in-memory catalog is stale."""
+
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Catalog version {self.version}'
+
+
+class OutboxMessage(models.Model):
+    """A property announcement waiting to be delivered to the Make.com webhook."""
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    property = models.ForeignKey(Property, on_delete=models.SET_NULL, null=True, blank=True)
+    payload = models.JSONField()
+    image = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+
+    def __str__(self):
+        return f'Outbox {self.pk} ({self.status}, attempt {self.attempts})'
+
+
+class IdentifierSequence(models.Model):
+    """Next free number of a named identifier sequence (see ``identifiers.allocate_identifiers``)."""
+
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField()
+
+    def __str__(self):
+        return f'{self.name}: {self.next_value}'
+
+
+class ConversationState(models.Model):
+    """Where a customer's WhatsApp conversation stands (see ``conversation.py``)."""
+
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True)
+    stage = models.CharField(max_length=30, default='new')
+    property = models.ForeignKey(Property, on_delete=models.SET_NULL, null=True, blank=True)
+    pending_question = models.CharField(max_length=30, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.customer_id}: {self.stage}'
+
+
+class ImageHash(models.Model):
+    """Perceptual hash of a stored image, for matching photos customers send (see ``media.py``)."""
+
+    name = models.CharField(max_length=255, unique=True)  # storage name; content-addressed, so one hash per content
+    phash = models.CharField(max_length=16)  # 64-bit pHash as hex
+    created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f'{self.customer.name} - {self.property.name}'
\ No newline at end of file
+        return f'{self.name}: {self.phash}'
@@ -0,0 +1,208 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .models import OutboxMessage
+from .storage import image_rendition
+
+logger = logging.getLogger(__name__)
+
+
+def make_payload(property_obj):
+    """Form fields Make.com expects for a new listing."""
+    return {
+        "title": str(property_obj.name),
+        "description": str(property_obj.description),
+        "price": str(property_obj.price),
+        "location": str(property_obj.location),
+        "image_url": str(property_obj.image_urls),
+    }
+
+
+def outbox_message_for(property_obj):
+    """Unsaved outbox row announcing ``property_obj``."""
+    return OutboxMessage(
+        property=property_obj,
+        payload=make_payload(property_obj),
+        image=property_obj.image.name if property_obj.image else '',
+    )
+
+
+def enqueue_property(property_obj):
+    message = outbox_message_for(property_obj)
+    message.save()
+    return message
+
+
+def enqueue_properties(properties, batch_size=500):
+    """Queue announcements for many listings with one INSERT per batch."""
+    return OutboxMessage.objects.bulk_create(
+        [outbox_message_for(property_obj) for property_obj in properties], batch_size=batch_size
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff (in seconds) before the next delivery attempt."""
+    delay = settings.CSA_OUTBOX_RETRY_BACKOFF * (2 ** max(attempts - 1, 0))
+    return min(delay, settings.CSA_OUTBOX_RETRY_BACKOFF_MAX)
+
+
+def claim_batch(limit):
+    """Reserve up to ``limit`` due messages, the same way ``DatabaseQueueBackend.claim`` reserves jobs."""
+    now = timezone.now()
+    lease_expired = now - timedelta(seconds=settings.CSA_OUTBOX_VISIBILITY_TIMEOUT)
+
+    candidates = OutboxMessage.objects.filter(
+        Q(status=OutboxMessage.STATUS_PENDING, available_at__lte=now)
+        | Q(status=OutboxMessage.STATUS_SENDING, locked_at__lt=lease_expired)
+    ).order_by('available_at', 'id').values_list('id', 'status', 'locked_at')[:limit * 2]
+
+    claimed_ids = []
+    for message_id, status, locked_at in candidates:
+        claimed = OutboxMessage.objects.filter(
+            pk=message_id, status=status, locked_at=locked_at
+        ).update(
+            status=OutboxMessage.STATUS_SENDING,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            claimed_ids.append(message_id)
+        if len(claimed_ids) >= limit:
+            break
+
+    return list(OutboxMessage.objects.filter(pk__in=claimed_ids).order_by('available_at', 'id'))
+
+
+def outbox_status():
+    """Number of outbox messages per status."""
+    counts = dict(OutboxMessage.objects.values_list('status').annotate(count=Count('id')).order_by())
+    return {status: counts.get(status, 0) for status, _ in OutboxMessage.STATUS_CHOICES}
+
+
+class MakeDispatcher:
+    """Delivers outbox messages to the Make.com webhook in batches.
+
+    One pooled ``requests.Session`` is shared by the delivery threads so
+    connections to Make.com are reused across messages and batches. Failed
+    deliveries are retried with exponential backoff and marked failed after
+    ``CSA_OUTBOX_MAX_ATTEMPTS``.
+    """
+
+    def __init__(self, url=None, batch_size=None, concurrency=None, timeout=None):
+        self.url = url or settings.CSA_MAKE_WEBHOOK_URL
+        self.batch_size = batch_size or settings.CSA_OUTBOX_BATCH_SIZE
+        self.concurrency = concurrency or settings.CSA_OUTBOX_CONCURRENCY
+        self.timeout = timeout or settings.CSA_MAKE_TIMEOUT
+        self._stop = threading.Event()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        self.session.close()
+
+    def post(self, message):
+        image = None
+        # The compressed WhatsApp rendition when there is one, not the original upload
+        image_name = image_rendition(message.image)
+        if image_name and default_storage.exists(image_name):
+            image = default_storage.open(image_name, 'rb')
+        elif image_name:
+            logger.warning("Outbox %s: image %s not found, sending without it", message.pk, image_name)
+
+        try:
+            files = {'image': (image_name, image, 'image/jpeg')} if image else None
+            response = self.session.post(self.url, data=message.payload, files=files, timeout=self.timeout)
+            response.raise_for_status()
+        finally:
+            if image:
+                image.close()
+
+    def deliver(self, message):
+        """Send one message and record the outcome. Returns True when it was delivered."""
+        try:
+            self.post(message)
+        except (requests.RequestException, OSError) as e:
+            error = str(e)
+        except Exception as e:
+            # A bad payload or database error must not abort the rest of the batch
+            logger.exception("Outbox %s: unexpected error while sending", message.pk)
+            error = f"{type(e).__name__}: {e}"
+        else:
+            error = None
+
+        try:
+            if error is not None:
+                self.record_failure(message, error)
+                return False
+            OutboxMessage.objects.filter(pk=message.pk).update(
+                status=OutboxMessage.STATUS_SENT, sent_at=timezone.now(), locked_at=None, last_error=None
+            )
+            return True
+        except Exception:
+            # The lease expires and the message is claimed again
+            logger.exception("Outbox %s: could not record the delivery outcome", message.pk)
+            return False
+        finally:
+            close_old_connections()
+
+    def record_failure(self, message, error):
+        if message.attempts >= settings.CSA_OUTBOX_MAX_ATTEMPTS:
+            OutboxMessage.objects.filter(pk=message.pk).update(
+                status=OutboxMessage.STATUS_FAILED, locked_at=None, last_error=error
+            )
+            logger.error("Outbox %s failed after %s attempts: %s", message.pk, message.attempts, error)
+            return
+
+        delay = retry_delay(message.attempts)
+        OutboxMessage.objects.filter(pk=message.pk).update(
+            status=OutboxMessage.STATUS_PENDING,
+            locked_at=None,
+            last_error=error,
+            available_at=timezone.now() + timedelta(seconds=delay),
+        )
+        logger.warning("Outbox %s failed (attempt %s), retrying in %.1fs: %s", message.pk, message.attempts, delay, error)
+
+    def dispatch_batch(self):
+        """Claim and deliver one batch. Returns (claimed, delivered)."""
+        messages = claim_batch(self.batch_size)
+        close_old_connections()
+        if not messages:
+            return 0, 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='csa-outbox') as pool:
+            delivered = sum(pool.map(self.deliver, messages))
+
+        logger.info("Outbox batch: %s/%s delivered", delivered, len(messages))
+        return len(messages), delivered
+
+    def run(self, once=False, poll_interval=None):
+        """Deliver messages until stopped. With ``once`` the outbox is drained of due messages and the call returns."""
+        poll_interval = poll_interval or settings.CSA_OUTBOX_POLL_INTERVAL
+        logger.info("Outbox dispatcher started for %s", self.url)
+
+        while not self._stop.is_set():
+            claimed, _ = self.dispatch_batch()
+            if claimed:
+                continue
+            if once:
+                break
+            self._stop.wait(poll_interval)
+
+        self.close()
+        logger.info("Outbox dispatcher stopped")
@@ -0,0 +1,11 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class PropertyCursorPagination(CursorPagination):
+    """Newest listings first. Cursors seek on the (created_at, id) index instead of counting OFFSET rows."""
+
+    ordering = ('-created_at', '-id')
+    page_size = settings.CSA_PROPERTY_API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.CSA_PROPERTY_API_MAX_PAGE_SIZE
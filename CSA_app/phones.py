@@ -0,0 +1,29 @@
+import re
+
+from django.conf import settings
+
+
+def normalize_phone(raw, default_country_code=None):
+    """Normalize a phone number to E.164, e.g. '0803 123 4567' -> '+2348031234567'.
+
+    WhatsApp sends ``wa_id`` as full international digits without the '+';
+    numbers typed by staff may be national ('080...') or use a '00' prefix.
+    Raises ValueError for input that cannot be a phone number.
+    """
+    raw = str(raw or '').strip()
+    digits = re.sub(r'\D', '', raw)
+    country_code = str(default_country_code or settings.CSA_DEFAULT_COUNTRY_CODE)
+
+    if raw.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith('0'):
+        digits = country_code + digits[1:]
+    elif len(digits) <= 10:
+        # A national number without its trunk prefix
+        digits = country_code + digits
+
+    if not 8 <= len(digits) <= 15:
+        raise ValueError(f"Not a valid phone number: {raw!r}")
+    return f"+{digits}"
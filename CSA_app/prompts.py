@@ -0,0 +1,75 @@
+# Prompt templates for the Gemini chains. They are plain strings so importing this
+# module is free; llm_registry builds the ChatPromptTemplate objects on first use.
+
+INTENT_CLASSIFICATION_PROMPT = """
+    Classify the intent of the following customer message related to real estate:
+    
+    Customer message: {message}
+    
+    Possible intents:
+    - property_inquiry (customer is asking about a specific property)
+    - property_recommendation (customer is looking for property recommendations)
+    - budget_sharing (customer is sharing their budget)
+    - post_inspection_feedback (customer is providing feedback after an inspection)
+    - payment_method (customer is asking about or sharing payment preferences)
+    - general_query (any other general questions)
+    
+    Return only the intent name without any explanation.
+    Pls stick to the instructions above strictly
+    """
+
+PROPERTY_INQUIRY_PROMPT = """
+    Extract property details from the customer's message:
+    
+    Customer message: {message}
+    
+    Extract the following information if available:
+    - Property identifier
+    - name
+    - Location preferences
+    - Number of bedrooms
+    - Budget 
+    - Any other specific requirements
+     
+
+    Format the output as a valid JSON object **without any extra formatting like markdown or triple backticks**.
+
+    Example:
+
+    {{
+        "Property_identifier: "#47237"
+        "name": "bungalow",
+        "Location": "express road",
+        "Bedrooms": null **integer**,
+        "Budget": null **float**,
+        "Any_other_specific_requirements": null
+    }}
+
+    """
+
+POST_INSPECTION_PROMPT = """
+    Determine if the customer's feedback after inspection is positive or negative:
+    
+    Customer message: {message}
+    
+    Return only "positive" or "negative" without any explanation.
+    """
+
+MESSAGE_ANALYSIS_PROMPT = """
+    You are the assistant of a real estate agency. Analyse the following customer message:
+
+    Customer message: {message}
+
+    1. Classify the intent as one of:
+    - property_inquiry (customer is asking about a specific property)
+    - property_recommendation (customer is looking for property recommendations)
+    - budget_sharing (customer is sharing their budget)
+    - post_inspection_feedback (customer is providing feedback after an inspection)
+    - payment_method (customer is asking about or sharing payment preferences)
+    - general_query (any other general questions)
+    2. Extract the property identifier, property name, location, number of bedrooms,
+       budget (as a plain number, e.g. 45m is 45000000) and any other specific
+       requirements. Use null for anything the message does not mention.
+    3. If the message is post-inspection feedback, give its sentiment as
+       "positive" or "negative", otherwise null.
+    """
@@ -0,0 +1,77 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Cast
+
+from .catalog import get_catalog
+from .models import Property, normalize_location
+
+RECOMMENDATION_FIELDS = ('id', 'property_identifier', 'name', 'price', 'location', 'bedrooms')
+
+
+def score_expression(budget, location=None, bedrooms=None):
+    """Weighted match score: price proximity, plus location and bedrooms when the customer gave them."""
+    spread = float(budget) * settings.CSA_RECOMMENDATION_PRICE_SPREAD or 1.0
+
+    # 1.0 for an exact price match, 0.0 at the edge of the window
+    price_score = Value(1.0) - Abs(Cast(F('price'), FloatField()) - Value(float(budget))) / Value(spread)
+    score = Value(settings.CSA_RECOMMENDATION_PRICE_WEIGHT) * price_score
+
+    location = normalize_location(location)
+    if location:
+        score = score + Case(
+            When(location_normalized__contains=location, then=Value(settings.CSA_RECOMMENDATION_LOCATION_WEIGHT)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+
+    if bedrooms:
+        bedrooms = int(bedrooms)
+        score = score + Case(
+            When(bedrooms=bedrooms, then=Value(settings.CSA_RECOMMENDATION_BEDROOMS_WEIGHT)),
+            When(bedrooms__in=[bedrooms - 1, bedrooms + 1], then=Value(settings.CSA_RECOMMENDATION_BEDROOMS_WEIGHT / 2)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+
+    return score
+
+
+def recommendation_queryset(budget, location=None, bedrooms=None):
+    """Available properties within the budget window, ranked by ``score``.
+
+    Every column the filter and the score read is in the
+    (is_available, price, bedrooms, location_normalized) index, so ranking the
+    candidates never touches the table rows.
+    """
+    budget = Decimal(str(budget))
+    spread = Decimal(str(settings.CSA_RECOMMENDATION_PRICE_SPREAD))
+
+    return Property.objects.filter(
+        # Compared as "is_available = 1" rather than a bare boolean so SQLite can seek the index
+        is_available=Value(True),
+        price__gte=budget * (1 - spread),
+        price__lte=budget * (1 + spread),
+    ).annotate(score=score_expression(budget, location, bedrooms)).order_by('-score', 'price')
+
+
+def recommend_properties(budget, location=None, bedrooms=None, limit=None):
+    """Return the best matching available properties for a budget and the customer's preferences.
+
+    With ``CSA_PROPERTY_CATALOG`` the ranking is done on the in-memory catalog.
+    Otherwise it runs as one statement: the ranking happens in a subquery over
+    the index and only the winning rows are read from the table.
+    """
+    limit = limit or settings.CSA_RECOMMENDATION_LIMIT
+    if settings.CSA_PROPERTY_CATALOG:
+        return get_catalog().recommend(budget, location, bedrooms, limit)
+
+    ranked_ids = recommendation_queryset(budget, location, bedrooms).values('pk')[:limit]
+
+    return list(
+        Property.objects.filter(pk__in=ranked_ids)
+        .only(*RECOMMENDATION_FIELDS)
+        .annotate(score=score_expression(budget, location, bedrooms))
+        .order_by('-score', 'price')
+    )
@@ -0,0 +1,315 @@
+import asyncio
+import contextvars
+import logging
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from . import metrics
+from .intent_classifier import classify_with_keywords
+from .schemas import MessageAnalysis, parse_amount
+
+logger = logging.getLogger(__name__)
+
+
+class ModelUnavailable(Exception):
+    """No model answered: every provider failed, ran out of time or has its circuit open."""
+
+
+# Circuit breakers
+
+class CircuitBreaker:
+    """Stops calling a failing model provider for a while.
+
+    Closed: calls go through, and ``failure_threshold`` failures in a row open
+    the circuit. Open: calls are refused at once for ``reset_timeout`` seconds,
+    so turns fall back without waiting on a provider that is down. Half-open:
+    a single probe call is let through; its success closes the circuit, its
+    failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.CSA_LLM_BREAKER_FAILURES
+        self.reset_timeout = reset_timeout or settings.CSA_LLM_BREAKER_RESET
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Whether a call may go out now. In half-open state only one probe is in flight at a time."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._set(self.HALF_OPEN)
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self._state != self.CLOSED:
+                self._set(self.CLOSED)
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                if self._state != self.OPEN:
+                    self._set(self.OPEN)
+
+    def release(self):
+        """A call was abandoned without an outcome (a hedged call that lost); free the probe slot."""
+        with self._lock:
+            self._probing = False
+
+    def reset(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._state = self.CLOSED
+
+    def _set(self, state):
+        self._state = state
+        metrics.llm_circuit_changes.inc(provider=self.name, state=state)
+        log = logger.info if state == self.CLOSED else logger.warning
+        log("Circuit for model %s is %s", self.name, state)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def reset_breakers():
+    for breaker in list(_breakers.values()):
+        breaker.reset()
+
+
+# Calls with deadlines
+
+class _Attempt:
+    """One call to one provider. Reports its outcome to the provider's breaker exactly once."""
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.breaker = get_breaker(provider)
+        self.started_at = time.monotonic()
+        self._settled = False
+        self._lock = threading.Lock()
+
+    @property
+    def deadline(self):
+        return self.started_at + settings.CSA_LLM_TIMEOUT
+
+    def settle(self, ok):
+        """``ok`` is True, False, or None for a call abandoned without an outcome."""
+        with self._lock:
+            if self._settled:
+                return
+            self._settled = True
+        if ok is None:
+            self.breaker.release()
+        elif ok:
+            self.breaker.success()
+        else:
+            self.breaker.failure()
+
+
+def _next_provider(remaining):
+    """Pop providers until one whose circuit lets a call through. Returns (name, runnable) or None."""
+    while remaining:
+        name, runnable = remaining.pop(0)
+        if get_breaker(name).allow():
+            return name, runnable
+    return None
+
+
+def _wait_timeout(running, remaining):
+    """Seconds until the next deadline, or until the next hedged call is due."""
+    until = min(attempt.deadline for attempt in running.values())
+    if remaining and settings.CSA_LLM_HEDGE_AFTER > 0:
+        latest = max(attempt.started_at for attempt in running.values())
+        until = min(until, latest + settings.CSA_LLM_HEDGE_AFTER)
+    return max(0.0, until - time.monotonic())
+
+
+def _hedge_due(running, remaining):
+    if not remaining or settings.CSA_LLM_HEDGE_AFTER <= 0:
+        return False
+    latest = max(attempt.started_at for attempt in running.values())
+    return time.monotonic() >= latest + settings.CSA_LLM_HEDGE_AFTER
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.CSA_LLM_MAX_CONCURRENCY, thread_name_prefix='csa-llm')
+    return _executor
+
+
+def invoke(chain_name, providers, call):
+    """Return ``call(runnable)`` from the first of ``providers`` (``(name, runnable)`` pairs) that answers.
+
+    Each call runs on a thread pool and is given ``CSA_LLM_TIMEOUT`` seconds;
+    the caller stops waiting then even if the HTTP request hangs on. Providers
+    with an open circuit are skipped, and a failure or timeout moves on to the
+    next one. With ``CSA_LLM_HEDGE_AFTER`` the next provider is also started
+    when the current one is slow, and the first answer wins. Raises
+    ``ModelUnavailable`` when no provider answers.
+    """
+    remaining = list(providers)
+    running = {}
+    last_error = None
+
+    while True:
+        if not running or _hedge_due(running, remaining):
+            provider = _next_provider(remaining)
+            if provider is not None:
+                attempt = _Attempt(provider[0])
+                future = _get_executor().submit(contextvars.copy_context().run, call, provider[1])
+                future.add_done_callback(
+                    lambda f, attempt=attempt: attempt.settle(None if f.cancelled() else f.exception() is None)
+                )
+                running[future] = attempt
+        if not running:
+            break
+
+        done, _ = wait(running, timeout=_wait_timeout(running, remaining), return_when=FIRST_COMPLETED)
+        for future in done:
+            attempt = running.pop(future)
+            if future.exception() is None:
+                return future.result()
+            last_error = future.exception()
+            logger.warning("Model %s failed for %s: %s", attempt.provider, chain_name, last_error)
+
+        now = time.monotonic()
+        for future, attempt in list(running.items()):
+            if now >= attempt.deadline:
+                del running[future]
+                future.cancel()
+                attempt.settle(False)
+                last_error = TimeoutError(f"no answer after {settings.CSA_LLM_TIMEOUT}s")
+                logger.warning("Model %s timed out for %s", attempt.provider, chain_name)
+
+    raise ModelUnavailable(f"No model answered for {chain_name}: {last_error or 'circuit open'}") from last_error
+
+
+async def ainvoke(chain_name, providers, call):
+    """``invoke`` for coroutines: ``call(runnable)`` returns an awaitable. Losing hedged calls are cancelled."""
+    remaining = list(providers)
+    running = {}
+    last_error = None
+
+    try:
+        while True:
+            if not running or _hedge_due(running, remaining):
+                provider = _next_provider(remaining)
+                if provider is not None:
+                    attempt = _Attempt(provider[0])
+                    task = asyncio.ensure_future(call(provider[1]))
+                    task.add_done_callback(
+                        lambda t, attempt=attempt: attempt.settle(None if t.cancelled() else t.exception() is None)
+                    )
+                    running[task] = attempt
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(running, timeout=_wait_timeout(running, remaining), return_when=FIRST_COMPLETED)
+            for task in done:
+                attempt = running.pop(task)
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+                logger.warning("Model %s failed for %s: %s", attempt.provider, chain_name, last_error)
+
+            now = time.monotonic()
+            for task, attempt in list(running.items()):
+                if now >= attempt.deadline:
+                    del running[task]
+                    attempt.settle(False)
+                    task.cancel()
+                    last_error = TimeoutError(f"no answer after {settings.CSA_LLM_TIMEOUT}s")
+                    logger.warning("Model %s timed out for %s", attempt.provider, chain_name)
+    finally:
+        for task in running:
+            task.cancel()
+
+    raise ModelUnavailable(f"No model answered for {chain_name}: {last_error or 'circuit open'}") from last_error
+
+
+# Degraded mode
+
+IDENTIFIER_PATTERN = re.compile(r"#\s?(\d{4,})\b|\bproperty\s*(?:id\s*)?#?\s*(\d{4,})\b", re.IGNORECASE)
+BEDROOMS_PATTERN = re.compile(r"(\d+)\s*-?\s*bed", re.IGNORECASE)
+AMOUNT_PATTERN = re.compile(r"(?:₦|ngn)?\s*\d[\d,.]*\s*(?:k|m|mil|million|thousand|billion|b)\b", re.IGNORECASE)
+BUDGET_NUMBER_PATTERN = re.compile(r"\bbudget\b\D*(\d[\d,]{3,})", re.IGNORECASE)
+# Place names are capitalised: "in Lekki", "around Victoria Island" (not "in installments")
+LOCATION_PATTERN = re.compile(r"\b(?:in|at|around|near)\s+([A-Z][\w'-]*(?:\s+[A-Z][\w'-]*)*)")
+NEGATIVE_PATTERN = re.compile(
+    r"\b(?:not|no|didn'?t|don'?t|hated?|bad|small|dirty|noisy|poor|too|expensive|disappoint\w*)\b", re.IGNORECASE,
+)
+
+
+def local_sentiment(message_text):
+    """Sentiment of inspection feedback from keywords: "negative" if it has any, else "positive"."""
+    return "negative" if NEGATIVE_PATTERN.search(message_text or "") else "positive"
+
+
+def local_analysis(message_text):
+    """What the combined Gemini analysis would return, from local rules. Used when no model answers.
+
+    Coarser than the model, but good enough to keep conversations moving with
+    the usual reply templates.
+    """
+    message_text = message_text or ""
+    intent = classify_with_keywords(message_text).intent
+
+    identifier = IDENTIFIER_PATTERN.search(message_text)
+    bedrooms = BEDROOMS_PATTERN.search(message_text)
+    location = LOCATION_PATTERN.search(message_text)
+    amount = AMOUNT_PATTERN.search(message_text) or BUDGET_NUMBER_PATTERN.search(message_text)
+
+    return MessageAnalysis(
+        intent=intent,
+        property_identifier=(identifier.group(1) or identifier.group(2)) if identifier else None,
+        location=location.group(1) if location else None,
+        bedrooms=int(bedrooms.group(1)) if bedrooms else None,
+        budget=parse_amount(amount.group(amount.lastindex or 0)) if amount else None,
+        sentiment=local_sentiment(message_text) if intent == "post_inspection_feedback" else None,
+    )
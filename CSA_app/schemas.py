@@ -0,0 +1,117 @@
+import json
+import re
+from typing import Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+
+Intent = Literal[
+    "property_inquiry",
+    "property_recommendation",
+    "budget_sharing",
+    "post_inspection_feedback",
+    "payment_method",
+    "general_query",
+]
+
+AMOUNT_SUFFIXES = {
+    "k": 1_000,
+    "thousand": 1_000,
+    "m": 1_000_000,
+    "mil": 1_000_000,
+    "million": 1_000_000,
+    "b": 1_000_000_000,
+    "billion": 1_000_000_000,
+}
+
+AMOUNT_PATTERN = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(k|thousand|million|mil|m|billion|b)?\b", re.IGNORECASE)
+
+CODE_FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+
+
+def parse_amount(value):
+    """Turn a model-provided amount such as ``45000000``, ``"45m"`` or ``"₦45,000,000"`` into a float."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    match = AMOUNT_PATTERN.search(str(value))
+    if not match:
+        return None
+    amount = float(match.group(1).replace(",", ""))
+    suffix = (match.group(2) or "").lower()
+    return amount * AMOUNT_SUFFIXES.get(suffix, 1)
+
+
+class PropertyDetails(BaseModel):
+    """Property details extracted from a customer message.
+
+    The aliases match the keys the original extraction prompt asks Gemini for.
+    """
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    property_identifier: Optional[str] = Field(
+        default=None, alias="Property_identifier",
+        description="Listing identifier the customer mentions, digits only (e.g. 47237)",
+    )
+    name: Optional[str] = Field(default=None, description="Kind or name of the property, e.g. bungalow")
+    location: Optional[str] = Field(default=None, alias="Location", description="Preferred location")
+    bedrooms: Optional[int] = Field(default=None, alias="Bedrooms", description="Number of bedrooms")
+    budget: Optional[float] = Field(default=None, alias="Budget", description="Budget as a plain number")
+    other_requirements: Optional[str] = Field(
+        default=None, alias="Any_other_specific_requirements", description="Any other specific requirements",
+    )
+
+    @field_validator("property_identifier", mode="before")
+    @classmethod
+    def clean_identifier(cls, value):
+        if value is None:
+            return None
+        value = str(value).strip().lstrip("#").strip()
+        return value or None
+
+    @field_validator("bedrooms", mode="before")
+    @classmethod
+    def clean_bedrooms(cls, value):
+        if value is None or isinstance(value, int):
+            return value
+        match = re.search(r"\d+", str(value))
+        return int(match.group()) if match else None
+
+    @field_validator("budget", mode="before")
+    @classmethod
+    def clean_budget(cls, value):
+        return parse_amount(value)
+
+
+class MessageAnalysis(PropertyDetails):
+    """Everything the handlers need from one model call: intent, entities and sentiment."""
+
+    intent: Intent = Field(description="What the customer wants")
+    sentiment: Optional[Literal["positive", "negative"]] = Field(
+        default=None, description="Sentiment of post-inspection feedback, otherwise null",
+    )
+
+    @field_validator("intent", mode="before")
+    @classmethod
+    def clean_intent(cls, value):
+        return str(value).strip().lower() if value is not None else value
+
+    @field_validator("sentiment", mode="before")
+    @classmethod
+    def clean_sentiment(cls, value):
+        if value is None:
+            return None
+        value = str(value).strip().lower()
+        return value if value in ("positive", "negative") else None
+
+
+def parse_property_details(content):
+    """Validate the JSON returned by the property extraction prompt.
+
+    Raises ``json.JSONDecodeError`` or ``pydantic.ValidationError`` on bad output.
+    """
+    content = CODE_FENCE_PATTERN.sub("", content)
+    return PropertyDetails.model_validate(json.loads(content))
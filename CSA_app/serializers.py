@@ -5,3 +5,23 @@ class PropertySerializer(serializers.ModelSerializer):
     class Meta:
         model = Property
         fields = '__all__'
+
+
+class PropertyListSerializer(serializers.ModelSerializer):
+    """Listing fields for the public property list.
+
+    Pass ``fields=[...]`` to return only some of them (``?fields=name,price``).
+    """
+
+    class Meta:
+        model = Property
+        fields = [
+            'id', 'property_identifier', 'name', 'price', 'location', 'bedrooms', 'bathrooms',
+            'is_available', 'image', 'image_urls', 'created_at',
+        ]
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
@@ -1,75 +1,53 @@
-import requests
-from django.db.models.signals import post_save
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import Property
+from . import catalog, customers, db, media, outbox
+from .models import Customer, Property
 
 import logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='app.log',  # Log messages will be saved to 'app.log'
-    filemode='a'  # Append to the log file instead of overwriting
-)
-
 logger = logging.getLogger(__name__)
 
 @receiver(post_save, sender=Property)
-def send_property_to_make(sender, instance, created, **kwargs):
-    if created:
-        make_webhook_url = 'https://hook.eu2.make.com/v8aqa65woci0j31chn5iv2kxrh5nqvd9'
-
-        with open(instance.image.path, 'rb') as img_file:
-            files = {
-                'image': (instance.image.name, img_file, 'image/jpeg'),
-            }
-
-            data = {
-                "title": str(instance.name),
-                "description": str(instance.description),
-                "price": str(instance.price),
-                "location": str(instance.location),
-                "image_url": str(instance.image_urls)
-            }
-
-
-            try:
-                response = requests.post(make_webhook_url, data=data, files=files)
-                response.raise_for_status()
-
-            except requests.RequestException as e:
-                logger.error(f"Error message from sending data to webhook: {str(e)}")
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+def send_property_to_make(sender, instance, created, raw=False, **kwargs):
+    """Queue new listings for Make.com; ``manage.py dispatch_outbox`` delivers them.
 
+    The outbox row is written in the same transaction as the property, so it is
+    committed (or rolled back) together with it and the save never waits on
+    the network.
+    """
+    if created and not raw:
+        outbox.enqueue_property(instance)
 
 
+@receiver(post_save, sender=Property)
+def refresh_catalog_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        catalog.property_saved(instance)
 
 
+@receiver(post_save, sender=Property)
+def hash_property_image(sender, instance, raw=False, **kwargs):
+    if not raw:
+        media.property_saved(instance)
 
 
+@receiver(post_delete, sender=Property)
+def refresh_catalog_on_delete(sender, instance, **kwargs):
+    catalog.property_deleted(instance)
 
 
+@receiver(post_save, sender=Customer)
+def refresh_cached_customer(sender, instance, raw=False, **kwargs):
+    if not raw:
+        customers.customer_saved(instance)
 
 
+@receiver(post_delete, sender=Customer)
+def forget_cached_customer(sender, instance, **kwargs):
+    customers.customer_deleted(instance)
 
 
+@receiver(connection_created)
+def configure_database_connection(sender, connection, **kwargs):
+    db.configure_connection(connection)
@@ -0,0 +1,158 @@
+import hashlib
+import io
+import logging
+import os
+import posixpath
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+
+logger = logging.getLogger(__name__)
+
+RENDITION_DIR = "renditions"
+
+# name -> (longest side in pixels, Pillow format, file extension)
+RENDITIONS = {
+    # WhatsApp image messages take JPEG or PNG up to 5MB; it recompresses anything bigger than a phone screen
+    "whatsapp": ("CSA_IMAGE_WHATSAPP_MAX_SIDE", "JPEG", ".jpg"),
+    # For the property API and Make.com
+    "web": ("CSA_IMAGE_WEB_MAX_SIDE", "WEBP", ".webp"),
+}
+
+
+def file_digest(content):
+    """SHA-256 of a file's bytes, read in chunks."""
+    sha = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        sha.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return sha.hexdigest()
+
+
+def rendition_name(name, rendition):
+    """Where the ``rendition`` of the stored image ``name`` lives, e.g. property_images/renditions/<digest>-whatsapp.jpg."""
+    directory, filename = posixpath.split(name)
+    stem = os.path.splitext(filename)[0]
+    shard = posixpath.basename(directory)
+    if len(shard) == 2 and stem.startswith(shard):
+        # Content-addressed blobs sit in a shard directory named after the digest's first two characters
+        directory = posixpath.dirname(directory)
+    return posixpath.join(directory, RENDITION_DIR, f"{stem}-{rendition}{RENDITIONS[rendition][2]}")
+
+
+def render(content, rendition):
+    """Encode an image for ``rendition`` and return the bytes.
+
+    The image is fitted within the rendition's longest side, and JPEG quality is
+    lowered step by step until the file fits ``CSA_IMAGE_MAX_BYTES``.
+    """
+    from PIL import Image, ImageOps
+
+    max_side_setting, image_format, _ = RENDITIONS[rendition]
+    max_side = getattr(settings, max_side_setting)
+
+    content.seek(0)
+    with Image.open(content) as image:
+        # An upload already small enough in the right format is shipped as it is
+        keep_original = image.format == image_format and max(image.size) <= max_side
+
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        quality = settings.CSA_IMAGE_QUALITY
+        while True:
+            output = io.BytesIO()
+            if image_format == "JPEG":
+                image.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+            else:
+                image.save(output, image_format, quality=quality, method=6)
+            if output.tell() <= settings.CSA_IMAGE_MAX_BYTES or quality <= settings.CSA_IMAGE_MIN_QUALITY:
+                break
+            quality -= 10
+
+    if keep_original and content.size <= output.tell():
+        content.seek(0)
+        return content.read()
+    return output.getvalue()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores each distinct file once, named after the SHA-256 of its bytes.
+
+    Uploading an image that is already stored returns the existing name
+    instead of writing ``default_XiIqqoA.jpg``-style copies. Stored names never
+    change content, so they can be served with far-future cache headers.
+
+    Images also get the WhatsApp and web renditions from ``RENDITIONS`` when
+    they are first stored.
+    """
+
+    def hashed_name(self, name, digest):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], f"{digest}{extension}")
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = self.hashed_name(name, file_digest(content))
+        if self.exists(name):
+            return name
+
+        name = super().save(name, content, max_length=max_length)
+        if settings.CSA_IMAGE_RENDITIONS:
+            self.save_renditions(name, content)
+        return name
+
+    def save_renditions(self, name, content=None):
+        """Write any missing rendition of the image ``name``. Returns the names written."""
+        missing = [rendition for rendition in RENDITIONS if not self.exists(rendition_name(name, rendition))]
+        if not missing:
+            return []
+
+        opened = content is None
+        if opened:
+            content = self.open(name, 'rb')
+        written = []
+        try:
+            for rendition in missing:
+                target = rendition_name(name, rendition)
+                FileSystemStorage.save(self, target, ContentFile(render(content, rendition)))
+                written.append(target)
+        except Exception as e:
+            # Not an image Pillow can read; the original is still stored
+            logger.warning("Could not render %s: %s", name, e)
+        finally:
+            if opened:
+                content.close()
+        return written
+
+    def rendition(self, name, rendition):
+        """Name of the rendition of ``name``, or ``name`` itself when there is none."""
+        target = rendition_name(name, rendition)
+        return target if self.exists(target) else name
+
+
+def image_rendition(name, rendition="whatsapp"):
+    """The stored name to ship for an image: its rendition when the storage keeps one."""
+    rendition_of = getattr(default_storage, 'rendition', None)
+    if not name or rendition_of is None:
+        return name
+    return rendition_of(name, rendition)
+
+
+def public_media_url(name):
+    """Absolute URL of a stored file for WhatsApp to fetch, or None without ``CSA_PUBLIC_BASE_URL``."""
+    if not name or not settings.CSA_PUBLIC_BASE_URL:
+        return None
+    return settings.CSA_PUBLIC_BASE_URL.rstrip('/') + default_storage.url(name)
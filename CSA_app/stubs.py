@@ -0,0 +1,262 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import PrivateAttr
+
+from .intent_classifier import classify_with_keywords
+from .log import correlation_ids
+from .schemas import parse_amount
+
+# Locations the stub model recognises, and the synthetic traffic uses
+LOCATIONS = ("Lekki", "Ikeja", "Ajah", "Yaba", "Surulere", "Ikoyi", "Victoria Island", "Gbagada")
+
+
+class StubGraphServer:
+    """A local stand-in for graph.facebook.com, for benchmarks and manual testing.
+
+    Serves the two media endpoints (``GET /<media_id>`` for the metadata and
+    ``GET /media/<media_id>`` for the bytes) and accepts outbound messages on
+    ``POST /<phone_number_id>/messages``, which are kept in ``sent`` and
+    answered after ``latency`` seconds. ``on_message(payload)`` is called for
+    each of them. Point ``WHATSAPP_GRAPH_API_URL`` (or a ``WhatsAppClient``'s
+    ``api_url``) at ``url``.
+    """
+
+    def __init__(self, address="127.0.0.1", port=0, latency=0.0, on_message=None):
+        self.media = {}
+        self.sent = []
+        self.latency = latency
+        self.on_message = on_message
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((address, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_media(self, data, mime_type="image/jpeg", media_id=None):
+        """Make ``data`` downloadable as an inbound media file. Returns its media id."""
+        media_id = media_id or uuid.uuid4().hex
+        self.media[media_id] = (data, mime_type)
+        return media_id
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="csa-stub-graph", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        stub = self
+
+        class GraphHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                if len(parts) == 2 and parts[0] == "media" and parts[1] in stub.media:
+                    data, mime_type = stub.media[parts[1]]
+                    self._reply(200, data, mime_type)
+                elif len(parts) == 1 and parts[0] in stub.media:
+                    data, mime_type = stub.media[parts[0]]
+                    self._json(200, {
+                        "id": parts[0],
+                        "url": f"{stub.url}/media/{parts[0]}",
+                        "mime_type": mime_type,
+                        "sha256": hashlib.sha256(data).hexdigest(),
+                        "file_size": len(data),
+                    })
+                else:
+                    self._json(404, {"error": {"message": "Unknown media", "code": 100}})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                parts = self.path.split("?")[0].strip("/").split("/")
+                if len(parts) != 2 or parts[1] != "messages":
+                    self._json(404, {"error": {"message": "Unknown path", "code": 100}})
+                    return
+                payload = json.loads(body or b"{}")
+                if stub.latency:
+                    time.sleep(stub.latency)
+                with stub._lock:
+                    stub.sent.append(payload)
+                if stub.on_message is not None:
+                    stub.on_message(payload)
+                self._json(200, {"messages": [{"id": f"wamid.stub-{uuid.uuid4().hex}"}]})
+
+            def _json(self, status, data):
+                self._reply(status, json.dumps(data).encode(), "application/json")
+
+            def _reply(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return GraphHandler
+
+
+# Gemini
+
+class StubLLMError(Exception):
+    pass
+
+
+CUSTOMER_MESSAGE_PATTERN = re.compile(r"Customer message: (.*?)\n\s*\n", re.DOTALL)
+IDENTIFIER_PATTERN = re.compile(r"#?\b(\d{4,})\b")
+BEDROOMS_PATTERN = re.compile(r"(\d+)\s*-?\s*bed", re.IGNORECASE)
+AMOUNT_PATTERN = re.compile(r"\d[\d,.]*\s*(?:k|m|mil|million|thousand|billion)\b", re.IGNORECASE)
+NEGATIVE_PATTERN = re.compile(r"\b(?:not|didn'?t|hated|bad|small|dirty|noisy|poor|too)\b", re.IGNORECASE)
+
+
+def analyse_message(message):
+    """What a well-behaved Gemini would answer for ``message``: intent, entities and sentiment, from simple rules."""
+    intent = classify_with_keywords(message).intent
+
+    identifier = IDENTIFIER_PATTERN.search(message)
+    bedrooms = BEDROOMS_PATTERN.search(message)
+    amount = AMOUNT_PATTERN.search(message)
+    location = next((location for location in LOCATIONS if location.lower() in message.lower()), None)
+    sentiment = None
+    if intent == "post_inspection_feedback":
+        sentiment = "negative" if NEGATIVE_PATTERN.search(message) else "positive"
+
+    return {
+        "intent": intent,
+        "Property_identifier": identifier.group(1) if identifier and not amount else None,
+        "name": None,
+        "Location": location,
+        "Bedrooms": int(bedrooms.group(1)) if bedrooms else None,
+        "Budget": parse_amount(amount.group()) if amount else None,
+        "Any_other_specific_requirements": None,
+        "sentiment": sentiment,
+    }
+
+
+def chain_of(prompt):
+    """Which registry chain a rendered prompt belongs to."""
+    if "Analyse the following" in prompt:
+        return "message_analysis"
+    if "Classify the intent" in prompt:
+        return "intent"
+    if "Extract property details" in prompt:
+        return "property_inquiry"
+    return "post_inspection"
+
+
+class StubChatModel(BaseChatModel):
+    """A local stand-in for the Gemini chat model, for load tests.
+
+    Answers every chain the registry builds (see ``analyse_message``) after
+    ``latency`` seconds, give or take ``jitter``, and fails ``error_rate`` of
+    the calls. Each call is recorded in ``calls`` with the chain and the
+    correlation ids of the turn that made it. Install it with
+    ``llm_registry.registry.set_llm``.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    seed: Optional[int] = None
+
+    _random: random.Random = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _calls: list = PrivateAttr(default_factory=list)
+
+    def model_post_init(self, context):
+        super().model_post_init(context)
+        self._random = random.Random(self.seed)
+
+    @property
+    def _llm_type(self):
+        return "csa-stub"
+
+    @property
+    def calls(self):
+        with self._lock:
+            return list(self._calls)
+
+    def _start_call(self, prompt):
+        """Record a call and return its chain, its delay and whether it fails."""
+        chain = chain_of(prompt)
+        with self._lock:
+            delay = max(0.0, self._random.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+            failed = self._random.random() < self.error_rate
+            self._calls.append({"chain": chain, "failed": failed, **correlation_ids()})
+        return chain, delay, failed
+
+    def _answer(self, chain, prompt, failed):
+        if failed:
+            raise StubLLMError("Simulated Gemini error")
+        match = CUSTOMER_MESSAGE_PATTERN.search(prompt)
+        analysis = analyse_message(match.group(1).strip() if match else "")
+        if chain == "intent":
+            return analysis["intent"]
+        if chain == "post_inspection":
+            return analysis["sentiment"] or "positive"
+        if chain == "property_inquiry":
+            return json.dumps({key: value for key, value in analysis.items() if key not in ("intent", "sentiment")})
+        return analysis
+
+    def _result(self, content, prompt):
+        message = AIMessage(content=content, usage_metadata={
+            "input_tokens": len(prompt) // 4, "output_tokens": len(content) // 4,
+            "total_tokens": (len(prompt) + len(content)) // 4,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = "\n".join(str(message.content) for message in messages)
+        chain, delay, failed = self._start_call(prompt)
+        time.sleep(delay)
+        return self._result(self._answer(chain, prompt, failed), prompt)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = "\n".join(str(message.content) for message in messages)
+        chain, delay, failed = self._start_call(prompt)
+        await asyncio.sleep(delay)
+        return self._result(self._answer(chain, prompt, failed), prompt)
+
+    def with_structured_output(self, schema, **kwargs):
+
+        def invoke(prompt_value):
+            prompt = prompt_value.to_string()
+            chain, delay, failed = self._start_call(prompt)
+            time.sleep(delay)
+            return schema.model_validate(self._answer(chain, prompt, failed))
+
+        async def ainvoke(prompt_value):
+            prompt = prompt_value.to_string()
+            chain, delay, failed = self._start_call(prompt)
+            await asyncio.sleep(delay)
+            return schema.model_validate(self._answer(chain, prompt, failed))
+
+        return RunnableLambda(invoke, afunc=ainvoke)
@@ -0,0 +1,50 @@
+import itertools
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.test import override_settings
+
+_message_ids = itertools.count(1)
+
+
+def webhook_payload(sender, *bodies, statuses=()):
+    """A WhatsApp Cloud API delivery with a text message from ``sender`` for each of ``bodies``."""
+    messages = [
+        {
+            "from": sender, "id": f"wamid.test-{next(_message_ids)}", "timestamp": str(int(time.time())),
+            "type": "text", "text": {"body": body},
+        }
+        for body in bodies
+    ]
+    value = {"messaging_product": "whatsapp", "contacts": [{"wa_id": sender, "profile": {"name": "Test"}}]}
+    if messages:
+        value["messages"] = messages
+    if statuses:
+        value["statuses"] = list(statuses)
+    return {"object": "whatsapp_business_account", "entry": [{"id": "1", "changes": [{"field": "messages", "value": value}]}]}
+
+
+def isolate_spools(test):
+    """Point the interaction and webhook spools at a temporary directory for the rest of ``test``."""
+    from CSA_app.interaction_log import interaction_log
+
+    directory = tempfile.mkdtemp(prefix="csa-test-")
+    test.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+    patcher = mock.patch.object(interaction_log, "spool_dir", directory)
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    settings = override_settings(CSA_WEBHOOK_SPOOL_DIR=f"{directory}/webhooks")
+    settings.enable()
+    test.addCleanup(settings.disable)
+    return directory
+
+
+def message_ids(payload):
+    return [
+        message["id"]
+        for entry in payload.get("entry", [])
+        for change in entry.get("changes", [])
+        for message in change["value"].get("messages", [])
+    ]
@@ -0,0 +1,134 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from CSA_app import catalog
+from CSA_app.customers import _customers
+from CSA_app.models import Customer, Property
+from CSA_app.schemas import MessageAnalysis
+from CSA_app.whatsapp_handler import handle_property_inquiry
+
+
+def create_property(**fields):
+    fields = {
+        "name": "Flat", "description": "", "price": 20_000_000, "location": "Lekki Phase 1",
+        "bedrooms": 3, "bathrooms": 2, **fields,
+    }
+    return Property.objects.create(**fields)
+
+
+@override_settings(CSA_PROPERTY_CATALOG=True, CSA_CATALOG_CHECK_INTERVAL=3600)
+class CatalogTests(TransactionTestCase):
+    # Changes reach the catalog on commit, so the tests need real transactions
+
+    def setUp(self):
+        catalog._catalog.load()
+
+    def test_committed_save_is_visible(self):
+        prop = create_property()
+
+        self.assertEqual(catalog.find_property(prop.property_identifier).id, prop.id)
+        self.assertEqual(catalog.find_property(f"#{prop.property_identifier}").id, prop.id)
+
+    def test_rolled_back_save_leaves_no_entry(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            prop = create_property()
+            raise RuntimeError
+
+        self.assertIsNone(catalog.find_property(prop.property_identifier))
+        self.assertEqual(catalog.get_catalog().recommend(20_000_000), [])
+
+    def test_rolled_back_update_keeps_the_committed_values(self):
+        prop = create_property(price=20_000_000)
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            prop.price = 90_000_000
+            prop.save()
+            raise RuntimeError
+
+        self.assertEqual(catalog.find_property(prop.property_identifier).price, 20_000_000)
+
+    def test_deleted_property_is_removed(self):
+        prop = create_property()
+        identifier = prop.property_identifier
+
+        prop.delete()
+
+        self.assertIsNone(catalog.find_property(identifier))
+        self.assertEqual(catalog.get_catalog().recommend(20_000_000), [])
+
+    def test_readers_keep_a_consistent_snapshot_across_changes(self):
+        kept = create_property(name="Kept", price=20_000_000)
+        gone = create_property(name="Gone", price=21_000_000)
+        current = catalog.get_catalog()
+        snapshot = current._snapshot
+
+        gone.delete()
+        kept.price = 22_000_000
+        kept.save()
+
+        self.assertEqual([entry.name for entry in snapshot.by_id.values()], ["Kept", "Gone"])
+        self.assertEqual(list(snapshot.prices), [20_000_000, 21_000_000])
+        self.assertEqual([snapshot.by_id[pk].name for pk in snapshot.ids], ["Kept", "Gone"])
+        self.assertEqual([(entry.name, entry.price) for entry in current.in_price_range(0, 10**9)], [("Kept", 22_000_000)])
+
+    def test_recommendations_rank_price_location_and_bedrooms(self):
+        near = create_property(name="Near", price=21_000_000, location="Ikeja", bedrooms=1)
+        matching = create_property(name="Matching", price=24_000_000, location="Lekki", bedrooms=3)
+        create_property(name="Sold", price=20_000_000, is_available=False)
+
+        ranked = catalog.get_catalog().recommend(20_000_000, location="Lekki", bedrooms=3)
+
+        self.assertEqual([entry.id for entry in ranked], [matching.id, near.id])
+
+    def test_one_version_bump_per_transaction(self):
+        props = [create_property(name=f"Flat {n}") for n in range(3)]
+        before = catalog.current_version()
+
+        with transaction.atomic():
+            Property.objects.filter(pk__in=[prop.pk for prop in props]).delete()
+
+        self.assertEqual(catalog.current_version(), before + 1)
+        self.assertEqual(catalog.get_catalog().version, before + 1)
+
+    def test_a_rolled_back_transaction_does_not_hold_back_the_next_bump(self):
+        before = catalog.current_version()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            create_property()
+            raise RuntimeError
+        self.assertEqual(catalog.current_version(), before)
+
+        with transaction.atomic():
+            create_property()
+            create_property()
+
+        self.assertEqual(catalog.current_version(), before + 1)
+
+    def test_change_by_another_process_triggers_a_reload(self):
+        prop = create_property(name="Old name")
+        Property.objects.filter(pk=prop.pk).update(name="New name")
+        catalog.bump_catalog_version()
+
+        with override_settings(CSA_CATALOG_CHECK_INTERVAL=0):
+            self.assertEqual(catalog.find_property(prop.property_identifier).name, "New name")
+
+
+@override_settings(CSA_PROPERTY_CATALOG=True)
+class PropertyInquiryTests(TestCase):
+
+    def setUp(self):
+        _customers.clear()
+        catalog._catalog.load()
+        self.customer = Customer.objects.create(phone_number="+2348031234567")
+
+    @mock.patch("CSA_app.whatsapp_handler.log_interaction")
+    def test_unknown_identifier_asks_for_the_budget(self, log_interaction):
+        analysis = MessageAnalysis(intent="property_inquiry", property_identifier="999999")
+
+        with self.assertLogs("CSA_app.whatsapp_handler", "INFO") as logs:
+            response = handle_property_inquiry(self.customer, "Is #999999 available?", False, {}, analysis=analysis)
+
+        self.assertIn("share your budget", response)
+        self.assertIn("No property with identifier 999999", "\n".join(logs.output))
+        self.assertIsNone(log_interaction.call_args.kwargs["property_id"])
@@ -0,0 +1,105 @@
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from CSA_app import conversation
+from CSA_app.intent_classifier import Classification
+from CSA_app.models import ConversationState, Customer
+from CSA_app.whatsapp_handler import conversation_intent
+
+
+def pending(question):
+    return ConversationState(pending_question=question)
+
+
+class ExpectedIntentTests(SimpleTestCase):
+
+    def test_amounts_answer_the_budget_question(self):
+        for text in ("45m", "₦45,000,000", "my budget is 45 million", "around 30 million naira", "50000000"):
+            with self.subTest(text=text):
+                self.assertEqual(conversation.expected_intent(pending(conversation.PENDING_BUDGET), text), "budget_sharing")
+
+    def test_identifiers_and_phone_numbers_are_not_budgets(self):
+        texts = (
+            "Is property #100042 still available?",
+            "I can do 20m for property 100042",
+            "my number is 08012345678",
+            "call me on +234 801 234 5678",
+            "3 bedrooms",
+        )
+        for text in texts:
+            with self.subTest(text=text):
+                self.assertIsNone(conversation.expected_intent(pending(conversation.PENDING_BUDGET), text))
+
+    def test_payment_and_requirements_need_an_answer(self):
+        cases = [
+            (conversation.PENDING_PAYMENT_METHOD, "bank transfer", "payment_method"),
+            (conversation.PENDING_PAYMENT_METHOD, "installments over 12 months", "payment_method"),
+            (conversation.PENDING_PAYMENT_METHOD, "ok thanks", None),
+            (conversation.PENDING_PAYMENT_METHOD, "I will think about it", None),
+            (conversation.PENDING_PAYMENT_METHOD, "can I pay monthly?", None),
+            (conversation.PENDING_REQUIREMENTS, "3 bedroom duplex in Lekki", "property_inquiry"),
+            (conversation.PENDING_REQUIREMENTS, "I will think about it", None),
+        ]
+        for question, text, intent in cases:
+            with self.subTest(question=question, text=text):
+                self.assertEqual(conversation.expected_intent(pending(question), text), intent)
+
+    def test_nothing_pending_means_no_expected_intent(self):
+        self.assertIsNone(conversation.expected_intent(pending(""), "45m"))
+
+
+@mock.patch("CSA_app.intent_classifier.get_intent_model", return_value=None)
+class ConversationIntentTests(SimpleTestCase):
+
+    def test_answer_skips_classification(self, _model):
+        state = pending(conversation.PENDING_PAYMENT_METHOD)
+        self.assertEqual(conversation_intent(state, "I'll pay by bank transfer", {}), "payment_method")
+
+    def test_confident_fast_path_beats_the_pending_question(self, get_model):
+        state = pending(conversation.PENDING_PAYMENT_METHOD)
+        self.assertIsNone(conversation_intent(state, "I want to pay for property #100042", {}))
+
+        get_model.return_value = mock.Mock()
+        get_model.return_value.predict.return_value = Classification("post_inspection_feedback", 0.97, "model")
+        state = pending(conversation.PENDING_REQUIREMENTS)
+        self.assertIsNone(conversation_intent(state, "The duplex was too small for us", {}))
+
+    def test_same_intent_from_the_fast_path_keeps_the_shortcut(self, _model):
+        state = pending(conversation.PENDING_REQUIREMENTS)
+        self.assertEqual(conversation_intent(state, "Ok, 3 bedrooms like #100042", {}), "property_inquiry")
+
+
+class StateTests(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Ada", phone_number="+2348031234567")
+
+    def save_elsewhere(self, **fields):
+        """What another worker process does with its own copy of the state."""
+        ConversationState.objects.update_or_create(customer=self.customer, defaults=fields)
+
+    def test_process_local_cache_never_serves_the_state(self):
+        state = conversation.get_state(self.customer)
+        conversation.advance(state, conversation.STAGE_INQUIRING, pending_question=conversation.PENDING_BUDGET)
+        conversation.save_state(state)
+
+        self.save_elsewhere(stage=conversation.STAGE_PAYMENT, pending_question="")
+
+        state = conversation.get_state(self.customer)
+        self.assertEqual((state.stage, state.pending_question), (conversation.STAGE_PAYMENT, ""))
+
+    def test_shared_cache_serves_the_saved_state(self):
+        caches = {"default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": tempfile.mkdtemp(),
+        }}
+        with override_settings(CACHES=caches):
+            state = conversation.get_state(self.customer)
+            conversation.advance(state, conversation.STAGE_RECOMMENDED, pending_question=conversation.PENDING_BUDGET)
+            conversation.save_state(state)
+
+            with self.assertNumQueries(0):
+                state = conversation.get_state(self.customer)
+        self.assertEqual(state.stage, conversation.STAGE_RECOMMENDED)
@@ -0,0 +1,95 @@
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from CSA_app.customers import _customers, get_customer
+from CSA_app.models import Customer
+from CSA_app.phones import normalize_phone
+from CSA_app.whatsapp_handler import handle_budget_sharing
+
+from .test_migrations import MigrationTestCase
+
+
+@override_settings(CSA_DEFAULT_COUNTRY_CODE="234")
+class NormalizePhoneTests(SimpleTestCase):
+
+    def test_formats_become_e164(self):
+        cases = {
+            "2348031234567": "+2348031234567",
+            "+234 803 123 4567": "+2348031234567",
+            "0803 123 4567": "+2348031234567",
+            "002348031234567": "+2348031234567",
+            "8031234567": "+2348031234567",
+            "+44 20 7946 0958": "+442079460958",
+        }
+        for raw, expected in cases.items():
+            with self.subTest(raw=raw):
+                self.assertEqual(normalize_phone(raw), expected)
+
+    def test_invalid_numbers_are_rejected(self):
+        for raw in ("", "123", "not a number", "+1234567890123456", None):
+            with self.subTest(raw=raw), self.assertRaises(ValueError):
+                normalize_phone(raw)
+
+
+class GetCustomerTests(TestCase):
+
+    def setUp(self):
+        _customers.clear()
+        self.addCleanup(_customers.clear)
+
+    def test_all_forms_of_a_number_are_one_customer(self):
+        first = get_customer("2348031234567")
+        second = get_customer("0803 123 4567")
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Customer.objects.get().phone_number, "+2348031234567")
+
+    def test_returning_customer_needs_no_query(self):
+        get_customer("2348031234567")
+
+        with self.assertNumQueries(0):
+            customer = get_customer("2348031234567")
+        self.assertEqual(customer.phone_number, "+2348031234567")
+
+    def test_cached_customer_sees_saved_changes(self):
+        customer = get_customer("2348031234567")
+        customer.name = "Ada"
+        customer.save()
+
+        self.assertEqual(get_customer("2348031234567").name, "Ada")
+
+
+class MergeDuplicateCustomersTests(MigrationTestCase):
+    migrate_from = "0015_conversationstate"
+    migrate_to = "0016_customer_phone_number_unique"
+
+    def test_duplicates_are_merged_into_the_oldest_customer(self):
+        Customer = self.old_apps.get_model(self.app, "Customer")
+        Interaction = self.old_apps.get_model(self.app, "Interaction")
+        oldest = Customer.objects.create(name="Ada", phone_number="2348031234567")
+        duplicate = Customer.objects.create(name="", phone_number="0803 123 4567", budget=5000000)
+        Interaction.objects.create(customer=duplicate, Interaction_type="inquiry")
+
+        apps = self.migrate()
+
+        customer = apps.get_model(self.app, "Customer").objects.get()
+        self.assertEqual((customer.pk, customer.phone_number, customer.budget), (oldest.pk, "+2348031234567", 5000000))
+        self.assertEqual(apps.get_model(self.app, "Interaction").objects.get().customer_id, oldest.pk)
+
+
+@override_settings(CSA_PROPERTY_CATALOG=False)
+class CustomerSaveTests(TestCase):
+
+    def test_budget_reply_writes_only_the_budget(self):
+        customer = Customer.objects.create(name="Ada", phone_number="+2348031234567", preferences={"Location": "Lekki"})
+        stale = Customer.objects.get(pk=customer.pk)
+        Customer.objects.filter(pk=customer.pk).update(name="Ada Obi")
+
+        with CaptureQueriesContext(connection) as queries:
+            handle_budget_sharing(stale, "45m")
+
+        update, = [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertNotIn('"name"', update)
+        customer.refresh_from_db()
+        self.assertEqual((customer.name, customer.budget), ("Ada Obi", 45_000_000))
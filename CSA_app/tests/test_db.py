@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase
+
+
+def settings_with(**environ):
+    """Import the project settings in a fresh interpreter and return its output."""
+    code = (
+        "from django.conf import settings; database = settings.DATABASES['default']; "
+        "print(database['ENGINE'], database['CONN_MAX_AGE'], sorted(database['OPTIONS']))"
+    )
+    environ = {**os.environ, "DJANGO_SETTINGS_MODULE": "CSA_Project.settings", **environ}
+    return subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, cwd=settings.BASE_DIR, env=environ,
+    )
+
+
+class DatabaseProfileTests(SimpleTestCase):
+
+    def test_sqlite_connections_get_the_tuned_pragmas(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        database = DatabaseWrapper({
+            **connection.settings_dict, "NAME": os.path.join(directory.name, "db.sqlite3"), "OPTIONS": {"timeout": 7},
+        }, alias="tuned")
+        self.addCleanup(database.close)
+
+        with database.cursor() as cursor:
+            pragmas = {}
+            for name in ("journal_mode", "synchronous", "busy_timeout", "temp_store"):
+                cursor.execute(f"PRAGMA {name}")
+                pragmas[name] = cursor.fetchone()[0]
+
+        # synchronous 1 is NORMAL, temp_store 2 is MEMORY
+        self.assertEqual(pragmas, {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 7000, "temp_store": 2})
+
+    def test_postgres_profile(self):
+        result = settings_with(CSA_DB_PROFILE="postgres", CSA_DB_CONN_MAX_AGE="120")
+        self.assertEqual(result.stdout.split(), ["django.db.backends.postgresql", "120", "['connect_timeout']"])
+
+        result = settings_with(CSA_DB_PROFILE="postgres", CSA_DB_POOL="True")
+        self.assertEqual(result.stdout.split(), ["django.db.backends.postgresql", "0", "['connect_timeout',", "'pool']"])
+
+    def test_unknown_profile_is_refused(self):
+        result = settings_with(CSA_DB_PROFILE="mysql")
+
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("Unknown CSA_DB_PROFILE 'mysql'", result.stderr)
@@ -0,0 +1,101 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from CSA_app.dedup import _seen_messages, claim_message, release_message
+from CSA_app.models import ProcessedMessage, WebhookJob
+from CSA_app.whatsapp_handler import process_webhook_payload
+from CSA_app.work_queue import DatabaseQueueBackend, process_job_payload
+
+from .helpers import webhook_payload
+
+
+class ClaimMessageTests(TestCase):
+
+    def setUp(self):
+        _seen_messages.clear()
+        self.addCleanup(_seen_messages.clear)
+
+    def test_first_delivery_is_claimed_and_redeliveries_are_not(self):
+        self.assertTrue(claim_message("wamid.1"))
+        self.assertFalse(claim_message("wamid.1"))
+        self.assertTrue(ProcessedMessage.objects.filter(message_id="wamid.1").exists())
+
+    def test_message_claimed_by_another_worker_is_not_claimed_again(self):
+        ProcessedMessage.objects.create(message_id="wamid.2")
+
+        self.assertFalse(claim_message("wamid.2"))
+
+    def test_released_message_can_be_claimed_again(self):
+        claim_message("wamid.3")
+        release_message("wamid.3")
+
+        self.assertTrue(claim_message("wamid.3"))
+
+    def test_a_failed_insert_leaves_the_message_claimable(self):
+        with mock.patch.object(ProcessedMessage.objects, "create", side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                claim_message("wamid.4")
+
+        self.assertTrue(claim_message("wamid.4"))
+        self.assertTrue(ProcessedMessage.objects.filter(message_id="wamid.4").exists())
+
+    def test_the_claiming_job_may_claim_again(self):
+        self.assertTrue(claim_message("wamid.5", job_id=7))
+
+        self.assertTrue(claim_message("wamid.5", job_id=7))
+        self.assertFalse(claim_message("wamid.5", job_id=8))
+        self.assertFalse(claim_message("wamid.5"))
+        _seen_messages.clear()
+        self.assertTrue(claim_message("wamid.5", job_id=7))
+        self.assertFalse(claim_message("wamid.5", job_id=8))
+
+    def test_message_without_id_is_always_processed(self):
+        self.assertTrue(claim_message(None))
+        self.assertTrue(claim_message(None))
+
+
+class RedeliveryTests(TestCase):
+
+    def setUp(self):
+        _seen_messages.clear()
+        self.addCleanup(_seen_messages.clear)
+
+    def test_redelivered_payload_is_not_answered_twice(self):
+        payload = webhook_payload("2348010000001", "Hi")
+        with mock.patch("CSA_app.whatsapp_handler.process_whatsapp_message") as process:
+            process_webhook_payload(payload)
+            process_webhook_payload(payload)
+
+        process.assert_called_once()
+
+    @override_settings(CSA_COALESCE_WINDOW=0, CSA_QUEUE_VISIBILITY_TIMEOUT=60)
+    def test_a_job_reclaimed_after_its_worker_died_answers_its_messages(self):
+        backend = DatabaseQueueBackend()
+        backend.enqueue(webhook_payload("2348010000001", "Hi"))
+        job, = backend.claim()
+        # The first worker claimed the message and died before answering
+        with mock.patch("CSA_app.whatsapp_handler.process_whatsapp_message", side_effect=SystemExit):
+            with self.assertRaises(SystemExit):
+                process_job_payload(job.payload, job_id=job.pk)
+        _seen_messages.clear()
+        WebhookJob.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=61))
+
+        reclaimed, = backend.claim()
+        with mock.patch("CSA_app.whatsapp_handler.process_whatsapp_message") as process:
+            process_job_payload(reclaimed.payload, job_id=reclaimed.pk)
+            process_webhook_payload(reclaimed.payload)
+
+        process.assert_called_once()
+
+    def test_failed_turn_releases_its_messages_for_the_retry(self):
+        payload = webhook_payload("2348010000001", "Hi")
+        with mock.patch("CSA_app.whatsapp_handler.process_whatsapp_message", side_effect=[RuntimeError, None]) as process:
+            with self.assertRaises(RuntimeError):
+                process_webhook_payload(payload)
+            process_webhook_payload(payload)
+
+        self.assertEqual(process.call_count, 2)
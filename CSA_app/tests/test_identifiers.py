@@ -0,0 +1,61 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from CSA_app.identifiers import FIRST_PROPERTY_IDENTIFIER, PROPERTY_SEQUENCE, allocate_identifiers
+from CSA_app.models import IdentifierSequence, Property
+
+
+def listing(**fields):
+    return {"name": "Flat", "price": "20,000,000", "location": "Lekki", "bedrooms": 3, "bathrooms": 2, **fields}
+
+
+class AllocateIdentifiersTests(TestCase):
+    def test_missing_sequence_starts_past_existing_identifiers(self):
+        IdentifierSequence.objects.filter(name=PROPERTY_SEQUENCE).delete()
+        Property.objects.bulk_create([Property(name="Old", price=1, location="Ikeja", bedrooms=1, bathrooms=1,
+                                               property_identifier="#250000")])
+
+        self.assertEqual(allocate_identifiers(2), range(250001, 250003))
+
+    def test_ranges_are_consecutive_and_disjoint(self):
+        first = allocate_identifiers(3)
+        second = allocate_identifiers(2)
+
+        self.assertEqual(len(first), 3)
+        self.assertGreaterEqual(first.start, FIRST_PROPERTY_IDENTIFIER)
+        self.assertEqual(second.start, first.stop)
+        self.assertEqual(IdentifierSequence.objects.get(name=PROPERTY_SEQUENCE).next_value, second.stop)
+
+
+class ImportPropertiesTests(TestCase):
+    def import_rows(self, *rows):
+        fd, path = tempfile.mkstemp(suffix=".jsonl")
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "w") as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+        call_command("import_properties", path, "--no-notify", stdout=StringIO(), stderr=StringIO())
+
+    def test_explicit_identifiers_move_the_sequence_past_them(self):
+        upcoming = allocate_identifiers(1).stop
+        self.import_rows(
+            listing(property_identifier=str(upcoming)),
+            listing(property_identifier=f"#{upcoming + 1}"),
+            listing(),
+        )
+
+        prop = Property.objects.create(name="New", price=1, location="Ikeja", bedrooms=1, bathrooms=1)
+
+        identifiers = set(Property.objects.values_list("property_identifier", flat=True))
+        self.assertEqual(len(identifiers), 4)
+        self.assertGreater(int(prop.property_identifier), upcoming + 1)
+
+    def test_non_numeric_identifiers_leave_the_sequence_alone(self):
+        upcoming = allocate_identifiers(1).stop
+        self.import_rows(listing(property_identifier="LEKKI-7"))
+
+        self.assertEqual(IdentifierSequence.objects.get(name=PROPERTY_SEQUENCE).next_value, upcoming)
@@ -0,0 +1,45 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from CSA_app.intent_classifier import Classification, classify_with_keywords, classify_with_rules, fast_path_classify
+
+
+@mock.patch("CSA_app.intent_classifier.get_intent_model", return_value=None)
+class FastPathTests(SimpleTestCase):
+
+    def test_obvious_intents_are_classified_locally(self, _model):
+        cases = {
+            "Is property #100042 still available?": "property_inquiry",
+            "My budget is 40m": "budget_sharing",
+            "₦25,000,000": "budget_sharing",
+            "Good morning!": "general_query",
+            "Can I pay in installments?": "payment_method",
+            "Is an instalment plan possible": "payment_method",
+            "I loved the house": "post_inspection_feedback",
+        }
+        for text, intent in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(fast_path_classify(text, threshold=0.8).intent, intent)
+
+    def test_unclear_messages_are_left_to_the_llm(self, _model):
+        for text in ("I'm looking for a 3 bedroom flat in Lekki", "What documents do I need?", ""):
+            with self.subTest(text=text):
+                self.assertIsNone(fast_path_classify(text, threshold=0.8))
+
+    def test_rules_below_the_threshold_are_ignored(self, _model):
+        self.assertEqual(classify_with_rules("Can I pay in installments?").confidence, 0.85)
+        self.assertIsNone(fast_path_classify("Can I pay in installments?", threshold=0.9))
+
+    def test_confident_model_prediction_is_used(self, get_model):
+        get_model.return_value = mock.Mock()
+        get_model.return_value.predict.return_value = Classification("property_recommendation", 0.97, "model")
+
+        self.assertEqual(fast_path_classify("any 2 bed in Yaba", threshold=0.9).intent, "property_recommendation")
+
+
+class KeywordTests(SimpleTestCase):
+
+    def test_keyword_rules_always_give_an_intent(self):
+        self.assertEqual(classify_with_keywords("show me duplexes").intent, "property_recommendation")
+        self.assertEqual(classify_with_keywords("What documents do I need").intent, "general_query")
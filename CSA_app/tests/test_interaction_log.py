@@ -0,0 +1,172 @@
+import glob
+import json
+import os
+import uuid
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from CSA_app import interaction_log as interaction_log_module
+from CSA_app.interaction_log import InteractionLog, interaction_log
+from CSA_app.management.commands.csa_loadtest import SENDER_PREFIX, Command as LoadTestCommand
+from CSA_app.models import Customer, Interaction
+
+from .helpers import isolate_spools
+
+# Above the largest pid Linux hands out, so never a running process
+DEAD_PID = 4194305
+
+
+def spool_row(customer_id, note):
+    return {
+        "log_id": uuid.uuid4().hex, "customer_id": customer_id, "property_id": None,
+        "Interaction_type": "inquiry", "notes": note, "timestamp": timezone.now().isoformat(),
+    }
+
+
+class InteractionLogTests(TransactionTestCase):
+    # Foreign keys are checked at commit, so the writes need real transactions
+
+    def setUp(self):
+        self.spool_dir = isolate_spools(self)
+        self.log = InteractionLog(spool_dir=self.spool_dir, buffer_size=100, flush_interval=3600)
+        self.customer = Customer.objects.create(name="Ada", phone_number="+2348031234567")
+        self.deleted = Customer.objects.create(name="Gone", phone_number="+2348031234568")
+
+    def write_spool(self, name, rows):
+        with open(os.path.join(self.spool_dir, name), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+
+    def bad_rows(self):
+        rows = []
+        for path in glob.glob(os.path.join(self.spool_dir, "*.bad")):
+            with open(path, encoding="utf-8") as f:
+                rows.extend(json.loads(line) for line in f)
+        return rows
+
+    def test_flush_writes_buffered_rows_and_removes_the_spool(self):
+        self.log.record(self.customer, "inquiry", "first")
+        self.log.record(self.customer, "inquiry", "second")
+
+        self.assertEqual(self.log.flush(), 2)
+        self.assertEqual(Interaction.objects.count(), 2)
+        self.assertEqual(glob.glob(os.path.join(self.spool_dir, "*")), [])
+
+    def test_replaying_rows_already_written_adds_nothing(self):
+        rows = [spool_row(self.customer.pk, "once")]
+
+        self.assertEqual(interaction_log_module.write_rows(rows), [])
+        self.assertEqual(interaction_log_module.write_rows(rows), [])
+        self.assertEqual(Interaction.objects.count(), 1)
+
+    def test_buffered_row_keeps_the_time_it_happened(self):
+        self.log.record(self.customer, "inquiry", "earlier")
+        recorded_before = timezone.now()
+
+        self.log.flush()
+
+        self.assertLess(Interaction.objects.get().timestamp, recorded_before)
+
+    def test_flush_sets_aside_rows_the_database_rejects(self):
+        self.log.record(self.customer, "inquiry", "kept")
+        self.log.record(self.deleted, "inquiry", "orphan")
+        self.deleted.delete()
+        self.log.record(self.customer, "inquiry", "also kept")
+
+        self.assertEqual(self.log.flush(), 2)
+        self.assertEqual(sorted(Interaction.objects.values_list("notes", flat=True)), ["also kept", "kept"])
+        self.assertEqual([row["notes"] for row in self.bad_rows()], ["orphan"])
+        self.assertEqual(self.log.flush(), 0)
+        self.assertEqual(glob.glob(os.path.join(self.spool_dir, "*.jsonl")), [])
+
+    def test_flush_keeps_rows_while_the_database_is_unavailable(self):
+        self.log.record(self.customer, "inquiry", "kept")
+
+        with mock.patch.object(Interaction.objects, "bulk_create", side_effect=OperationalError("database is locked")):
+            self.assertEqual(self.log.flush(), 0)
+        self.assertEqual(self.bad_rows(), [])
+
+        self.assertEqual(self.log.flush(), 1)
+
+    def test_recover_replays_each_spool_file_on_its_own(self):
+        self.write_spool(f"interactions-{DEAD_PID}-1.jsonl", [
+            spool_row(self.customer.pk, "a"), spool_row(self.deleted.pk + 100, "orphan"), spool_row(self.customer.pk, "b"),
+        ])
+        self.write_spool(f"interactions-{DEAD_PID}-2.jsonl", [spool_row(self.customer.pk, "c")])
+
+        self.assertEqual(self.log.recover(), 3)
+        self.assertEqual(sorted(Interaction.objects.values_list("notes", flat=True)), ["a", "b", "c"])
+        self.assertEqual([row["notes"] for row in self.bad_rows()], ["orphan"])
+        self.assertEqual(glob.glob(os.path.join(self.spool_dir, "*.jsonl")), [])
+
+    def test_recover_replays_a_crashed_process_that_had_our_pid(self):
+        # The container restarted and this process got the crashed one's pid
+        crashed = f"interactions-{os.getpid()}-{uuid.uuid4().hex}-1.jsonl"
+        self.write_spool(crashed, [spool_row(self.customer.pk, "before the crash")])
+        self.log.record(self.customer, "inquiry", "buffered")
+
+        self.assertEqual(self.log.recover(), 1)
+        self.assertEqual(self.log.flush(), 1)
+
+        self.assertEqual(sorted(Interaction.objects.values_list("notes", flat=True)), ["before the crash", "buffered"])
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_recover_leaves_this_processs_own_spool_alone(self):
+        self.log.record(self.customer, "inquiry", "buffered")
+
+        self.assertEqual(self.log.recover(), 0)
+        self.assertEqual(len(glob.glob(os.path.join(self.spool_dir, "*.jsonl"))), 1)
+
+    def test_recover_keeps_a_file_it_cannot_write_yet(self):
+        self.write_spool(f"interactions-{DEAD_PID}-1.jsonl", [spool_row(self.customer.pk, "later")])
+        self.write_spool(f"interactions-{DEAD_PID}-2.jsonl", [spool_row(self.customer.pk, "now")])
+        write_rows = interaction_log_module.write_rows
+
+        def locked_for_later(rows):
+            if rows[0]["notes"] == "later":
+                raise OperationalError("database is locked")
+            return write_rows(rows)
+
+        with mock.patch.object(interaction_log_module, "write_rows", side_effect=locked_for_later):
+            self.assertEqual(self.log.recover(), 1)
+        self.assertEqual(len(glob.glob(os.path.join(self.spool_dir, "*.jsonl"))), 1)
+        self.assertEqual(self.bad_rows(), [])
+
+        self.assertEqual(self.log.recover(), 1)
+        self.assertEqual(Interaction.objects.count(), 2)
+
+    def test_malformed_rows_are_set_aside(self):
+        self.write_spool(f"interactions-{DEAD_PID}-1.jsonl", [
+            spool_row(self.customer.pk, "good"), dict(spool_row(self.customer.pk, "bad"), log_id="not-a-uuid"),
+        ])
+
+        self.assertEqual(self.log.recover(), 1)
+        self.assertEqual([row["notes"] for row in self.bad_rows()], ["bad"])
+
+    def test_discard_drops_the_rows_of_given_customers(self):
+        self.write_spool(f"interactions-{DEAD_PID}-1.jsonl", [
+            spool_row(self.customer.pk, "kept"), spool_row(self.deleted.pk, "dropped"),
+        ])
+        self.write_spool(f"interactions-{DEAD_PID}.bad", [spool_row(self.deleted.pk, "dropped")])
+
+        self.assertEqual(self.log.discard([self.deleted.pk]), 2)
+        self.assertEqual(os.listdir(self.spool_dir), [f"interactions-{DEAD_PID}-1.jsonl"])
+        self.assertEqual(self.log.recover(), 1)
+
+
+class LoadTestCleanupTests(TransactionTestCase):
+
+    def setUp(self):
+        self.spool_dir = isolate_spools(self)
+
+    def test_cleanup_leaves_no_spooled_rows_behind(self):
+        customer = Customer.objects.create(name="Load", phone_number=f"+{SENDER_PREFIX}00001")
+        interaction_log.record(customer, "inquiry", "synthetic")
+
+        LoadTestCommand().cleanup()
+
+        self.assertFalse(Customer.objects.filter(pk=customer.pk).exists())
+        self.assertEqual(Interaction.objects.count(), 0)
+        self.assertEqual(os.listdir(self.spool_dir), [])
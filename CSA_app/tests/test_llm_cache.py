@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from langchain_core.messages import AIMessage
+
+from CSA_app.llm_cache import CachedChain, MemoryCacheBackend, NGramIndex, normalize_text
+from CSA_app.llm_registry import registry
+from CSA_app.resilience import reset_breakers
+
+
+class NGramIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = NGramIndex()
+
+    def test_near_duplicate_is_found(self):
+        self.index.add("do you have 3 bedroom flats in lekki")
+
+        self.assertEqual(
+            self.index.nearest("do you have 3 bedroom flat in lekki", 0.85), "do you have 3 bedroom flats in lekki",
+        )
+
+    def test_different_numbers_never_match(self):
+        self.index.add("my budget is 50m")
+
+        self.assertIsNone(self.index.nearest("my budget is 60m", 0.5))
+
+    def test_negation_never_matches_its_opposite(self):
+        pairs = [
+            ("i liked the house", "i disliked the house"),
+            ("the apartment is clean", "the apartment isn't clean"),
+            ("i want to pay in installments", "i don't want to pay in installments"),
+            ("the place was furnished", "the place was unfurnished"),
+        ]
+        for cached, query in pairs:
+            with self.subTest(query=query):
+                index = NGramIndex()
+                index.add(cached)
+                self.assertIsNone(index.nearest(query, 0.5))
+                index = NGramIndex()
+                index.add(query)
+                self.assertIsNone(index.nearest(cached, 0.5))
+
+
+@override_settings(CSA_LLM_CACHE_ENABLED=True, CSA_LLM_CACHE_SIMILARITY_THRESHOLD=0.85)
+class CachedChainTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_breakers()
+        self.model = mock.Mock()
+        self.model.invoke.side_effect = lambda inputs, *args, **kwargs: AIMessage(content=f"answer {inputs['message']}")
+
+    def chain(self, **options):
+        return CachedChain("test", self.model, backend=MemoryCacheBackend(), **options)
+
+    def test_normalized_repeat_is_served_from_the_cache(self):
+        chain = self.chain()
+
+        first = chain.invoke({"message": "What's available in  Lekki?"})
+        second = chain.invoke({"message": "what's available in lekki"})
+
+        self.assertEqual(normalize_text("What's available in  Lekki?"), "what's available in lekki")
+        self.assertEqual(second.content, first.content)
+        self.model.invoke.assert_called_once()
+
+    def test_fuzzy_chain_reuses_a_similar_message(self):
+        chain = self.chain(fuzzy=True)
+
+        chain.invoke({"message": "do you have 3 bedroom flats in lekki"})
+        chain.invoke({"message": "do you have 3 bedroom flat in lekki"})
+
+        self.model.invoke.assert_called_once()
+
+    def test_fuzzy_chain_does_not_reuse_a_negated_message(self):
+        chain = self.chain(fuzzy=True)
+
+        chain.invoke({"message": "I liked the house"})
+        answer = chain.invoke({"message": "I disliked the house"})
+
+        self.assertEqual(answer.content, "answer I disliked the house")
+        self.assertEqual(self.model.invoke.call_count, 2)
+
+    def test_sentiment_chain_is_not_fuzzy(self):
+        registry.set_llm(mock.Mock())
+        self.addCleanup(registry.set_llm, None)
+
+        self.assertFalse(registry.get_chain("post_inspection").fuzzy)
+        self.assertTrue(registry.get_chain("intent").fuzzy)
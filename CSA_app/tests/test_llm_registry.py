@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from CSA_app.llm_registry import LLMRegistry
+
+
+class LLMRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.llm_factory = mock.Mock(side_effect=lambda: mock.Mock(name="llm"))
+        self.registry = LLMRegistry(self.llm_factory)
+        self.chain_factory = mock.Mock(side_effect=lambda llm: mock.Mock(name="chain", llm=llm))
+        self.registry.register("intent", self.chain_factory)
+
+    def test_nothing_is_built_until_a_chain_is_used(self):
+        self.llm_factory.assert_not_called()
+        self.chain_factory.assert_not_called()
+
+        chain = self.registry.get_chain("intent")
+
+        self.assertIs(self.registry.get_chain("intent"), chain)
+        self.llm_factory.assert_called_once()
+        self.chain_factory.assert_called_once()
+
+    def test_concurrent_first_use_builds_one_client(self):
+        barrier = threading.Barrier(8)
+
+        def use():
+            barrier.wait()
+            self.registry.get_chain("intent")
+
+        threads = [threading.Thread(target=use) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.llm_factory.assert_called_once()
+        self.chain_factory.assert_called_once()
+
+    def test_set_llm_rebuilds_the_chains_on_the_new_client(self):
+        self.registry.get_chain("intent")
+        stand_in = mock.Mock(name="stand-in")
+
+        self.registry.set_llm(stand_in)
+
+        self.assertIs(self.registry.get_chain("intent").chain.llm, stand_in)
+
+    def test_failed_warm_up_is_reported_not_raised(self):
+        self.llm_factory.side_effect = RuntimeError("GEMINI_API_KEY must be set")
+
+        self.assertFalse(self.registry.warm_up())
+
+
+class ImportTimeTests(SimpleTestCase):
+
+    def test_handlers_import_without_the_llm_stack(self):
+        code = (
+            "import sys, django; django.setup(); import CSA_app.views, CSA_app.whatsapp_handler, CSA_app.work_queue; "
+            "print(sorted(name for name in ('langchain_google_genai', 'google.generativeai') if name in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR, env={**os.environ, "CSA_WARM_UP_LLM": "False"},
+        )
+
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "[]")
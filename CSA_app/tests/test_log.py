@@ -0,0 +1,138 @@
+import json
+import logging
+import logging.handlers
+import queue
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from CSA_app.log import (
+    CorrelationFilter, JsonFormatter, QueueListenerHandler, SamplingFilter, correlation, correlation_ids,
+)
+from CSA_app.middleware import RequestIdMiddleware
+
+
+def make_record(msg="hello %s", args=("world",), level=logging.INFO, exc_info=None, **extra):
+    record = logging.LogRecord("CSA_app.test", level, __file__, 1, msg, args, exc_info)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+class CorrelationTests(SimpleTestCase):
+
+    def test_ids_nest_and_are_restored(self):
+        with correlation(request_id="req-1"):
+            with correlation(job_id=7, message_id=""):
+                self.assertEqual(correlation_ids(), {"request_id": "req-1", "job_id": 7})
+            self.assertEqual(correlation_ids(), {"request_id": "req-1"})
+        self.assertEqual(correlation_ids(), {})
+
+    def test_filter_copies_ids_without_overriding_extra(self):
+        record = make_record(request_id="from-extra")
+        with correlation(request_id="req-1", job_id=7):
+            CorrelationFilter().filter(record)
+
+        self.assertEqual(record.request_id, "from-extra")
+        self.assertEqual(record.job_id, 7)
+
+
+class JsonFormatterTests(SimpleTestCase):
+
+    def test_one_json_object_with_extra_fields(self):
+        line = JsonFormatter().format(make_record(customer_id=42))
+
+        entry = json.loads(line)
+        self.assertNotIn("\n", line)
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["logger"], "CSA_app.test")
+        self.assertEqual(entry["message"], "hello world")
+        self.assertEqual(entry["customer_id"], 42)
+        self.assertNotIn("args", entry)
+
+    def test_tracebacks_are_kept(self):
+        try:
+            raise ValueError("boom")
+        except ValueError as e:
+            record = make_record(level=logging.ERROR, exc_info=(type(e), e, e.__traceback__))
+
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertIn("ValueError: boom", entry["exc"])
+
+
+class SamplingFilterTests(SimpleTestCase):
+
+    def test_only_records_at_or_below_the_level_are_sampled(self):
+        sampler = SamplingFilter(rate=0.25)
+
+        with mock.patch("CSA_app.log.random.random", return_value=0.5):
+            self.assertFalse(sampler.filter(make_record(level=logging.DEBUG)))
+            self.assertTrue(sampler.filter(make_record(level=logging.INFO)))
+        with mock.patch("CSA_app.log.random.random", return_value=0.1):
+            self.assertTrue(sampler.filter(make_record(level=logging.DEBUG)))
+
+    def test_level_can_be_named_or_numbered(self):
+        self.assertEqual(SamplingFilter(level="info").level, logging.INFO)
+        self.assertEqual(SamplingFilter(level=logging.WARNING).level, logging.WARNING)
+        with self.assertRaises(ValueError):
+            SamplingFilter(level="LOUD")
+
+
+class QueueListenerHandlerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.target = logging.handlers.BufferingHandler(100)
+        self.handler = QueueListenerHandler([self.target], queue_size=1)
+        self.addCleanup(self.handler.listener.stop)
+
+    def test_records_reach_the_target_with_their_message_merged(self):
+        args = ["first"]
+        self.handler.handle(make_record(args=(args,)))
+        args.append("changed")
+        self.handler.listener.stop()
+
+        record, = self.target.buffer
+        self.assertEqual(record.getMessage(), "hello ['first']")
+        self.assertIsNone(record.args)
+
+    def test_stopping_with_a_full_queue_drains_it(self):
+        for _ in range(5):
+            self.handler.handle(make_record())
+        self.handler.listener.stop()
+        self.handler.listener.stop()
+
+        self.assertGreaterEqual(len(self.target.buffer), 1)
+        self.assertTrue(self.handler.queue.empty())
+
+    def test_a_full_queue_drops_records_instead_of_blocking(self):
+        self.handler.listener.stop()
+
+        self.handler.handle(make_record())
+        self.handler.handle(make_record())
+
+        self.assertEqual(self.handler.queue.qsize(), 1)
+
+
+class RequestIdMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        self.seen = []
+        self.middleware = RequestIdMiddleware(self.get_response)
+
+    def get_response(self, request):
+        self.seen.append(correlation_ids().get("request_id"))
+        return HttpResponse()
+
+    def test_a_sane_proxy_id_is_reused(self):
+        response = self.middleware(RequestFactory().get("/", HTTP_X_REQUEST_ID="abc-123"))
+
+        self.assertEqual(response["X-Request-ID"], "abc-123")
+        self.assertEqual(self.seen, ["abc-123"])
+
+    def test_other_ids_are_replaced(self):
+        response = self.middleware(RequestFactory().get("/", HTTP_X_REQUEST_ID="bad id\n"))
+
+        self.assertRegex(response["X-Request-ID"], r"^[0-9a-f]{32}$")
+        self.assertEqual(self.seen, [response["X-Request-ID"]])
+        self.assertEqual(correlation_ids(), {})
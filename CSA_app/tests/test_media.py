@@ -0,0 +1,145 @@
+import io
+import os
+import random
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from CSA_app import media
+from CSA_app.models import ImageHash
+from CSA_app.stubs import StubGraphServer
+from CSA_app.tests.test_catalog import create_property
+from CSA_app.whatsapp_sender import WhatsAppClient
+
+
+def photo(seed, size=(640, 480)):
+    """A blocky random picture; different seeds give unrelated pictures."""
+    rng = random.Random(seed)
+    small = Image.new("RGB", (8, 6))
+    small.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(8 * 6)])
+    return small.resize(size, Image.Resampling.BILINEAR)
+
+
+def jpeg(image, quality=90):
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=quality)
+    return output.getvalue()
+
+
+def distance(a, b):
+    return (a ^ b).bit_count()
+
+
+class PerceptualHashTests(SimpleTestCase):
+
+    def test_resized_and_recompressed_copies_stay_close(self):
+        original = media.phash_image(photo(1))
+        copy = media.phash_file(io.BytesIO(jpeg(photo(1).resize((320, 240)), quality=40)))
+
+        self.assertLessEqual(distance(original, copy), 6)
+
+    def test_different_photos_are_far_apart(self):
+        self.assertGreater(distance(media.phash_image(photo(1)), media.phash_image(photo(2))), 16)
+
+
+class MediaTestCase(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix="csa-media-")
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.inbox = os.path.join(directory, "inbox")
+        settings = override_settings(
+            MEDIA_ROOT=os.path.join(directory, "media"), CSA_MEDIA_INBOX_DIR=self.inbox,
+            CSA_IMAGE_RENDITIONS=False, CSA_IMAGE_MATCHING=True, CSA_IMAGE_MATCH_MAX_DISTANCE=10,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def create_listing(self, seed, **fields):
+        image = default_storage.save("property_images/photo.jpg", ContentFile(jpeg(photo(seed))))
+        return create_property(image=image, **fields)
+
+
+class ImageIndexTests(MediaTestCase):
+
+    def test_listing_photos_are_hashed_once_on_save(self):
+        prop = self.create_listing(1)
+
+        row = ImageHash.objects.get(name=prop.image.name)
+        with default_storage.open(prop.image.name) as f:
+            self.assertEqual(int(row.phash, 16), media.phash_file(f))
+        self.create_listing(1)
+        self.assertEqual(ImageHash.objects.count(), 1)
+
+    def test_closest_listing_within_the_distance_wins(self):
+        first = self.create_listing(1)
+        second = self.create_listing(2)
+        index = media.ImageIndex()
+        index.load()
+
+        self.assertEqual(index.match(media.phash_image(photo(1))), first.property_identifier)
+        self.assertEqual(index.match(media.phash_image(photo(2))), second.property_identifier)
+        self.assertIsNone(index.match(media.phash_image(photo(3))))
+
+    def test_a_photo_shared_by_several_listings_identifies_none(self):
+        self.create_listing(1)
+        self.create_listing(1)
+        index = media.ImageIndex()
+        index.load()
+
+        self.assertEqual(len(index), 0)
+        self.assertIsNone(index.match(media.phash_image(photo(1))))
+
+
+class InboundMediaTests(MediaTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = StubGraphServer().start()
+        cls.addClassCleanup(cls.stub.stop)
+
+    def setUp(self):
+        super().setUp()
+        self.client = WhatsAppClient(access_token="token", phone_number_id="123", api_url=self.stub.url)
+        self.addCleanup(self.client.close)
+
+    def test_download_streams_the_file_to_the_inbox(self):
+        data = jpeg(photo(1))
+        path = media.download_media(self.stub.add_media(data), client=self.client)
+        self.addCleanup(os.remove, path)
+
+        self.assertEqual(os.path.dirname(path), self.inbox)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_oversized_media_is_abandoned(self):
+        media_id = self.stub.add_media(jpeg(photo(1)))
+
+        with override_settings(CSA_MEDIA_MAX_BYTES=100), self.assertRaises(media.MediaTooLarge):
+            media.download_media(media_id, client=self.client)
+        self.assertEqual(os.listdir(self.inbox) if os.path.exists(self.inbox) else [], [])
+
+    def test_a_forwarded_listing_photo_is_matched(self):
+        prop = self.create_listing(1)
+        self.create_listing(2)
+        index = media.ImageIndex()
+        index.load()
+        self.enterContext(mock.patch.object(media, "_index", index))
+        forwarded = jpeg(photo(1).resize((480, 360)), quality=50)
+
+        identifier = media.match_inbound_image({"id": self.stub.add_media(forwarded)}, client=self.client)
+
+        self.assertEqual(identifier, prop.property_identifier)
+        self.assertEqual(os.listdir(self.inbox), [])
+
+    def test_failures_mean_no_match(self):
+        self.assertIsNone(media.match_inbound_image({"id": "unknown"}, client=self.client))
+        self.assertIsNone(media.match_inbound_image({"id": self.stub.add_media(b"not an image")}, client=self.client))
+        self.assertIsNone(media.match_inbound_image({}, client=self.client))
+        self.assertEqual(os.listdir(self.inbox), [])
@@ -0,0 +1,76 @@
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from CSA_app.llm_registry import registry
+from CSA_app.resilience import reset_breakers
+from CSA_app.schemas import MessageAnalysis, parse_property_details
+from CSA_app.stubs import StubChatModel
+from CSA_app.whatsapp_handler import analyze_message, classify_intent
+
+
+class MessageAnalysisSchemaTests(SimpleTestCase):
+
+    def test_model_output_is_cleaned(self):
+        analysis = MessageAnalysis.model_validate({
+            "intent": " Budget_Sharing ", "Property_identifier": "# 100042", "Location": "Lekki",
+            "Bedrooms": "3 bedrooms", "Budget": "₦45m", "sentiment": "Neutral",
+        })
+
+        self.assertEqual(analysis.intent, "budget_sharing")
+        self.assertEqual(analysis.property_identifier, "100042")
+        self.assertEqual((analysis.location, analysis.bedrooms, analysis.budget), ("Lekki", 3, 45_000_000))
+        self.assertIsNone(analysis.sentiment)
+
+    def test_extraction_json_may_come_in_a_code_fence(self):
+        content = "```json\n" + json.dumps({"Property_identifier": "#47237", "Budget": "20,000,000"}) + "\n```"
+
+        details = parse_property_details(content)
+
+        self.assertEqual((details.property_identifier, details.budget), ("47237", 20_000_000))
+
+
+@override_settings(CSA_LLM_CACHE_ENABLED=False, CSA_COMBINED_ANALYSIS=True)
+@mock.patch("CSA_app.intent_classifier.get_intent_model", return_value=None)
+class CombinedAnalysisTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_breakers()
+        self.addCleanup(reset_breakers)
+        self.addCleanup(registry.set_llm, None)
+
+    def use_model(self, **options):
+        model = StubChatModel(**options)
+        registry.set_llm(model)
+        return model
+
+    def test_one_call_returns_intent_entities_and_sentiment(self, _model):
+        model = self.use_model()
+
+        intent, analysis = classify_intent("I'm looking for a 3 bedroom flat in Lekki")
+
+        self.assertEqual(intent, "property_recommendation")
+        self.assertEqual((analysis.bedrooms, analysis.location), (3, "Lekki"))
+        self.assertEqual([call["chain"] for call in model.calls], ["message_analysis"])
+
+    def test_fast_path_needs_no_model_call(self, _model):
+        model = self.use_model()
+
+        self.assertEqual(classify_intent("Is property #100042 still available?"), ("property_inquiry", None))
+        self.assertEqual(model.calls, [])
+
+    @override_settings(CSA_COMBINED_ANALYSIS=False)
+    def test_without_combined_analysis_only_the_intent_is_asked(self, _model):
+        model = self.use_model()
+
+        self.assertEqual(classify_intent("I'm looking for a 3 bedroom flat in Lekki"), ("property_recommendation", None))
+        self.assertEqual([call["chain"] for call in model.calls], ["intent"])
+
+    def test_unusable_output_is_none(self, _model):
+        with mock.patch("CSA_app.whatsapp_handler.get_chain") as get_chain:
+            get_chain.return_value.invoke.return_value = {"intent": "general_query"}
+            self.assertIsNone(analyze_message("hello there"))
+
+            get_chain.return_value.invoke.side_effect = RuntimeError("bad JSON")
+            self.assertIsNone(analyze_message("hello there"))
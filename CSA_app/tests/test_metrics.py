@@ -0,0 +1,113 @@
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, override_settings
+
+from CSA_app import metrics
+
+
+class RegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = self.registry.histogram("test_seconds", "Test.", ["stage"], buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, stage="send")
+
+        self.assertEqual(self.registry.render().splitlines(), [
+            "# HELP test_seconds Test.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{stage="send",le="0.1"} 2',
+            'test_seconds_bucket{stage="send",le="1.0"} 3',
+            'test_seconds_bucket{stage="send",le="+Inf"} 4',
+            'test_seconds_sum{stage="send"} 3.65',
+            'test_seconds_count{stage="send"} 4',
+        ])
+
+    def test_counter_keeps_a_value_per_label_set_and_escapes_them(self):
+        counter = self.registry.counter("test_total", "Test.", ["intent"])
+        counter.inc(intent="greeting")
+        counter.inc(2, intent="greeting")
+        counter.inc(intent='say "hi"\n')
+
+        self.assertEqual(counter.value(intent="greeting"), 3)
+        self.assertIn('test_total{intent="say \\"hi\\"\\n"} 1', self.registry.render())
+
+    @override_settings(CSA_METRICS_ENABLED=False)
+    def test_nothing_is_recorded_when_disabled(self):
+        counter = self.registry.counter("test_total", "Test.")
+        histogram = self.registry.histogram("test_seconds", "Test.")
+        counter.inc()
+        histogram.observe(1)
+
+        self.assertEqual(counter.value(), 0)
+        self.assertEqual(histogram.count(), 0)
+
+
+class SpanTests(SimpleTestCase):
+
+    def setUp(self):
+        metrics.stage_seconds.reset()
+        self.addCleanup(metrics.stage_seconds.reset)
+
+    def test_span_times_a_block_even_when_it_raises(self):
+        with metrics.span("classify"):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.span("classify"):
+                raise ValueError
+
+        self.assertEqual(metrics.stage_seconds.count(stage="classify"), 2)
+
+    def test_llm_tokens_are_counted_when_reported(self):
+        metrics.llm_tokens.reset()
+        self.addCleanup(metrics.llm_tokens.reset)
+
+        metrics.record_llm_result("intent", SimpleNamespace(usage_metadata={"input_tokens": 12, "output_tokens": 3}))
+        metrics.record_llm_result("intent", "plain text answer")
+
+        self.assertEqual(metrics.llm_tokens.value(chain="intent", direction="input"), 12)
+        self.assertEqual(metrics.llm_tokens.value(chain="intent", direction="output"), 3)
+
+
+class MetricsEndpointTests(SimpleTestCase):
+
+    def setUp(self):
+        metrics.turns.reset()
+        self.addCleanup(metrics.turns.reset)
+        metrics.turns.inc(intent="greeting")
+
+    @override_settings(CSA_METRICS_TOKEN="")
+    def test_view_does_not_exist_without_a_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    @override_settings(CSA_METRICS_TOKEN="secret")
+    def test_view_serves_the_exposition_format(self):
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        self.assertIn('csa_turns_total{intent="greeting"} 1', response.content.decode())
+
+    @override_settings(CSA_METRICS_TOKEN="secret")
+    def test_view_requires_the_bearer_token_when_set(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+
+    def test_worker_server_serves_only_metrics(self):
+        server = metrics.serve_metrics(0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.assertEqual(server.server_address[0], "127.0.0.1")
+        base = f"http://127.0.0.1:{server.server_port}"
+
+        with urllib.request.urlopen(f"{base}/metrics", timeout=5) as response:
+            self.assertIn('csa_turns_total{intent="greeting"} 1', response.read().decode())
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            urllib.request.urlopen(f"{base}/other", timeout=5)
+        raised.exception.close()
+        self.assertEqual(raised.exception.code, 404)
@@ -0,0 +1,41 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Migrates back to ``migrate_from``, lets the test add rows, then migrates to ``migrate_to``."""
+
+    app = "CSA_app"
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate([(self.app, self.migrate_from)])
+        self.old_apps = self.executor.loader.project_state([(self.app, self.migrate_from)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([(self.app, self.migrate_to)])
+        return executor.loader.project_state([(self.app, self.migrate_to)]).apps
+
+
+class FillLocationNormalizedTests(MigrationTestCase):
+    migrate_from = "0009_processedmessage"
+    migrate_to = "0010_property_location_normalized_indexes"
+
+    def test_existing_locations_are_normalized(self):
+        Property = self.old_apps.get_model(self.app, "Property")
+        Property.objects.create(
+            name="Flat", description="", price=1000, location="Plot 45, Lekki Phase 1",
+            bedrooms=2, bathrooms=1, property_identifier="100001",
+        )
+
+        Property = self.migrate().get_model(self.app, "Property")
+
+        self.assertEqual(Property.objects.get().location_normalized, "plot 45 lekki phase 1")
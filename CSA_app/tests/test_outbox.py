@@ -0,0 +1,53 @@
+from unittest import mock
+
+import requests
+from django.db import DatabaseError
+from django.test import TransactionTestCase, override_settings
+
+from CSA_app.models import OutboxMessage
+from CSA_app.outbox import MakeDispatcher
+
+
+@override_settings(CSA_OUTBOX_MAX_ATTEMPTS=3, CSA_OUTBOX_RETRY_BACKOFF=1, CSA_OUTBOX_RETRY_BACKOFF_MAX=60)
+class DispatchBatchTests(TransactionTestCase):
+    # Deliveries run on pool threads, which only see committed rows
+
+    def setUp(self):
+        self.dispatcher = MakeDispatcher(url="http://make.invalid/hook", concurrency=2)
+        self.addCleanup(self.dispatcher.close)
+
+    def make_messages(self, *titles):
+        return [OutboxMessage.objects.create(payload={"title": title}) for title in titles]
+
+    def post(self, message):
+        title = message.payload["title"]
+        if title == "timeout":
+            raise requests.Timeout("timed out")
+        if title == "broken":
+            raise DatabaseError("database is locked")
+        if title == "bad":
+            raise TypeError("bad payload")
+
+    def test_unexpected_errors_are_recorded_without_aborting_the_batch(self):
+        ok, timeout, broken, bad = self.make_messages("ok", "timeout", "broken", "bad")
+
+        with mock.patch.object(self.dispatcher, "post", side_effect=self.post):
+            self.assertEqual(self.dispatcher.dispatch_batch(), (4, 1))
+
+        statuses = dict(OutboxMessage.objects.values_list("id", "status"))
+        self.assertEqual(statuses[ok.id], OutboxMessage.STATUS_SENT)
+        for message in (timeout, broken, bad):
+            self.assertEqual(statuses[message.id], OutboxMessage.STATUS_PENDING)
+        self.assertEqual(OutboxMessage.objects.get(pk=bad.id).last_error, "TypeError: bad payload")
+        self.assertFalse(OutboxMessage.objects.filter(status=OutboxMessage.STATUS_SENDING).exists())
+
+    def test_message_fails_after_max_attempts(self):
+        message, = self.make_messages("bad")
+        OutboxMessage.objects.filter(pk=message.pk).update(attempts=2)
+
+        with mock.patch.object(self.dispatcher, "post", side_effect=self.post):
+            self.assertEqual(self.dispatcher.dispatch_batch(), (1, 0))
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.STATUS_FAILED)
+        self.assertEqual(message.attempts, 3)
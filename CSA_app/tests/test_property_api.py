@@ -0,0 +1,64 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from CSA_app.catalog import bump_catalog_version
+from CSA_app.models import Property
+
+from .test_catalog import create_property
+
+
+class PropertyListAPITests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.flat = create_property(name="Flat", price=20_000_000, location="Lekki Phase 1", bedrooms=3)
+        self.duplex = create_property(name="Duplex", price=60_000_000, location="Ikoyi", bedrooms=5)
+        self.sold = create_property(name="Sold", price=25_000_000, location="Yaba", bedrooms=3, is_available=False)
+        bump_catalog_version()
+
+    def names(self, response):
+        return [item["name"] for item in response.json()["results"]]
+
+    def test_pages_follow_the_cursor_newest_first(self):
+        first = self.client.get("/properties/", {"page_size": 2})
+        second = self.client.get(first.json()["next"])
+
+        self.assertEqual(self.names(first), ["Sold", "Duplex"])
+        self.assertEqual(self.names(second), ["Flat"])
+        self.assertIsNone(second.json()["next"])
+
+    def test_filters(self):
+        cases = {
+            "min_price=21000000&max_price=30000000": ["Sold"],
+            "bedrooms=3": ["Sold", "Flat"],
+            "location=lekki": ["Flat"],
+            "available=true": ["Duplex", "Flat"],
+        }
+        for query, names in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(self.names(self.client.get(f"/properties/?{query}")), names)
+
+    def test_malformed_filters_and_unknown_fields_are_rejected(self):
+        for query in ("min_price=lots", "bedrooms=three", "fields=name,secret"):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f"/properties/?{query}").status_code, 400)
+
+    def test_fields_limit_the_returned_fields(self):
+        response = self.client.get("/properties/", {"fields": "name,price"})
+
+        self.assertEqual(set(response.json()["results"][0]), {"name", "price"})
+
+    def test_etag_and_cache_follow_the_catalog_version(self):
+        response = self.client.get("/properties/")
+        etag = response["ETag"]
+
+        self.assertEqual(self.client.get("/properties/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Property.objects.filter(pk=self.flat.pk).update(name="Renamed flat")
+        self.assertNotIn("Renamed flat", self.names(self.client.get("/properties/")))
+
+        bump_catalog_version()
+        response = self.client.get("/properties/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Renamed flat", self.names(response))
@@ -0,0 +1,42 @@
+from django.test import TestCase, override_settings
+
+from CSA_app import catalog
+from CSA_app.recommendations import recommend_properties
+
+from .test_catalog import create_property
+
+
+@override_settings(CSA_PROPERTY_CATALOG=False, CSA_RECOMMENDATION_PRICE_SPREAD=0.2, CSA_RECOMMENDATION_LIMIT=6)
+class RecommendPropertiesTests(TestCase):
+
+    def setUp(self):
+        self.near = create_property(name="Near", price=21_000_000, location="Ikeja", bedrooms=1)
+        self.matching = create_property(name="Matching", price=24_000_000, location="Plot 4, Lekki Phase 1", bedrooms=3)
+        self.close_bedrooms = create_property(name="Close", price=23_000_000, location="Yaba", bedrooms=2)
+        create_property(name="Sold", price=20_000_000, location="Lekki", bedrooms=3, is_available=False)
+        create_property(name="Too dear", price=30_000_000, location="Lekki", bedrooms=3)
+        create_property(name="Too cheap", price=10_000_000, location="Lekki", bedrooms=3)
+
+    def ids(self, properties):
+        return [prop.id for prop in properties]
+
+    def test_only_available_properties_within_the_window_are_ranked_by_price(self):
+        self.assertEqual(self.ids(recommend_properties(20_000_000)), [self.near.id, self.close_bedrooms.id, self.matching.id])
+
+    def test_location_and_bedrooms_outweigh_price(self):
+        ranked = recommend_properties(20_000_000, location="lekki", bedrooms=3)
+
+        # Matching: 0.0 for price + 1.0 location + 0.5 bedrooms; Near: 0.75 price; Close: 0.25 price + 0.25 bedrooms
+        self.assertEqual(self.ids(ranked), [self.matching.id, self.near.id, self.close_bedrooms.id])
+
+    def test_ranking_is_one_query(self):
+        with self.assertNumQueries(1):
+            ranked = recommend_properties(20_000_000, location="Lekki", bedrooms=3, limit=2)
+        self.assertEqual(len(ranked), 2)
+
+    def test_catalog_ranks_the_same_way(self):
+        expected = self.ids(recommend_properties(20_000_000, location="Lekki", bedrooms=3))
+        catalog._catalog.load()
+
+        with override_settings(CSA_PROPERTY_CATALOG=True, CSA_CATALOG_CHECK_INTERVAL=3600):
+            self.assertEqual(self.ids(recommend_properties(20_000_000, location="Lekki", bedrooms=3)), expected)
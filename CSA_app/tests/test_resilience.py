@@ -0,0 +1,220 @@
+import asyncio
+import json
+import os
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from CSA_app import resilience
+from CSA_app.resilience import CircuitBreaker, ModelUnavailable, get_breaker, local_analysis, reset_breakers
+from CSA_app.tests.helpers import isolate_spools, webhook_payload
+from CSA_app.work_queue import ImmediateQueueBackend, replay_spooled_webhooks, spool_webhook
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.enterContext(mock.patch("CSA_app.resilience.time.monotonic", self.clock))
+        self.breaker = CircuitBreaker("gemini", failure_threshold=2, reset_timeout=30)
+
+    def test_failures_in_a_row_open_the_circuit(self):
+        self.breaker.failure()
+        self.breaker.success()
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+        self.breaker.failure()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_one_probe_after_the_reset_timeout(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.clock.now += 30
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_a_failed_probe_opens_the_circuit_again(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+
+        self.breaker.failure()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.clock.now += 29
+        self.assertFalse(self.breaker.allow())
+
+    def test_an_abandoned_probe_frees_the_slot(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+
+        self.breaker.release()
+
+        self.assertTrue(self.breaker.allow())
+
+
+def answer(value):
+    return lambda: value
+
+
+def fail():
+    raise RuntimeError("503 Service Unavailable")
+
+
+@override_settings(CSA_LLM_TIMEOUT=0.2, CSA_LLM_HEDGE_AFTER=0, CSA_LLM_BREAKER_FAILURES=3, CSA_LLM_BREAKER_RESET=30)
+class InvokeTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_breakers()
+        self.addCleanup(reset_breakers)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def hang(self):
+        self.release.wait(5)
+        return "too late"
+
+    def invoke(self, *runnables):
+        providers = [(f"provider-{n}", runnable) for n, runnable in enumerate(runnables)]
+        return resilience.invoke("intent", providers, lambda runnable: runnable())
+
+    def test_a_failure_moves_on_to_the_next_provider(self):
+        self.assertEqual(self.invoke(fail, answer("greeting")), "greeting")
+        self.assertEqual(get_breaker("provider-0")._failures, 1)
+
+    def test_a_slow_provider_is_abandoned_at_its_deadline(self):
+        self.assertEqual(self.invoke(self.hang, answer("greeting")), "greeting")
+
+    def test_no_answer_raises_model_unavailable(self):
+        with self.assertRaises(ModelUnavailable):
+            self.invoke(fail, self.hang)
+
+    def test_providers_with_an_open_circuit_are_skipped(self):
+        for _ in range(3):
+            get_breaker("provider-0").failure()
+        skipped = mock.Mock(return_value="never")
+
+        self.assertEqual(self.invoke(skipped, answer("greeting")), "greeting")
+        skipped.assert_not_called()
+
+    @override_settings(CSA_LLM_HEDGE_AFTER=0.05, CSA_LLM_TIMEOUT=5)
+    def test_a_slow_provider_is_hedged(self):
+        self.assertEqual(self.invoke(self.hang, answer("greeting")), "greeting")
+
+    def test_async_calls_time_out_and_fall_back(self):
+        async def slow():
+            await asyncio.sleep(5)
+
+        async def failing():
+            fail()
+
+        async def quick():
+            return "greeting"
+
+        async def run(*coroutines):
+            providers = [(f"provider-{n}", c) for n, c in enumerate(coroutines)]
+            return await resilience.ainvoke("intent", providers, lambda c: c())
+
+        self.assertEqual(asyncio.run(run(slow, failing, quick)), "greeting")
+        with self.assertRaises(ModelUnavailable):
+            asyncio.run(run(slow, failing))
+
+
+class LocalAnalysisTests(SimpleTestCase):
+
+    def test_search_details_are_picked_out(self):
+        analysis = local_analysis("Looking for a 3 bedroom flat in Victoria Island, budget 45m")
+
+        self.assertEqual(analysis.bedrooms, 3)
+        self.assertEqual(analysis.location, "Victoria Island")
+        self.assertEqual(analysis.budget, 45_000_000)
+        self.assertIsNone(analysis.property_identifier)
+
+    def test_listing_identifiers(self):
+        self.assertEqual(local_analysis("Is property #100042 still available?").property_identifier, "100042")
+        self.assertEqual(local_analysis("property id 47237 please").property_identifier, "47237")
+
+    def test_lowercase_words_are_not_locations(self):
+        self.assertIsNone(local_analysis("can I pay in installments").location)
+
+    def test_feedback_sentiment(self):
+        self.assertEqual(resilience.local_sentiment("The rooms were too small"), "negative")
+        self.assertEqual(resilience.local_sentiment("Lovely place, we liked it"), "positive")
+
+
+class FailingBackend(ImmediateQueueBackend):
+
+    def enqueue(self, payload):
+        raise RuntimeError("database is locked")
+
+
+class WebhookSpoolTests(SimpleTestCase):
+
+    def setUp(self):
+        isolate_spools(self)
+
+    def spooled(self):
+        return sorted(os.listdir(settings.CSA_WEBHOOK_SPOOL_DIR))
+
+    def test_replay_queues_oldest_first_and_removes_the_files(self):
+        payloads = [webhook_payload("2348031234567", f"message {n}") for n in range(3)]
+        for payload in payloads:
+            spool_webhook(payload)
+        backend = ImmediateQueueBackend()
+
+        with mock.patch.object(backend, "enqueue") as enqueue:
+            self.assertEqual(replay_spooled_webhooks(backend), 3)
+
+        self.assertEqual([call.args[0] for call in enqueue.call_args_list], payloads)
+        self.assertEqual(self.spooled(), [])
+
+    def test_replay_stops_while_the_queue_is_down(self):
+        spool_webhook(webhook_payload("2348031234567", "hello"))
+
+        self.assertEqual(replay_spooled_webhooks(FailingBackend()), 0)
+        self.assertEqual(len(self.spooled()), 1)
+
+    def test_unreadable_files_are_set_aside(self):
+        path = spool_webhook(webhook_payload("2348031234567", "hello"))
+        with open(path, "w") as f:
+            f.write("{truncated")
+
+        with mock.patch.object(ImmediateQueueBackend, "enqueue") as enqueue:
+            self.assertEqual(replay_spooled_webhooks(ImmediateQueueBackend()), 0)
+
+        enqueue.assert_not_called()
+        self.assertEqual(self.spooled(), [os.path.basename(path) + ".bad"])
+
+    def test_the_webhook_spools_when_the_queue_fails(self):
+        payload = webhook_payload("2348031234567", "hello")
+
+        with mock.patch("CSA_app.views.aenqueue_webhook", side_effect=RuntimeError("database is locked")):
+            response = self.client.post("/", json.dumps(payload), content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        spooled, = self.spooled()
+        with open(os.path.join(settings.CSA_WEBHOOK_SPOOL_DIR, spooled)) as f:
+            self.assertEqual(json.load(f), payload)
@@ -0,0 +1,130 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from CSA_app.models import Property
+from CSA_app.storage import ContentAddressedStorage, file_digest, image_rendition, public_media_url, rendition_name
+from CSA_app.tests.test_catalog import create_property
+
+
+def image_bytes(size=(2400, 1200), image_format="PNG", color=(200, 30, 30)):
+    output = io.BytesIO()
+    Image.new("RGB", size, color).save(output, image_format)
+    return output.getvalue()
+
+
+def temporary_media(test):
+    directory = tempfile.mkdtemp(prefix="csa-media-")
+    test.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+    return directory
+
+
+@override_settings(CSA_IMAGE_RENDITIONS=True, CSA_IMAGE_WHATSAPP_MAX_SIDE=1600, CSA_IMAGE_WEB_MAX_SIDE=1024)
+class ContentAddressedStorageTests(SimpleTestCase):
+
+    def setUp(self):
+        self.storage = ContentAddressedStorage(location=temporary_media(self), base_url="/media/")
+
+    def test_identical_uploads_are_stored_once(self):
+        content = image_bytes()
+        digest = file_digest(ContentFile(content))
+
+        first = self.storage.save("property_images/house.PNG", ContentFile(content))
+        second = self.storage.save("property_images/copy.png", ContentFile(content))
+
+        self.assertEqual(first, f"property_images/{digest[:2]}/{digest}.png")
+        self.assertEqual(second, first)
+        self.assertEqual(self.storage.listdir(f"property_images/{digest[:2]}")[1], [f"{digest}.png"])
+
+    def test_images_get_fitted_renditions(self):
+        name = self.storage.save("property_images/house.png", ContentFile(image_bytes()))
+
+        whatsapp = self.storage.rendition(name, "whatsapp")
+        web = self.storage.rendition(name, "web")
+        self.assertEqual(whatsapp, rendition_name(name, "whatsapp"))
+        self.assertTrue(whatsapp.startswith("property_images/renditions/"))
+        with self.storage.open(whatsapp) as f, Image.open(f) as image:
+            self.assertEqual((image.format, image.size), ("JPEG", (1600, 800)))
+        with self.storage.open(web) as f, Image.open(f) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (1024, 512)))
+
+    def test_files_that_are_not_images_are_stored_without_renditions(self):
+        name = self.storage.save("property_images/notes.txt", ContentFile(b"not an image"))
+
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.rendition(name, "whatsapp"), name)
+        self.assertEqual(self.storage.save_renditions(name), [])
+
+    @override_settings(CSA_IMAGE_RENDITIONS=False)
+    def test_missing_renditions_can_be_written_later(self):
+        name = self.storage.save("property_images/house.png", ContentFile(image_bytes()))
+        self.assertEqual(self.storage.rendition(name, "whatsapp"), name)
+
+        written = self.storage.save_renditions(name)
+
+        self.assertEqual(written, [rendition_name(name, "whatsapp"), rendition_name(name, "web")])
+        self.assertEqual(self.storage.save_renditions(name), [])
+
+
+class MediaUrlTests(SimpleTestCase):
+
+    def test_rendition_name_outside_a_shard(self):
+        self.assertEqual(
+            rendition_name("property_images/default.jpg", "web"), "property_images/renditions/default-web.webp",
+        )
+
+    @override_settings(CSA_PUBLIC_BASE_URL="https://csa.example.com/", MEDIA_URL="/media/")
+    def test_public_url_needs_a_base_url(self):
+        self.assertEqual(public_media_url("property_images/a.jpg"), "https://csa.example.com/media/property_images/a.jpg")
+        self.assertIsNone(public_media_url(""))
+        with self.settings(CSA_PUBLIC_BASE_URL=""):
+            self.assertIsNone(public_media_url("property_images/a.jpg"))
+
+
+@override_settings(CSA_IMAGE_RENDITIONS=True)
+class DedupePropertyImagesTests(TestCase):
+
+    def setUp(self):
+        media = temporary_media(self)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Old uploads written before the content-addressed store existed
+        self.content = image_bytes(size=(400, 300), image_format="JPEG")
+        os.makedirs(os.path.join(media, "property_images"))
+        for name in ("property_images/a.jpg", "property_images/a_XiIqqoA.jpg"):
+            with open(os.path.join(media, name), "wb") as f:
+                f.write(self.content)
+
+    def test_duplicates_collapse_and_rows_are_repointed(self):
+        first = create_property(image="property_images/a.jpg")
+        second = create_property(image="property_images/a_XiIqqoA.jpg")
+        gone = create_property(image="property_images/gone.jpg")
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command("dedupe_property_images", "--delete-originals", stdout=stdout, stderr=stderr)
+
+        digest = file_digest(ContentFile(self.content))
+        stored = f"property_images/{digest[:2]}/{digest}.jpg"
+        self.assertEqual(set(Property.objects.filter(pk__in=[first.pk, second.pk]).values_list("image", flat=True)), {stored})
+        self.assertEqual(Property.objects.get(pk=gone.pk).image.name, "property_images/gone.jpg")
+        self.assertFalse(default_storage.exists("property_images/a.jpg"))
+        self.assertFalse(default_storage.exists("property_images/a_XiIqqoA.jpg"))
+        self.assertEqual(image_rendition(stored), rendition_name(stored, "whatsapp"))
+        self.assertIn("2 file(s) moved into 1 stored image(s), 1 missing", stdout.getvalue())
+        self.assertIn("gone.jpg is missing", stderr.getvalue())
+
+    def test_dry_run_changes_nothing(self):
+        prop = create_property(image="property_images/a.jpg")
+
+        call_command("dedupe_property_images", "--dry-run", stdout=io.StringIO(), stderr=io.StringIO())
+
+        self.assertEqual(Property.objects.get(pk=prop.pk).image.name, "property_images/a.jpg")
+        self.assertTrue(default_storage.exists("property_images/a.jpg"))
@@ -0,0 +1,129 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from CSA_app.dedup import _seen_messages
+from CSA_app.webhook_parser import (
+    InboundMessage, StatusUpdate, group_by_sender, iter_webhook_events, merge_payloads, split_by_sender,
+)
+from CSA_app.whatsapp_handler import process_webhook_payload
+
+from .helpers import webhook_payload
+
+
+def combined(*payloads):
+    """One delivery carrying the entries of several payloads, as WhatsApp batches them."""
+    return {"object": "whatsapp_business_account", "entry": [entry for payload in payloads for entry in payload["entry"]]}
+
+
+def inbound(sender, message_id, timestamp, text=None, **message):
+    message = {"from": sender, "id": message_id, "timestamp": str(timestamp), **message}
+    if text is not None:
+        message["text"] = {"body": text}
+    return InboundMessage(sender, text, message, None)
+
+
+class IterWebhookEventsTests(SimpleTestCase):
+
+    def test_every_entry_change_and_message_is_read(self):
+        status = {"id": "wamid.out-1", "recipient_id": "2348010000001", "status": "read"}
+        payload = combined(
+            webhook_payload("2348010000001", "Hi", "Any 3 bed in Lekki?"),
+            webhook_payload("2348010000002", "Hello", statuses=[status]),
+        )
+
+        events = list(iter_webhook_events(payload))
+
+        self.assertEqual(
+            [(event.sender, event.text) for event in events if isinstance(event, InboundMessage)],
+            [("2348010000001", "Hi"), ("2348010000001", "Any 3 bed in Lekki?"), ("2348010000002", "Hello")],
+        )
+        self.assertEqual(events[-1], StatusUpdate("wamid.out-1", "2348010000001", "read", []))
+        self.assertEqual(events[0].contact["wa_id"], "2348010000001")
+
+    def test_malformed_parts_are_skipped(self):
+        payload = {"entry": [{"changes": [{"value": {"messages": [{"id": "wamid.x", "text": {"body": "no sender"}}]}}]},
+                             {"changes": None}, {}]}
+
+        self.assertEqual(list(iter_webhook_events(payload)), [])
+        self.assertEqual(list(iter_webhook_events({})), [])
+
+
+class GroupBySenderTests(SimpleTestCase):
+
+    def test_messages_are_grouped_per_sender_in_timestamp_order(self):
+        turns = group_by_sender([
+            inbound("a", "wamid.2", 20, "in Ikeja, 40m"),
+            inbound("b", "wamid.3", 15, "Hello"),
+            inbound("a", "wamid.1", 10, "looking for 3 bed"),
+        ])
+
+        self.assertEqual([turn.sender for turn in turns], ["a", "b"])
+        self.assertEqual(turns[0].text, "looking for 3 bed\nin Ikeja, 40m")
+        self.assertEqual(turns[0].message_ids, ["wamid.1", "wamid.2"])
+
+    def test_turn_hands_the_first_image_to_the_handlers(self):
+        photo = inbound("a", "wamid.2", 20, image={"id": "media-1"})
+        turn, = group_by_sender([inbound("a", "wamid.1", 10, "is this available?"), photo, inbound("a", "wamid.3", 30, "?")])
+
+        self.assertIs(turn.full_message, photo.message)
+        self.assertEqual(turn.text, "is this available?\n?")
+
+
+class SplitBySenderTests(SimpleTestCase):
+
+    def test_each_customer_gets_a_part_with_only_their_messages(self):
+        status = {"id": "wamid.out-1", "status": "delivered", "recipient_id": "2348010000001"}
+        first = webhook_payload("2348010000001", "Hi", "Any 3 bed?")
+        payload = combined(first, webhook_payload("2348010000002", "Hello", statuses=[status]))
+
+        parts = dict(split_by_sender(payload))
+
+        self.assertEqual(list(parts), ["2348010000001", "2348010000002", ""])
+        self.assertEqual(parts["2348010000001"], first)
+        value = parts["2348010000002"]["entry"][0]["changes"][0]["value"]
+        self.assertEqual([contact["wa_id"] for contact in value["contacts"]], ["2348010000002"])
+        self.assertEqual([message["text"]["body"] for message in value["messages"]], ["Hello"])
+        self.assertNotIn("statuses", value)
+        self.assertEqual(parts[""]["entry"][0]["changes"][0]["value"]["statuses"], [status])
+
+    def test_a_payload_without_messages_stays_whole(self):
+        payload = {"object": "whatsapp_business_account", "entry": []}
+
+        self.assertEqual(split_by_sender(payload), [("", payload)])
+
+    def test_merged_parts_read_as_one_turn_in_order(self):
+        payloads = [webhook_payload("2348010000001", text) for text in ("looking for 3 bed", "in Ikeja", "40m")]
+
+        merged = merge_payloads(payloads)
+
+        self.assertEqual(merged["object"], "whatsapp_business_account")
+        turn, = group_by_sender(list(event for event in iter_webhook_events(merged) if isinstance(event, InboundMessage)))
+        self.assertEqual(turn.text, "looking for 3 bed\nin Ikeja\n40m")
+
+
+class ProcessWebhookPayloadTests(TestCase):
+
+    def setUp(self):
+        _seen_messages.clear()
+        self.addCleanup(_seen_messages.clear)
+
+    def test_each_sender_in_a_batch_gets_one_turn(self):
+        payload = combined(
+            webhook_payload("2348010000001", "Hi", "Any 3 bed in Lekki?"),
+            webhook_payload("2348010000002", "Hello"),
+        )
+        with mock.patch("CSA_app.whatsapp_handler.process_whatsapp_message") as process:
+            process_webhook_payload(payload)
+
+        self.assertEqual([call.args[:2] for call in process.call_args_list], [
+            ("2348010000001", "Hi\nAny 3 bed in Lekki?"), ("2348010000002", "Hello"),
+        ])
+
+    def test_one_failing_sender_does_not_stop_the_others(self):
+        payload = combined(webhook_payload("2348010000001", "Hi"), webhook_payload("2348010000002", "Hello"))
+        with mock.patch("CSA_app.whatsapp_handler.process_whatsapp_message", side_effect=[RuntimeError, None]) as process:
+            with self.assertRaisesMessage(RuntimeError, "2348010000001"):
+                process_webhook_payload(payload)
+
+        self.assertEqual(process.call_count, 2)
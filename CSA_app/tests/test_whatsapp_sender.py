@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from CSA_app.stubs import StubGraphServer
+from CSA_app.whatsapp_sender import WhatsAppClient, build_message_payload
+
+
+def response(status_code, headers=None):
+    return mock.Mock(status_code=status_code, headers=headers or {}, text="")
+
+
+class BuildPayloadTests(SimpleTestCase):
+
+    def test_text_message(self):
+        self.assertEqual(build_message_payload("+2348031234567", "Hello"), {
+            "messaging_product": "whatsapp", "to": "2348031234567", "recipient_type": "individual",
+            "type": "text", "text": {"body": "Hello"},
+        })
+
+    def test_image_message_carries_the_text_as_caption(self):
+        payload = build_message_payload("2348031234567", "3 bed in Lekki", media_url="https://example.com/a.jpg")
+
+        self.assertEqual(payload["type"], "image")
+        self.assertEqual(payload["image"], {"link": "https://example.com/a.jpg", "caption": "3 bed in Lekki"})
+
+
+class WhatsAppClientTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = StubGraphServer().start()
+        cls.addClassCleanup(cls.stub.stop)
+
+    def setUp(self):
+        self.stub.sent.clear()
+        self.client = WhatsAppClient(access_token="token", phone_number_id="123", api_url=self.stub.url, max_retries=2)
+        self.addCleanup(self.client.close)
+
+    def test_messages_are_posted_to_the_graph_api(self):
+        self.assertTrue(self.client.send_message("+2348031234567", "Hello"))
+        self.assertTrue(self.client.send_message("+2348031234567", "Again"))
+
+        self.assertEqual([payload["text"]["body"] for payload in self.stub.sent], ["Hello", "Again"])
+        self.assertEqual(self.client.session.headers["Authorization"], "Bearer token")
+
+    def test_send_many_keeps_the_order_and_the_concurrency_cap(self):
+        client = WhatsAppClient(access_token="token", phone_number_id="123", api_url=self.stub.url, max_concurrency=2)
+        self.addCleanup(client.close)
+        in_flight, peak, lock = [0], [0], threading.Lock()
+        post = client.session.post
+
+        def counting_post(*args, **kwargs):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.02)
+            try:
+                return post(*args, **kwargs)
+            finally:
+                with lock:
+                    in_flight[0] -= 1
+
+        messages = [{"recipient_phone": f"23480312345{n:02d}", "message_text": f"Hi {n}"} for n in range(6)]
+        with mock.patch.object(client.session, "post", side_effect=counting_post):
+            self.assertEqual(client.send_many(messages), [True] * 6)
+
+        self.assertLessEqual(peak[0], 2)
+        self.assertEqual(sorted(payload["text"]["body"] for payload in self.stub.sent), [f"Hi {n}" for n in range(6)])
+
+    def test_rate_limited_recipient_is_retried_after_retry_after(self):
+        responses = [response(429, {"Retry-After": "0.05"}), response(200)]
+        with mock.patch.object(self.client.session, "post", side_effect=responses) as post:
+            start = time.monotonic()
+            self.assertTrue(self.client.send_message("2348031234567", "Hello"))
+
+        self.assertEqual(post.call_count, 2)
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+    @override_settings(WHATSAPP_RETRY_AFTER_MAX=1)
+    def test_long_retry_after_gives_up_without_waiting(self):
+        with mock.patch.object(self.client.session, "post", return_value=response(429, {"Retry-After": "3600"})) as post:
+            self.assertFalse(self.client.send_message("2348031234567", "Hello"))
+            # The recipient stays blocked, nothing is sent to them
+            self.assertFalse(self.client.send_message("2348031234567", "Again"))
+
+        self.assertEqual(post.call_count, 1)
+
+    def test_errors_are_reported_as_not_sent(self):
+        self.assertFalse(self.client.post({"to": "2348031234567", "bad": object()}))
+
+    def test_async_send(self):
+        async def scenario():
+            try:
+                return await self.client.asend_many([
+                    {"recipient_phone": "2348031234567", "message_text": "Hi"},
+                    {"recipient_phone": "2348031234568", "message_text": "Hello"},
+                ])
+            finally:
+                await self.client.aclose()
+
+        self.assertEqual(asyncio.run(scenario()), [True, True])
+        self.assertEqual(len(self.stub.sent), 2)
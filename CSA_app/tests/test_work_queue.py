@@ -0,0 +1,288 @@
+import asyncio
+import json
+import os
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from CSA_app.interaction_log import interaction_log
+from CSA_app.models import Customer, DeadLetterJob, Interaction, WebhookJob
+from CSA_app.work_queue import AsyncioQueueBackend, DatabaseQueueBackend, Worker, lifespan, retry_delay
+
+from .helpers import isolate_spools, webhook_payload
+
+
+@override_settings(CSA_COALESCE_WINDOW=0, CSA_QUEUE_MAX_ATTEMPTS=3, CSA_QUEUE_VISIBILITY_TIMEOUT=60)
+class DatabaseQueueBackendTests(TestCase):
+
+    def setUp(self):
+        self.backend = DatabaseQueueBackend()
+
+    def test_claim_leases_the_job(self):
+        job = self.backend.enqueue(webhook_payload("2348010000001", "Hi"))
+
+        claimed = self.backend.claim(limit=5)
+
+        self.assertEqual([j.pk for j in claimed], [job.pk])
+        self.assertEqual(claimed[0].status, WebhookJob.STATUS_RUNNING)
+        self.assertEqual(claimed[0].attempts, 1)
+        self.assertEqual(self.backend.claim(limit=5), [])
+
+    def test_expired_lease_is_claimed_again(self):
+        job = self.backend.enqueue(webhook_payload("2348010000001", "Hi"))
+        self.backend.claim()
+        WebhookJob.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=61))
+
+        claimed = self.backend.claim()
+
+        self.assertEqual([j.pk for j in claimed], [job.pk])
+        self.assertEqual(claimed[0].attempts, 2)
+
+    def test_failed_job_waits_for_its_backoff(self):
+        self.backend.enqueue(webhook_payload("2348010000001", "Hi"))
+        job = self.backend.claim()[0]
+
+        self.backend.fail(job, "boom")
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, WebhookJob.STATUS_PENDING)
+        self.assertEqual(job.last_error, "boom")
+        self.assertGreater(job.available_at, timezone.now() + timedelta(seconds=retry_delay(1) - 1))
+        self.assertEqual(self.backend.claim(), [])
+
+    def test_job_is_dead_lettered_after_max_attempts_and_can_be_requeued(self):
+        self.backend.enqueue(webhook_payload("2348010000001", "Hi"))
+        for _ in range(3):
+            WebhookJob.objects.update(available_at=timezone.now())
+            self.backend.fail(self.backend.claim()[0], "boom")
+
+        self.assertFalse(WebhookJob.objects.exists())
+        dead = DeadLetterJob.objects.get()
+        self.assertEqual(dead.attempts, 3)
+
+        self.assertEqual(self.backend.requeue_dead_letters(), 1)
+        self.assertEqual(WebhookJob.objects.get().sender, "2348010000001")
+        self.assertFalse(DeadLetterJob.objects.exists())
+
+    def test_retry_delay_doubles_up_to_the_maximum(self):
+        with override_settings(CSA_QUEUE_RETRY_BACKOFF=2.0, CSA_QUEUE_RETRY_BACKOFF_MAX=10.0):
+            self.assertEqual([retry_delay(n) for n in (1, 2, 3, 4)], [2.0, 4.0, 8.0, 10.0])
+
+
+def texts(payload):
+    return [
+        message["text"]["body"]
+        for entry in payload["entry"] for change in entry["changes"] for message in change["value"].get("messages", [])
+    ]
+
+
+@override_settings(CSA_COALESCE_WINDOW=2, CSA_COALESCE_MAX_WAIT=6, CSA_QUEUE_MAX_ATTEMPTS=3)
+class CoalescingTests(TestCase):
+
+    def setUp(self):
+        self.backend = DatabaseQueueBackend()
+
+    def release(self):
+        WebhookJob.objects.update(available_at=timezone.now())
+
+    def test_a_batch_is_queued_as_one_job_per_customer(self):
+        payload = webhook_payload("2348010000001", "Hi")
+        payload["entry"] += webhook_payload("2348010000002", "Hello")["entry"]
+
+        self.backend.enqueue(payload)
+
+        self.assertEqual(sorted(WebhookJob.objects.values_list("sender", flat=True)), ["2348010000001", "2348010000002"])
+
+    def test_a_new_message_holds_the_waiting_turn_back(self):
+        first = self.backend.enqueue(webhook_payload("2348010000001", "Hi"))
+        WebhookJob.objects.filter(pk=first.pk).update(available_at=timezone.now())
+
+        second = self.backend.enqueue(webhook_payload("2348010000001", "Any 3 bed?"))
+
+        first.refresh_from_db()
+        self.assertEqual(first.available_at, second.available_at)
+        self.assertEqual(self.backend.claim(limit=5), [])
+
+    def test_the_hold_stops_after_the_maximum_wait(self):
+        first = self.backend.enqueue(webhook_payload("2348010000001", "Hi"))
+        WebhookJob.objects.filter(pk=first.pk).update(
+            available_at=timezone.now(), created_at=timezone.now() - timedelta(seconds=7),
+        )
+
+        self.backend.enqueue(webhook_payload("2348010000001", "Any 3 bed?"))
+
+        self.assertEqual([job.pk for job in self.backend.claim(limit=5)], [first.pk])
+
+    def test_the_oldest_job_takes_the_later_ones_along(self):
+        first = self.backend.enqueue(webhook_payload("2348010000001", "Hi"))
+        self.backend.enqueue(webhook_payload("2348010000001", "Any 3 bed?"))
+        other = self.backend.enqueue(webhook_payload("2348010000002", "Hello"))
+        self.release()
+
+        claimed = self.backend.claim(limit=5)
+
+        self.assertEqual([job.pk for job in claimed], [first.pk, other.pk])
+        self.assertEqual(texts(claimed[0].payload), ["Hi", "Any 3 bed?"])
+        self.assertEqual(self.backend.claim(limit=5), [])
+        self.backend.complete(claimed[0])
+        self.assertEqual(list(WebhookJob.objects.values_list("pk", flat=True)), [other.pk])
+
+    def test_a_failed_batch_is_retried_as_one_merged_job(self):
+        first = self.backend.enqueue(webhook_payload("2348010000001", "Hi"))
+        self.backend.enqueue(webhook_payload("2348010000001", "Any 3 bed?"))
+        self.release()
+
+        self.backend.fail(self.backend.claim()[0], "boom")
+
+        job = WebhookJob.objects.get()
+        self.assertEqual(job.pk, first.pk)
+        self.assertEqual(texts(job.payload), ["Hi", "Any 3 bed?"])
+
+    def test_a_turn_waits_for_the_customers_earlier_job(self):
+        first = self.backend.enqueue(webhook_payload("2348010000001", "Hi"))
+        self.release()
+        self.backend.claim()
+        second = self.backend.enqueue(webhook_payload("2348010000001", "Any 3 bed?"))
+        self.release()
+
+        self.assertEqual(self.backend.claim(limit=5), [])
+        self.backend.complete(WebhookJob.objects.get(pk=first.pk))
+        self.assertEqual([job.pk for job in self.backend.claim(limit=5)], [second.pk])
+
+
+@override_settings(CSA_COALESCE_WINDOW=0)
+class WorkerTests(TransactionTestCase):
+    # Jobs run on the worker's threads, which have their own connections
+
+    def setUp(self):
+        isolate_spools(self)
+
+    def test_run_once_completes_and_fails_jobs(self):
+        backend = DatabaseQueueBackend()
+        ok = backend.enqueue(webhook_payload("2348010000001", "Hi"))
+        bad = backend.enqueue(webhook_payload("2348010000002", "Hi"))
+
+        def process(payload, job_id=None):
+            if payload == bad.payload:
+                raise RuntimeError("boom")
+
+        with mock.patch("CSA_app.work_queue.process_job_payload", side_effect=process):
+            Worker(backend=backend, concurrency=2, poll_interval=0.01).run(once=True)
+
+        self.assertFalse(WebhookJob.objects.filter(pk=ok.pk).exists())
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.last_error), (WebhookJob.STATUS_PENDING, "boom"))
+
+
+class AsyncioQueueBackendTests(TransactionTestCase):
+    # sync_to_async runs the database calls on another thread
+
+    def setUp(self):
+        self.spool_dir = isolate_spools(self)
+        patcher = mock.patch.object(interaction_log, "flush_interval", 0.05)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.backend = AsyncioQueueBackend()
+        self.customer = Customer.objects.create(name="Ada", phone_number="+2348031234567")
+
+    def write_dead_spool(self, note):
+        # Above the largest pid Linux hands out, so never a running process
+        path = os.path.join(self.spool_dir, "interactions-4194305-1.jsonl")
+        row = {
+            "log_id": uuid.uuid4().hex, "customer_id": self.customer.pk, "property_id": None,
+            "Interaction_type": "inquiry", "notes": note, "timestamp": timezone.now().isoformat(),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(row) + "\n")
+
+    def notes(self):
+        return sorted(Interaction.objects.values_list("notes", flat=True))
+
+    def test_start_replays_spools_and_flushes_on_a_timer(self):
+        self.write_dead_spool("from the last run")
+
+        async def scenario():
+            await self.backend.astart()
+            await sync_to_async(interaction_log.record)(self.customer, "inquiry", "buffered")
+            await asyncio.sleep(0.3)
+            notes = await sync_to_async(self.notes)()
+            await self.backend.astop()
+            return notes
+
+        self.assertEqual(asyncio.run(scenario()), ["buffered", "from the last run"])
+
+    def test_stop_flushes_the_buffer(self):
+        async def scenario():
+            await self.backend.astart()
+            task = self.backend._housekeeping_task
+            await sync_to_async(interaction_log.record)(self.customer, "inquiry", "buffered")
+            await self.backend.astop()
+            return task
+
+        with mock.patch.object(interaction_log, "flush_interval", 3600):
+            task = asyncio.run(scenario())
+
+        self.assertTrue(task.cancelled())
+        self.assertEqual(self.notes(), ["buffered"])
+
+    def test_first_webhook_starts_housekeeping_without_lifespan(self):
+        async def scenario():
+            with mock.patch("CSA_app.async_handler.aprocess_webhook_payload") as process:
+                await self.backend.aenqueue({"object": "whatsapp_business_account", "entry": []})
+                await asyncio.sleep(0.1)
+            started = self.backend._housekeeping_task is not None
+            await self.backend.astop()
+            return started, process.await_count
+
+        self.assertEqual(asyncio.run(scenario()), (True, 1))
+
+    @override_settings(CSA_COALESCE_WINDOW=0.1, CSA_COALESCE_MAX_WAIT=1)
+    def test_a_burst_runs_as_one_turn_and_turns_run_in_order(self):
+        turns, running, peak = [], [0], [0]
+
+        async def run(payload):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.2)
+            turns.append(texts(payload))
+            running[0] -= 1
+
+        async def scenario():
+            with mock.patch.object(self.backend, "run", side_effect=run):
+                for text in ("Hi", "Any 3 bed?", "in Lekki"):
+                    await self.backend.aenqueue(webhook_payload("2348031234567", text))
+                    await asyncio.sleep(0.02)
+                # Arrives while the first turn is running: the next turn, after it
+                await asyncio.sleep(0.2)
+                await self.backend.aenqueue(webhook_payload("2348031234567", "40m"))
+                await asyncio.wait(set(self.backend._tasks))
+            await self.backend.astop()
+
+        asyncio.run(scenario())
+
+        self.assertEqual(turns, [["Hi", "Any 3 bed?", "in Lekki"], ["40m"]])
+        self.assertEqual(peak[0], 1)
+
+    def test_lifespan_starts_and_stops_the_backend(self):
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        app = lifespan(mock.AsyncMock())
+        with mock.patch("CSA_app.work_queue.get_queue_backend", return_value=self.backend), \
+                mock.patch.object(self.backend, "astart") as astart, mock.patch.object(self.backend, "astop") as astop:
+            asyncio.run(app({"type": "lifespan"}, receive, send))
+
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        astart.assert_awaited_once()
+        astop.assert_awaited_once()
@@ -1,7 +1,7 @@
 # urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import whatsapp_webhook, PropertyListAPIView
+from .views import whatsapp_webhook, metrics_view, OutboxStatusAPIView, PropertyListAPIView
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -11,6 +11,8 @@ from django.conf.urls.static import static
 urlpatterns = [
     path('', whatsapp_webhook, name='whatsapp_webhook'),
     path('properties/', PropertyListAPIView.as_view(), name='property-list'),
+    path('outbox/status/', OutboxStatusAPIView.as_view(), name='outbox-status'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -1,9 +1,11 @@
 from django.shortcuts import render
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
+import hmac
 import json
 from django.conf import settings
-from .whatsapp_handler import process_whatsapp_message
+from .work_queue import aenqueue_webhook, aspool_webhook
+from . import metrics
 import logging
 from decouple import config, Csv
 
@@ -18,30 +20,30 @@ from django.views.decorators.csrf import csrf_exempt
 # Define the verify token for WhatsApp webhook verification
 verify = config("WHATSAPP_VERIFY_TOKEN")
 @csrf_exempt
-def whatsapp_webhook(request):
+async def whatsapp_webhook(request):
     if request.method == 'POST':
         try:
             # Load the incoming data from WhatsApp
             data = json.loads(request.body)
-            logging.info(f"(view)Received WhatsApp Data: {json.dumps(data, indent=2)}")
-
-            # Extract the message data
-            
-            if 'entry' in data and data['entry']:
-                changes = data['entry'][0].get('changes', [])
-                if changes and 'value' in changes[0] and 'messages' in changes[0]['value']:
-                    message = changes[0]['value']['messages'][0]
-                    sender = message['from']
-                    message_body = message['text']['body'] if 'text' in message else None
-                    
-                    # Process the message
-                    process_whatsapp_message(sender, message_body, message)
-            # Return a success response
-            return HttpResponse(status=200)
-            
+            logger.debug("(view)Received WhatsApp Data: %s", data)
+
+        except json.JSONDecodeError:
+            logger.error("(View.py)Received a WhatsApp webhook with an invalid JSON body")
+            return HttpResponse(status=400)
+
+        try:
+            # Hand the payload to the worker queue so WhatsApp gets its 200 right away
+            await aenqueue_webhook(data)
         except Exception as e:
-            logging.error(f"(View.py)Error processing WhatsApp message: {str(e)}")
-            return HttpResponse(status=500)
+            # Never answer 500: WhatsApp retries and eventually disables the webhook.
+            # The worker queues spooled payloads once the queue is back.
+            logger.error("(View.py)Could not queue WhatsApp webhook, spooling it: %s", e)
+            try:
+                await aspool_webhook(data)
+            except Exception as e:
+                logger.critical("(View.py)Could not spool WhatsApp webhook either (%s); payload: %s", e, json.dumps(data))
+
+        return HttpResponse(status=200)
 
     elif request.method == 'GET':
         # Handle WhatsApp webhook verification
@@ -49,31 +51,143 @@ def whatsapp_webhook(request):
         token = request.GET.get('hub.verify_token')
         challenge = request.GET.get('hub.challenge')
 
-        logging.info(f"(view)Verification request received with mode: {mode}, token: {token}")
+        logger.info("(view)Verification request received with mode: %s", mode)
 
         # Check if the mode and token match
         if mode == 'subscribe' and token == verify:
-            logging.info("Webhook verified successfully")
+            logger.info("Webhook verified successfully")
             return HttpResponse(challenge, status=200)
         else:
-            logging.error(f"(view)Verification failed. Invalid token: {token}")
+            logger.error("(view)Verification failed. Invalid token")
             return HttpResponse(status=403)
 
 
+def metrics_view(request):
+    """Prometheus scrape endpoint for this process.
+
+    The webhook host is public, so the endpoint only exists once
+    ``CSA_METRICS_TOKEN`` is set, and scrapers must send it.
+    """
+    token = settings.CSA_METRICS_TOKEN
+    if not token:
+        return HttpResponse(status=404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticatedOrReadOnly
 from rest_framework import status
-from .models import Property
-from .serializers import PropertySerializer
+import hashlib
+from decimal import Decimal, InvalidOperation
+from django.core.cache import cache
+from django.db.models import Value
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from .models import CatalogVersion, OutboxMessage, Property, normalize_location
+from .outbox import outbox_status
+from .pagination import PropertyCursorPagination
+from .serializers import PropertySerializer, PropertyListSerializer
+
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+def filter_properties(queryset, params):
+    """Apply the list filters from the query string. Raises ValueError for malformed values."""
+    try:
+        if params.get('min_price'):
+            queryset = queryset.filter(price__gte=Decimal(params['min_price']))
+        if params.get('max_price'):
+            queryset = queryset.filter(price__lte=Decimal(params['max_price']))
+    except InvalidOperation:
+        raise ValueError("min_price and max_price must be numbers")
+
+    if params.get('bedrooms'):
+        if not params['bedrooms'].isdigit():
+            raise ValueError("bedrooms must be a whole number")
+        queryset = queryset.filter(bedrooms=int(params['bedrooms']))
+
+    if params.get('location'):
+        queryset = queryset.filter(location_normalized__contains=normalize_location(params['location']))
+
+    if params.get('available'):
+        # Value() keeps "is_available = 1" seekable in the SQLite index
+        queryset = queryset.filter(is_available=Value(params['available'].lower() in TRUE_VALUES))
+
+    return queryset
+
 
 class PropertyListAPIView(APIView):
+    """Public, paginated property list.
+
+    Filters: ``min_price``, ``max_price``, ``location``, ``bedrooms`` and
+    ``available``. ``fields`` picks the returned fields. Pages are cached and
+    carry an ETag and Last-Modified tied to the catalog version, so they are
+    invalidated whenever a property changes.
+    """
 
     permission_classes = [AllowAny]
+    pagination_class = PropertyCursorPagination
+
+    def get(self, request):
+        fields = [name for name in request.query_params.get('fields', '').split(',') if name]
+        unknown = set(fields) - set(PropertyListSerializer.Meta.fields)
+        if unknown:
+            return Response({"detail": f"Unknown fields: {', '.join(sorted(unknown))}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            properties = filter_properties(Property.objects.all(), request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        version, updated_at = CatalogVersion.objects.filter(pk=1).values_list('version', 'updated_at').first() or (0, None)
+        url = request.build_absolute_uri()
+        etag = quote_etag(hashlib.md5(f"{version}:{url}".encode()).hexdigest())
+        last_modified = int(updated_at.timestamp()) if updated_at else None
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        cache_key = f"csa:properties:{version}:{hashlib.md5(url.encode()).hexdigest()}"
+        data = cache.get(cache_key)
+        if data is None:
+            if fields:
+                # The cursor needs the ordering columns even when they are not returned
+                properties = properties.only(*{'id', 'created_at', *fields})
+            paginator = self.pagination_class()
+            page = paginator.paginate_queryset(properties, request, view=self)
+            serializer = PropertyListSerializer(page, many=True, fields=fields, context={'request': request})
+            data = paginator.get_paginated_response(serializer.data).data
+            cache.set(cache_key, data, settings.CSA_PROPERTY_API_CACHE_TTL)
+
+        response = Response(data, status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, public=True, max_age=settings.CSA_PROPERTY_API_MAX_AGE)
+        return response
+
+
+class OutboxStatusAPIView(APIView):
+    """Delivery status of the Make.com outbox, for staff."""
+
+    permission_classes = [IsAdminUser]
 
     def get(self, request):
-        properties = Property.objects.all().order_by('-created_at')
-        serializer = PropertySerializer(properties, many=True)
-        logging.info(f"(view)Property data: {serializer.data}")
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        oldest_pending = (
+            OutboxMessage.objects.filter(status=OutboxMessage.STATUS_PENDING)
+            .order_by('created_at').values_list('created_at', flat=True).first()
+        )
+        recent_failures = (
+            OutboxMessage.objects.filter(status=OutboxMessage.STATUS_FAILED)
+            .order_by('-id').values('id', 'property_id', 'attempts', 'last_error')[:20]
+        )
+        return Response({
+            "counts": outbox_status(),
+            "oldest_pending": oldest_pending,
+            "recent_failures": list(recent_failures),
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,115 @@
+from collections import namedtuple
+
+
+InboundMessage = namedtuple('InboundMessage', ['sender', 'text', 'message', 'contact'])
+StatusUpdate = namedtuple('StatusUpdate', ['message_id', 'recipient', 'status', 'errors'])
+
+
+def message_text(message):
+    """Return the text body of a WhatsApp message, or None for media-only messages."""
+    if 'text' in message:
+        return message['text'].get('body')
+    return None
+
+
+def iter_webhook_events(data):
+    """Walk every entry and change of a webhook payload in one pass.
+
+    Yields an ``InboundMessage`` for each customer message and a ``StatusUpdate``
+    for each delivery/read receipt, in the order WhatsApp delivered them.
+    """
+    for entry in data.get('entry') or []:
+        for change in entry.get('changes') or []:
+            value = change.get('value') or {}
+            contacts = {contact.get('wa_id'): contact for contact in value.get('contacts') or []}
+
+            for message in value.get('messages') or []:
+                sender = message.get('from')
+                if not sender:
+                    continue
+                yield InboundMessage(sender, message_text(message), message, contacts.get(sender))
+
+            for status in value.get('statuses') or []:
+                yield StatusUpdate(
+                    status.get('id'),
+                    status.get('recipient_id'),
+                    status.get('status'),
+                    status.get('errors') or [],
+                )
+
+
+class SenderTurn:
+    """All messages one customer sent in a single webhook delivery."""
+
+    def __init__(self, sender):
+        self.sender = sender
+        self.messages = []
+
+    def add(self, inbound):
+        self.messages.append(inbound)
+
+    @property
+    def message_ids(self):
+        return [inbound.message.get('id') for inbound in self.messages if inbound.message.get('id')]
+
+    @property
+    def text(self):
+        """The text of every message joined in order, so the turn needs one model call."""
+        texts = [inbound.text for inbound in self.messages if inbound.text]
+        return "\n".join(texts) if texts else None
+
+    @property
+    def full_message(self):
+        """The raw message handed to the handlers: the first image if any, else the latest message."""
+        for inbound in self.messages:
+            if 'image' in inbound.message:
+                return inbound.message
+        return self.messages[-1].message
+
+
+def group_by_sender(messages):
+    """Group inbound messages into one ``SenderTurn`` per customer.
+
+    Turns keep the order in which senders first appear, and messages inside a
+    turn are ordered by their WhatsApp timestamp.
+    """
+    turns = {}
+    for inbound in messages:
+        turns.setdefault(inbound.sender, SenderTurn(inbound.sender)).add(inbound)
+
+    for turn in turns.values():
+        turn.messages.sort(key=lambda inbound: int(inbound.message.get('timestamp') or 0))
+
+    return list(turns.values())
+
+
+def split_by_sender(data):
+    """Split a webhook payload into ``(sender, payload)`` pairs, one per customer.
+
+    Each part keeps the payload's entry and change structure with only that
+    customer's messages and contact. Status updates go into a part whose
+    sender is ``""``.
+    """
+    parts = {}
+    for entry in data.get('entry') or []:
+        for change in entry.get('changes') or []:
+            value = change.get('value') or {}
+            base = {key: item for key, item in value.items() if key not in ('contacts', 'messages', 'statuses')}
+            values = {}
+            for message in value.get('messages') or []:
+                sender = message.get('from')
+                if sender:
+                    values.setdefault(sender, {**base, 'contacts': [
+                        contact for contact in value.get('contacts') or [] if contact.get('wa_id') == sender
+                    ], 'messages': []})['messages'].append(message)
+            if value.get('statuses'):
+                values[''] = {**base, 'statuses': value['statuses']}
+
+            for sender, part_value in values.items():
+                part = parts.setdefault(sender, {**data, 'entry': []})
+                part['entry'].append({**entry, 'changes': [{**change, 'value': part_value}]})
+    return list(parts.items()) or [('', data)]
+
+def merge_payloads(payloads):
+    """One payload holding the entries of all of ``payloads``, in order."""
+    return {**payloads[0], 'entry': [entry for payload in payloads for entry in payload.get('entry') or []]}
@@ -1,213 +1,289 @@
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.schema.runnable import RunnableSequence
-from langchain_google_genai import ChatGoogleGenerativeAI  # Gemini Studio
 from django.conf import settings
 import os
 from .models import Customer, Property, Interaction
 from .whatsapp_sender import send_whatsapp_message
+from .intent_classifier import fast_path_classify, classifier_stats
+from .dedup import claim_message, release_message
+from .llm_registry import get_chain
+from .catalog import find_property
+from .customers import get_customer
+from .interaction_log import log_interaction
+from . import conversation, metrics
+from .log import correlation
+from .media import match_inbound_image
+from .storage import image_rendition, public_media_url
+from .recommendations import recommend_properties
+from .resilience import ModelUnavailable, local_analysis, local_sentiment
+from .schemas import MessageAnalysis, parse_amount, parse_property_details
+from .webhook_parser import iter_webhook_events, group_by_sender, StatusUpdate
 import json
 import re
+import time
 import logging
 from decimal import Decimal
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='app.log',  # Log messages will be saved to 'app.log'
-    filemode='a'  # Append to the log file instead of overwriting
-)
+from pydantic import ValidationError
 
 logger = logging.getLogger(__name__)
 
-# Set Google credentials
-api_key = settings.GEMINI_API_KEY
-# Initialize Gemini Studio LLM
-llm = ChatGoogleGenerativeAI(api_key=api_key, model="gemini-2.0-flash")
 
-def create_chain(prompt_template):
-    return prompt_template | llm
+def process_webhook_payload(data, job_id=None):
+    """Process every message and status update contained in a webhook payload.
 
-# Define the chat prompts
-intent_classification_prompt = ChatPromptTemplate.from_template(
-    """
-    Classify the intent of the following customer message related to real estate:
-    
-    Customer message: {message}
-    
-    Possible intents:
-    - property_inquiry (customer is asking about a specific property)
-    - property_recommendation (customer is looking for property recommendations)
-    - budget_sharing (customer is sharing their budget)
-    - post_inspection_feedback (customer is providing feedback after an inspection)
-    - payment_method (customer is asking about or sharing payment preferences)
-    - general_query (any other general questions)
-    
-    Return only the intent name without any explanation.
-    Pls stick to the instructions above strictly
+    Messages are grouped per sender so a customer who sent several messages in
+    one delivery gets a single turn (one model call, one reply). Messages that
+    were already handled are dropped before any model or outbound call, unless
+    the queue job ``job_id`` claimed them itself on an earlier attempt.
     """
-)
+    messages = []
+    for event in iter_webhook_events(data):
+        if isinstance(event, StatusUpdate):
+            handle_status_update(event)
+        elif claim_message(event.message.get('id'), job_id):
+            messages.append(event)
+        else:
+            logger.info("Skipping redelivered message %s from %s", event.message.get('id'), event.sender)
 
-property_inquiry_prompt = ChatPromptTemplate.from_template(
-    """
-    Extract property details from the customer's message:
-    
-    Customer message: {message}
-    
-    Extract the following information if available:
-    - Property identifier
-    - name
-    - Location preferences
-    - Number of bedrooms
-    - Budget 
-    - Any other specific requirements
-     
-
-    Format the output as a valid JSON object **without any extra formatting like markdown or triple backticks**.
-
-    Example:
-
-    {{
-        "Property_identifier: "#47237"
-        "name": "bungalow",
-        "Location": "express road",
-        "Bedrooms": null **integer**,
-        "Budget": null **float**,
-        "Any_other_specific_requirements": null
-    }}
+    failed = []
+    for turn in group_by_sender(messages):
+        if len(turn.messages) > 1:
+            metrics.coalesced_messages.inc(len(turn.messages) - 1)
+        try:
+            with correlation(message_id=",".join(turn.message_ids), sender=turn.sender):
+                process_whatsapp_message(turn.sender, turn.text, turn.full_message)
+        except Exception as e:
+            logger.error("Error processing messages from %s: %s", turn.sender, e, exc_info=True)
+            metrics.turn_failures.inc()
+            for message_id in turn.message_ids:
+                release_message(message_id)
+            failed.append(turn.sender)
+
+    if failed:
+        # Fail the job so the queue retries it.
+        raise RuntimeError(f"Processing failed for {len(failed)} sender(s): {', '.join(failed)}")
+
+
+def reply_media_url(intent, state):
+    """Photo to send with the reply: the listing the customer asked about, when it is available."""
+    if not settings.CSA_PUBLIC_BASE_URL or intent != "property_inquiry":
+        return None
+    if state.stage != conversation.STAGE_VIEWING or state.pending_question:
+        return None
+    image = Property.objects.filter(pk=state.property_id).values_list('image', flat=True).first()
+    return public_media_url(image_rendition(image))
+
+
+def handle_status_update(status):
+    if status.status == "failed":
+        logger.warning("WhatsApp could not deliver message %s to %s: %s", status.message_id, status.recipient, status.errors)
+    else:
+        logger.info("Message %s to %s is %s", status.message_id, status.recipient, status.status)
 
-    """
-)
 
-post_inspection_prompt = ChatPromptTemplate.from_template(
-    """
-    Determine if the customer's feedback after inspection is positive or negative:
-    
-    Customer message: {message}
-    
-    Return only "positive" or "negative" without any explanation.
+def process_whatsapp_message(sender_phone, message_text, full_message):
+    start = time.perf_counter()
+    with metrics.span("customer_lookup"):
+        customer = get_customer(sender_phone)
+
+    with metrics.span("conversation_state"):
+        state = conversation.get_state(customer)
+
+    intent = conversation_intent(state, message_text, full_message)
+    analysis = None
+    if intent is None:
+        with metrics.span("classify"):
+            intent, analysis = classify_intent(message_text)
+
+    image_identifier = None
+    if intent == "property_inquiry" and 'image' in full_message:
+        image_identifier = match_inbound_image(full_message['image'])
+
+    response = handle_turn(customer, intent, message_text, full_message, analysis, state, image_identifier=image_identifier)
+    media_url = reply_media_url(intent, state)
+    with metrics.span("send"):
+        send_whatsapp_message(customer.phone_number, response, media_url=media_url)
+
+    metrics.turns.inc(intent=intent)
+    metrics.turn_seconds.observe(time.perf_counter() - start, intent=intent)
+
+
+def conversation_intent(state, message_text, full_message):
+    """The intent known without classifying the message, or None."""
+    if not message_text and 'image' in full_message:
+        return "property_inquiry"
+
+    expected = conversation.expected_intent(state, message_text)
+    if expected and state.pending_question != conversation.PENDING_BUDGET:
+        # A confident local classification beats the pending question; classify_intent picks it up
+        result = fast_path_classify(message_text)
+        if result and result.intent != expected:
+            return None
+    if expected:
+        # The customer answered the question we asked, no need to classify
+        classifier_stats.record("conversation", 0.0)
+        logger.info("intent: %s (expected after asking for %s)", expected, state.pending_question)
+    return expected
+
+
+def handle_turn(customer, intent, message_text, full_message, analysis, state, sentiment=None, image_identifier=None):
+    """Run the handler for ``intent``, save the conversation state and return the reply.
+
+    The async pipeline passes model results it already has (``analysis``,
+    ``sentiment``) so the handlers make no blocking Gemini calls.
+    ``image_identifier`` is the listing matched from the customer's photo.
     """
-)
+    has_image = 'image' in full_message
+
+    with metrics.span("handle"):
+        if intent == "property_inquiry":
+            response = handle_property_inquiry(
+                customer, message_text, has_image, full_message, analysis, state=state, image_identifier=image_identifier
+            )
+        elif intent == "budget_sharing":
+            response = handle_budget_sharing(customer, message_text, analysis, state=state)
+        elif intent == "post_inspection_feedback":
+            response = handle_post_inspection_feedback(customer, message_text, analysis, state=state, sentiment=sentiment)
+        elif intent == "payment_method":
+            response = handle_payment_method(customer, message_text, state=state)
+        else:
+            response = handle_general_query(customer, message_text, state=state)
+
+    with metrics.span("save_state"):
+        conversation.save_state(state)
+    return response
 
-# Create Chains
-intent_chain = intent_classification_prompt | llm
-property_inquiry_chain = property_inquiry_prompt | llm
-post_inspection_chain = post_inspection_prompt | llm
 
-def process_whatsapp_message(sender_phone, message_text, full_message):
-    customer, created = Customer.objects.get_or_create(phone_number=sender_phone)
 
-    # if created:
-    #     print(f"Customer with phone number {sender_phone} was created.")
-    # else:
-    #     print(f"Customer with phone number {sender_phone} already exists.")
 
-    has_image = 'image' in full_message
 
-    if not message_text and has_image:
-        intent = "property_inquiry"
-    else:
-        intent_result = None
-        try:
-            intent_result = intent_chain.invoke({"message": message_text})
-            # print(intent_result)  # Print the result for debugging
-        except Exception as e:
-            print(f"Error invoking chain: {e}")
         
-        intent = intent_result.content
-        logger.info(f"intent: {intent}")
-
-    if intent == "property_inquiry":
-        handle_property_inquiry(customer, message_text, has_image, full_message)
-    elif intent == "budget_sharing":
-        handle_budget_sharing(customer, message_text)
-    elif intent == "post_inspection_feedback":
-        handle_post_inspection_feedback(customer, message_text)
-    elif intent == "payment_method":
-        handle_payment_method(customer, message_text)
+
+
+def classify_intent(message_text):
+    """Pick the intent locally when the fast path is confident, otherwise ask Gemini.
+
+    Returns ``(intent, analysis)``. With ``CSA_COMBINED_ANALYSIS`` the model call
+    also extracts the entities and sentiment, and ``analysis`` carries them so the
+    handlers don't need a second call. It is None when only the intent is known.
+    When no model answers, the intent and entities come from local rules.
+    """
+    start = time.perf_counter()
+    analysis = None
+
+    result = fast_path_classify(message_text)
+    if result:
+        intent, source = result.intent, result.source
     else:
-        handle_general_query(customer, message_text)
+        if settings.CSA_COMBINED_ANALYSIS:
+            analysis = analyze_message(message_text)
 
+        if analysis:
+            intent, source = analysis.intent, "llm_combined"
+        else:
+            try:
+                intent_result = get_chain("intent").invoke({"message": message_text})
+                intent, source = intent_result.content.strip(), "llm"
+            except ModelUnavailable as e:
+                analysis = degraded_analysis(message_text, e)
+                intent, source = analysis.intent, "local"
 
+    elapsed = time.perf_counter() - start
+    classifier_stats.record(source, elapsed)
+    logger.info("intent: %s (via %s in %.1fms)", intent, source, elapsed * 1000)
+    return intent, analysis
 
 
+def degraded_analysis(message_text, error, step="classify"):
+    """Local-rules analysis for a turn no model could answer, so the customer still gets a reply."""
+    logger.warning("No model answered, using local rules to %s: %s", step, error)
+    metrics.llm_local_fallbacks.inc(step=step)
+    return local_analysis(message_text)
 
-        
 
+def degraded_sentiment(message_text, error):
+    logger.warning("No model answered, using local rules for the sentiment: %s", error)
+    metrics.llm_local_fallbacks.inc(step="sentiment")
+    return local_sentiment(message_text)
 
-def handle_property_inquiry(customer, message_text, has_image, full_message):
 
-    property_id = None
+def analyze_message(message_text):
+    """Run the combined structured-output chain. Returns None if the model output is unusable."""
+    try:
+        analysis = get_chain("message_analysis").invoke({"message": message_text})
+    except ModelUnavailable as e:
+        logger.warning("Combined message analysis unavailable: %s", e)
+        return None
+    except Exception as e:
+        logger.error("Combined message analysis failed, falling back to separate chains: %s", e)
+        return None
 
-    if has_image:
+    if not isinstance(analysis, MessageAnalysis):
+        logger.error("Combined message analysis returned no valid result: %r", analysis)
+        return None
 
-        # later i might use image recognition or metadata, but now i'll use property_id
+    return analysis
 
-        if message_text:
 
-            matches = re.findall(r"property\s+#?(\d+)", message_text, re.IGNORECASE)
-            if matches:
+def extract_property_details(message_text):
+    """Ask Gemini for the property details in a message, validated against ``PropertyDetails``."""
+    try:
+        inquiry_details = get_chain("property_inquiry").invoke({"message": message_text})
+    except ModelUnavailable as e:
+        return degraded_analysis(message_text, e, step="extract")
+    return parse_property_details(inquiry_details.content)
 
-                property_id = matches[0]
-                print(property_id)
 
-    if message_text:
+def handle_property_inquiry(customer, message_text, has_image, full_message, analysis=None, state=None, image_identifier=None):
 
-        inquiry_details = property_inquiry_chain.invoke({"message": message_text})
-        # print(inquiry_details)
-        try:
+    property_identifier = None
 
-            details_json = inquiry_details.content
+    if has_image:
 
-            details_json = details_json.strip('```json\n').strip('```')
+        # The listing whose photo the customer sent, else a "property #123" caption
 
-            logger.info(f"Successfully retrieved details_json: {details_json}")
+        property_identifier = image_identifier
 
-            
-            
-            details_json = json.loads(details_json)
+        if message_text and not property_identifier:
 
-            logger.info(f"Successfully retrieved property_details: {details_json}")
-            
-            
-            property_identifier = details_json.get("Property_identifier")
-            
-            logger.info(f"Successfully retrieved property_identifier: {property_identifier}")
-            
+            matches = re.findall(r"property\s+#?(\d+)", message_text, re.IGNORECASE)
+            if matches:
 
-            if "Budget" in details_json and details_json["Budget"]:
+                property_identifier = matches[0]
 
-                try:
-                    
-                    budget_value = float(re.sub(r'[^\d.]', '', str(details_json["Budget"])))
-                    
-                    
+    if message_text:
 
+        try:
 
-                    logger.info(f"Successfully retrieved budget_value: %s", budget_value)
+            details = analysis if analysis is not None else extract_property_details(message_text)
 
-                    budget_value = Decimal(budget_value)
-                    customer.budget = budget_value
+            logger.debug("Successfully retrieved property_details: %s", details)
 
-                except Exception as e:
+            if details.property_identifier:
+                property_identifier = details.property_identifier
 
-                    pass
+            logger.info("Successfully retrieved property_identifier: %s", property_identifier)
 
-            if "Location" in details_json or "Bedrooms" in details_json:
+            changed_fields = []
+            if details.budget:
 
-                preferences = customer.preferences or {}
+                logger.info("Successfully retrieved budget_value: %s", details.budget)
+                customer.budget = Decimal(str(details.budget))
+                changed_fields.append("budget")
 
-                if "Location" in details_json:
-                    preferences["Location"] = details_json["Location"]
+            if details.location or details.bedrooms is not None:
 
-                if "Bedrooms" in details_json:
-                    preferences["Bedrooms"] = details_json["Bedrooms"]
+                preferences = customer.preferences or {}
 
-                
-                # logger.info(f"Successfully retrieved preferences: {preferences}")
+                if details.location:
+                    preferences["Location"] = details.location
+
+                if details.bedrooms is not None:
+                    preferences["Bedrooms"] = details.bedrooms
 
                 customer.preferences = preferences
+                changed_fields.append("preferences")
 
-            customer.save()
+            if changed_fields:
+                customer.save(update_fields=changed_fields)
         except AttributeError as e:
     # Handles case where `inquiry_details.content` doesn't exist or isn't a valid attribute
             logger.error("Error: 'inquiry_details' object does not have a 'content' attribute.", exc_info=True)
@@ -216,46 +292,39 @@ def handle_property_inquiry(customer, message_text, has_image, full_message):
             # Handles case where JSON string is improperly formatted
             logger.error("Error: Unable to decode JSON. Please check the format of 'details_json'.", exc_info=True)
 
-        except TypeError as e:
-            # Handles case where `details_json` is not a string
-            logger.error("Error: 'details_json' is not a valid string.", exc_info=True)
+        except ValidationError as e:
+            # Handles case where the JSON doesn't match the expected fields
+            logger.error("Error: property details did not match the expected schema.", exc_info=True)
 
         except Exception as e:
             # Catch any other unexpected errors
-            logger.error(f"An unexpected error occurred: {e}", exc_info=True)
+            logger.error("An unexpected error occurred: %s", e, exc_info=True)
 
     
     property_obj = None
     if property_identifier:
-        try:
-            
-
-            property_obj = Property.objects.get(property_identifier=property_identifier)
-            logger.info(f"Property location is: {property_obj.location}")
-
-
-        except Exception as e:
-            pass
-            # logger.info(f"An error occured: {str(e)}")
-
-        # except Property.DoesNotExist:
-            
-        #     logger.error(f"An unexpected error occurred: Property object does not exist")
-    
+        # Older listings were saved with a leading '#', newer ones without it
+        property_obj = find_property(property_identifier)
+        if property_obj is None:
+            logger.info("No property with identifier %s", property_identifier)
+        else:
+            logger.info("Property location is: %s", property_obj.location)
 
-    Interaction.objects.create(
-        customer=customer,
-        property=property_obj,
-        Interaction_type="inquiry",
-        notes=message_text
+    log_interaction(
+        customer,
+        "inquiry",
+        notes=message_text,
+        property_id=property_obj.id if property_obj else None,
     )
 
-    # interactions = Interaction.objects.get(customer=customer)
-
-    # for interaction in interactions:
-
-    #     logger.info(f"Interaction note is: {interaction.notes}")
-
+    if state is not None:
+        asks_budget = not property_obj or not property_obj.is_available
+        conversation.advance(
+            state,
+            conversation.STAGE_VIEWING if property_obj else conversation.STAGE_INQUIRING,
+            property_id=property_obj.id if property_obj else None,
+            pending_question=conversation.PENDING_BUDGET if asks_budget else "",
+        )
 
     if property_obj:
         if property_obj.is_available:
@@ -282,49 +351,33 @@ def handle_property_inquiry(customer, message_text, has_image, full_message):
             "This will help us recommend suitable properties for you."
         )
 
-    send_whatsapp_message(customer.phone_number, response)
+    return response
 
-def handle_budget_sharing(customer, message_text):
+def handle_budget_sharing(customer, message_text, analysis=None, state=None):
     
-    budget_match = re.search(r'(\d[\d,.]*\s?[kKmM]?)', message_text)
-    logger.info(f"Budget is: {budget_match.group(1)}")
+    budget = analysis.budget if analysis is not None else None
 
-    if budget_match:
-        try:
-            budget = float(re.sub(r'[^\d.]', '', budget_match.group(1)))
-            logger.info(f"New Budget is: {budget}")
-
-            customer.budget = budget
-            customer.save()
-
-
-            lower_range = budget * 0.8
-            upper_range = budget * 1.2
-
-            logger.info(f"lower_range: {lower_range}")
-            logger.info(f"upper_range: {upper_range}")
+    if budget is None:
+        budget_match = re.search(r'(\d[\d,.]*\s?[kKmM]?)', message_text)
+        if budget_match:
+            logger.info("Budget is: %s", budget_match.group(1))
+            budget = parse_amount(budget_match.group(1))
 
-            properties_below = Property.objects.filter(
-                price__lt=budget,
-                price__gte=lower_range,
-                is_available=True
-            ).order_by('-price')[:3]
-
-            properties_above = Property.objects.filter(
-                price__gt=budget,
-                price__lte=upper_range,
-                is_available=True
-            ).order_by('price')[:3]
+    if budget:
+        try:
+            logger.info("New Budget is: %s", budget)
 
-            recommended_properties = list(properties_below) + list(properties_above)
+            customer.budget = Decimal(str(budget))
+            customer.save(update_fields=["budget"])
 
-            logger.info(f"recommended_properties: {recommended_properties}")
+            preferences = customer.preferences or {}
+            recommended_properties = recommend_properties(
+                budget,
+                location=preferences.get("Location"),
+                bedrooms=preferences.get("Bedrooms"),
+            )
 
-            # Interaction.objects.create(
-            # customer=customer,
-            # Interaction_type="budget_sharing",
-            # notes=message_text
-            #     )
+            logger.debug("recommended_properties: %s", recommended_properties)
 
             if recommended_properties:
                 response = "Based on your budget, here are some properties you might be interested in:\n\n"
@@ -357,35 +410,47 @@ def handle_budget_sharing(customer, message_text):
             "Thank you for your message. To help you find suitable properties, "
             "could you please share your budget in numerical format?"
         )
-    send_whatsapp_message(customer.phone_number, response)
-
-#     # if an error occur I might need to comment this out.
-    
 
-def handle_post_inspection_feedback(customer, message_text):
+    if state is not None:
+        if budget:
+            conversation.advance(state, conversation.STAGE_RECOMMENDED)
+        else:
+            state.pending_question = conversation.PENDING_BUDGET
 
-    sentiment = post_inspection_chain.invoke({"message": message_text})
+    return response
 
-    logger.info(f"sentiment: {sentiment}")
 
-    sentiment = sentiment.content.strip().lower()
+def handle_post_inspection_feedback(customer, message_text, analysis=None, state=None, sentiment=None):
 
-    logger.info(f"sentiment: {sentiment}")
+    if sentiment is None and analysis is not None and analysis.sentiment:
+        sentiment = analysis.sentiment
+    if sentiment is None:
+        try:
+            sentiment = get_chain("post_inspection").invoke({"message": message_text})
 
-    recent_interaction = Interaction.objects.filter(
-        customer=customer,
-        Interaction_type="inquiry"
-    ).order_by('-timestamp').first()
+            logger.info("sentiment: %s", sentiment)
 
-    property_obj = recent_interaction.property if recent_interaction else None
+            sentiment = sentiment.content.strip().lower()
+        except ModelUnavailable as e:
+            sentiment = degraded_sentiment(message_text, e)
 
-    logger.info(f"property_obj location: {property_obj.location}")
+    logger.info("sentiment: %s", sentiment)
 
-    Interaction.objects.create(
-        customer=customer,
-        property=property_obj,
-        Interaction_type="post_inspection",
-        notes=f"Feedback: {message_text} (Sentiment: {sentiment})" 
+    if state is not None:
+        property_id = state.property_id
+    else:
+        property_id = Interaction.objects.filter(
+            customer=customer,
+            Interaction_type="inquiry"
+        ).order_by('-timestamp').values_list('property_id', flat=True).first()
+
+    logger.info("Feedback is about property %s", property_id)
+
+    log_interaction(
+        customer,
+        "post_inspection",
+        notes=f"Feedback: {message_text} (Sentiment: {sentiment})",
+        property_id=property_id,
     )
 
     if sentiment == "positive":
@@ -399,23 +464,32 @@ def handle_post_inspection_feedback(customer, message_text):
             "Could you share what specific features you're looking for? "
             "This will help us find a better match for your needs. "
         )
-    send_whatsapp_message(customer.phone_number, response)
 
-def handle_payment_method(customer, message_text):
+    if state is not None:
+        conversation.advance(
+            state,
+            conversation.STAGE_FEEDBACK,
+            pending_question=conversation.PENDING_PAYMENT_METHOD if sentiment == "positive" else conversation.PENDING_REQUIREMENTS,
+        )
 
-    recent_interaction = Interaction.objects.filter(
-        customer=customer,
-        Interaction_type="post_inspection"
-    ).order_by('-timestamp').first()
+    return response
 
-    property_obj = recent_interaction.property if recent_interaction else None
+def handle_payment_method(customer, message_text, state=None):
 
+    if state is not None:
+        property_id = state.property_id
+    else:
+        property_id = Interaction.objects.filter(
+            customer=customer,
+            Interaction_type="post_inspection"
+        ).order_by('-timestamp').values_list('property_id', flat=True).first()
 
-    Interaction.objects.create(
-        customer=customer,
-        property=property_obj,
-        Interaction_type="payment_info",
-        notes=f"Payment info: {message_text}"
+
+    log_interaction(
+        customer,
+        "payment_info",
+        notes=f"Payment info: {message_text}",
+        property_id=property_id,
     )
 
     response = (
@@ -424,15 +498,14 @@ def handle_payment_method(customer, message_text):
         "If you have any questions in the meantime, please don't hesitate to ask."
     )
 
-    send_whatsapp_message(customer.phone_number, response)
+    if state is not None:
+        conversation.advance(state, conversation.STAGE_PAYMENT)
 
-def handle_general_query(customer, message_text):
+    return response
 
-    Interaction.objects.create(
-        customer=customer,
-        Interaction_type="genaral_query",
-        notes=message_text
-    )
+def handle_general_query(customer, message_text, state=None):
+
+    log_interaction(customer, "genaral_query", notes=message_text)
 
     response = (
         "Thank you for your message. If you're looking for properties, "
@@ -441,4 +514,7 @@ def handle_general_query(customer, message_text):
         f"{settings.WHATSAPP_CHANNEL_LINK} or Instagram: {settings.INSTAGRAM_LINK}"
     )
 
-    send_whatsapp_message(customer.phone_number, response)
\ No newline at end of file
+    if state is not None:
+        state.pending_question = conversation.PENDING_BUDGET
+
+    return response
\ No newline at end of file
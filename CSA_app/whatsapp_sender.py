@@ -1,98 +1,293 @@
+import asyncio
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 import logging
 
+from . import metrics
+
 logger = logging.getLogger(__name__)
 
 
-def send_whatsapp_message(recipient_phone, message_text, media_url=None):
+def build_message_payload(recipient_phone, message_text, media_url=None):
 
-    try:
-        headers = {
-            'Authorization': f'Bearer {
-                settings.WHATSAPP_ACCESS_TOKEN
-            }',
-            'Content-Type': 'application/json'
-        }
+    if recipient_phone.startswith('+'):
+        recipient_phone = recipient_phone[1:]
 
-        if recipient_phone.startswith('+'):
-            recipient_phone = recipient_phone[1:]
+    payload = {
+        "messaging_product": "whatsapp",
+        "to": recipient_phone,
+        "recipient_type": "individual"
+    }
 
+    if media_url:
+        payload["type"] = "image"
+        payload["image"] = {
+            "link": media_url
+        }
+
+        if message_text:
+            payload["image"]["caption"] = message_text
+    else:
 
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": recipient_phone,
-            "recipient_type": "individual"
+        payload["type"] = "text"
+        payload["text"] = {
+            "body": message_text
         }
 
-        if media_url:
-            payload["type"] = "image"
-            payload["image"] = {
-                "link": media_url
-            }
+    return payload
+
+
+def build_template_payload(recipient_phone, template_name, language_code="en_US", components=None):
 
-            if message_text:
-                payload["image"]["caption"] = message_text
-        else:
+    if recipient_phone.startswith('+'):
+        recipient_phone = recipient_phone[1:]
 
-            payload["type"] = "text"
-            payload["text"] = {
-                "body": message_text
+    payload = {
+        "messaging_product": "whatsapp",
+        "to": recipient_phone,
+        "type": "template",
+        "template": {
+            "name": template_name,
+            "language": {
+                "code": language_code
             }
-        
-        url = f"https://graph.facebook.com/v18.0/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages"
-        response = requests.post(url, json=payload, headers=headers)
+        }
+    }
 
-        if response.status_code == 200:
-            logger.info(f"WhatsApp message sent successfully to {recipient_phone}")
-            return True
-        else:
-            logger.error(f"Failed to send WhatsApp message : {response.text}")
+    if components:
+        payload["template"]["components"] = components
 
-    except Exception as e:
-        logger.error(f"Error sending WhatsApp message: {str(e)}")
-        return False
-    
+    return payload
 
-def send_template_message(recipient_phone, template_name, language_code="en_US", components=None):
 
-    try:
-        headers = {
-            'Authorization': f'Bearer {settings.WHATSAPP_ACCESS_TOKEN}',
-            'Content-type': 'application/json'
-        }
+class WhatsAppClient:
+    """Sends messages through the WhatsApp Cloud API over pooled keep-alive connections.
 
-        if recipient_phone.startswith('+'):
-            recipient_phone = recipient_phone[1:]
-
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": recipient_phone,
-            "type": "template",
-            "template": {
-                "name": template_name,
-                "language": {
-                    "code": language_code
-                }
-            }
+    The URL and headers are built once. A semaphore caps how many requests are
+    in flight, and a 429 response blocks further sends to that recipient until
+    its ``Retry-After`` has passed. ``api_url`` can point at a local stub server.
+    """
+
+    def __init__(self, access_token=None, phone_number_id=None, api_url=None, max_concurrency=None,
+                 pool_size=None, timeout=None, max_retries=None):
+        access_token = access_token or settings.WHATSAPP_ACCESS_TOKEN
+        phone_number_id = phone_number_id or settings.WHATSAPP_PHONE_NUMBER_ID
+        api_url = (api_url or settings.WHATSAPP_GRAPH_API_URL).rstrip('/')
+
+        self.api_url = api_url
+        self.url = f"{api_url}/{phone_number_id}/messages"
+        self.headers = {
+            'Authorization': f'Bearer {access_token}',
+            'Content-Type': 'application/json'
         }
+        self.max_concurrency = max_concurrency or settings.WHATSAPP_SEND_CONCURRENCY
+        self.pool_size = pool_size or settings.WHATSAPP_SEND_POOL_SIZE
+        self.timeout = timeout or settings.WHATSAPP_SEND_TIMEOUT
+        self.max_retries = settings.WHATSAPP_SEND_MAX_RETRIES if max_retries is None else max_retries
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._blocked_until = {}
+        self._blocked_lock = threading.Lock()
+        self._async_state = weakref.WeakKeyDictionary()
 
+    # Per-recipient rate limiting
 
-        if components:
-            payload["template"]["components"] = components
+    def _recipient_delay(self, recipient):
+        with self._blocked_lock:
+            blocked_until = self._blocked_until.get(recipient)
+            if blocked_until is None:
+                return 0
+            delay = blocked_until - time.monotonic()
+            if delay <= 0:
+                del self._blocked_until[recipient]
+                return 0
+            return delay
 
+    def _block_recipient(self, recipient, response):
+        try:
+            delay = float(response.headers.get('Retry-After', settings.WHATSAPP_RETRY_AFTER_DEFAULT))
+        except ValueError:
+            delay = settings.WHATSAPP_RETRY_AFTER_DEFAULT
 
-        url = f"https://graph.facebook.com/v18.0/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages"
-        response = requests.post(url, json=payload, headers=headers)
+        with self._blocked_lock:
+            self._blocked_until[recipient] = time.monotonic() + delay
+        logger.warning("WhatsApp rate limited sends to %s, retrying after %.1fs", recipient, delay)
+        return delay
 
+    def _can_wait(self, delay):
+        return delay <= settings.WHATSAPP_RETRY_AFTER_MAX
+
+    def _handle_response(self, response, recipient):
         if response.status_code == 200:
-            logger.info(f"WhatsApp template message sent successfully to {recipient_phone}")
+            logger.debug("WhatsApp message sent successfully to %s", recipient)
             return True
-        
-        else:
-            logger.error(f"Failed to send WhatsApp template message: {response.text}")
+        logger.error("Failed to send WhatsApp message : %s", response.text)
+        return False
+
+    # Synchronous API
+
+    def post(self, payload):
+        """Send one prepared payload. Returns True when WhatsApp accepted it."""
+        recipient = payload["to"]
+
+        try:
+            for _ in range(self.max_retries + 1):
+                delay = self._recipient_delay(recipient)
+                if delay:
+                    if not self._can_wait(delay):
+                        break
+                    time.sleep(delay)
+
+                with self._semaphore:
+                    response = self.session.post(self.url, json=payload, timeout=self.timeout)
+
+                if response.status_code == 429:
+                    self._block_recipient(recipient, response)
+                    continue
+
+                return self._handle_response(response, recipient)
+
+            logger.error("Giving up on WhatsApp message to %s after repeated rate limiting", recipient)
+            return False
+
+        except Exception as e:
+            logger.error("Error sending WhatsApp message: %s", e)
+            return False
+
+    def send_message(self, recipient_phone, message_text, media_url=None):
+        return _count(self.post(build_message_payload(recipient_phone, message_text, media_url)))
+
+    def send_template(self, recipient_phone, template_name, language_code="en_US", components=None):
+        return _count(self.post(build_template_payload(recipient_phone, template_name, language_code, components)))
+
+    def send_many(self, messages):
+        """Send a broadcast. ``messages`` holds keyword dicts for ``send_message``; results keep their order."""
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return list(pool.map(lambda kwargs: self.send_message(**kwargs), messages))
+
+    def close(self):
+        self.session.close()
+
+    # Asynchronous API
+
+    def _get_async_state(self):
+        """Return the (client, semaphore) pair for the running event loop."""
+        loop = asyncio.get_running_loop()
+        state = self._async_state.get(loop)
+        if state is None:
+            import httpx
+
+            client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+            state = (client, asyncio.Semaphore(self.max_concurrency))
+            self._async_state[loop] = state
+        return state
+
+    async def apost(self, payload):
+        recipient = payload["to"]
+
+        try:
+            client, semaphore = self._get_async_state()
+
+            for _ in range(self.max_retries + 1):
+                delay = self._recipient_delay(recipient)
+                if delay:
+                    if not self._can_wait(delay):
+                        break
+                    await asyncio.sleep(delay)
+
+                async with semaphore:
+                    response = await client.post(self.url, json=payload)
+
+                if response.status_code == 429:
+                    self._block_recipient(recipient, response)
+                    continue
+
+                return self._handle_response(response, recipient)
+
+            logger.error("Giving up on WhatsApp message to %s after repeated rate limiting", recipient)
             return False
-    
-    except Exception as e:
-        logger.error(f"Error sending WhatsApp template message: {str(e)}")
-        return False
\ No newline at end of file
+
+        except Exception as e:
+            logger.error("Error sending WhatsApp message: %s", e)
+            return False
+
+    async def asend_message(self, recipient_phone, message_text, media_url=None):
+        return _count(await self.apost(build_message_payload(recipient_phone, message_text, media_url)))
+
+    async def asend_template(self, recipient_phone, template_name, language_code="en_US", components=None):
+        return _count(await self.apost(build_template_payload(recipient_phone, template_name, language_code, components)))
+
+    async def asend_many(self, messages):
+        return await asyncio.gather(*(self.asend_message(**kwargs) for kwargs in messages))
+
+    async def aclose(self):
+        state = self._async_state.pop(asyncio.get_running_loop(), None)
+        if state:
+            await state[0].aclose()
+
+
+def _count(sent):
+    metrics.whatsapp_sends.inc(result="sent" if sent else "failed")
+    return sent
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide WhatsApp client."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = WhatsAppClient()
+    return _client
+
+
+def set_client(client):
+    """Replace the process-wide client (e.g. with one pointed at a stub server). Returns the previous one."""
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+    return previous
+
+
+def send_whatsapp_message(recipient_phone, message_text, media_url=None):
+    return get_client().send_message(recipient_phone, message_text, media_url)
+
+
+def send_template_message(recipient_phone, template_name, language_code="en_US", components=None):
+    return get_client().send_template(recipient_phone, template_name, language_code, components)
+
+
+def send_many(messages):
+    return get_client().send_many(messages)
+
+
+async def asend_whatsapp_message(recipient_phone, message_text, media_url=None):
+    return await get_client().asend_message(recipient_phone, message_text, media_url)
+
+
+async def asend_template_message(recipient_phone, template_name, language_code="en_US", components=None):
+    return await get_client().asend_template(recipient_phone, template_name, language_code, components)
+
+
+async def asend_many(messages):
+    return await get_client().asend_many(messages)
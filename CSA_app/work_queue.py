@@ -0,0 +1,529 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .log import correlation, correlation_ids
+from .models import WebhookJob, DeadLetterJob
+from .webhook_parser import merge_payloads, split_by_sender
+
+logger = logging.getLogger(__name__)
+
+
+def process_job_payload(payload, job_id=None):
+    """Run the message pipeline for one webhook payload."""
+    # Imported here so enqueueing from the view never loads the LLM stack.
+    from .whatsapp_handler import process_webhook_payload
+
+    process_webhook_payload(payload, job_id=job_id)
+
+
+def retry_delay(attempts):
+    """Exponential backoff (in seconds) before the next attempt of a failed job."""
+    delay = settings.CSA_QUEUE_RETRY_BACKOFF * (2 ** max(attempts - 1, 0))
+    return min(delay, settings.CSA_QUEUE_RETRY_BACKOFF_MAX)
+
+
+class BaseQueueBackend:
+    """Interface every webhook queue backend implements."""
+
+    def enqueue(self, payload):
+        raise NotImplementedError
+
+    async def aenqueue(self, payload):
+        """Enqueue from async code, e.g. the webhook view under ASGI."""
+        return await sync_to_async(self.enqueue)(payload)
+
+    def claim(self, limit=1):
+        """Reserve up to ``limit`` jobs for this worker and return them."""
+        raise NotImplementedError
+
+    def complete(self, job):
+        raise NotImplementedError
+
+    def fail(self, job, error):
+        raise NotImplementedError
+
+    async def astart(self):
+        """Called when the ASGI server starts (see ``lifespan``)."""
+
+    async def astop(self):
+        """Called when the ASGI server shuts down."""
+
+
+class DatabaseQueueBackend(BaseQueueBackend):
+    """Durable queue stored in the ``WebhookJob`` table.
+
+    Jobs are claimed with a conditional UPDATE so several worker processes can
+    share the table without a broker. A job whose worker died is picked up again
+    once its lease (``CSA_QUEUE_VISIBILITY_TIMEOUT``) runs out.
+
+    Payloads are stored one job per customer. Only a customer's oldest job can
+    be claimed, and it is claimed together with the customer's later jobs and
+    run as one payload, so each customer's messages are handled one turn at a
+    time and in order. A new message holds the customer's jobs back until they
+    have been quiet for ``CSA_COALESCE_WINDOW`` seconds.
+    """
+
+    def enqueue(self, payload):
+        request_id = correlation_ids().get('request_id', '')
+        jobs = [self._enqueue_part(sender, part, request_id) for sender, part in split_by_sender(payload)]
+        return jobs[-1]
+
+    def _enqueue_part(self, sender, payload, request_id):
+        now = timezone.now()
+        available_at = now
+        if sender and settings.CSA_COALESCE_WINDOW > 0:
+            available_at = now + timedelta(seconds=settings.CSA_COALESCE_WINDOW)
+            # Push the customer's waiting turn back, unless it has already waited CSA_COALESCE_MAX_WAIT
+            WebhookJob.objects.filter(
+                sender=sender, status=WebhookJob.STATUS_PENDING, attempts=0,
+                created_at__gte=now - timedelta(seconds=settings.CSA_COALESCE_MAX_WAIT),
+            ).update(available_at=available_at)
+        return WebhookJob.objects.create(payload=payload, sender=sender, available_at=available_at, request_id=request_id)
+
+    def claim(self, limit=1):
+        now = timezone.now()
+        lease_expired = now - timedelta(seconds=settings.CSA_QUEUE_VISIBILITY_TIMEOUT)
+        oldest_for_sender = WebhookJob.objects.filter(sender=OuterRef('sender')).order_by('id').values('id')[:1]
+
+        candidates = WebhookJob.objects.filter(
+            Q(status=WebhookJob.STATUS_PENDING, available_at__lte=now)
+            | Q(status=WebhookJob.STATUS_RUNNING, locked_at__lt=lease_expired)
+        ).filter(
+            Q(sender='') | Q(id=Subquery(oldest_for_sender))
+        ).order_by('available_at', 'id').values_list('id', 'status', 'locked_at')[:limit * 2]
+
+        claimed_ids = []
+        for job_id, status, locked_at in candidates:
+            claimed = WebhookJob.objects.filter(
+                pk=job_id, status=status, locked_at=locked_at
+            ).update(
+                status=WebhookJob.STATUS_RUNNING,
+                locked_at=now,
+                attempts=F('attempts') + 1,
+            )
+            if claimed:
+                claimed_ids.append(job_id)
+            if len(claimed_ids) >= limit:
+                break
+
+        jobs = list(WebhookJob.objects.filter(pk__in=claimed_ids).order_by('available_at', 'id'))
+        for job in jobs:
+            self._coalesce(job, now)
+        return jobs
+
+    def _coalesce(self, job, now):
+        """Take the sender's later jobs along with ``job`` and merge their payloads into it.
+
+        They are only ever claimed this way (the oldest job goes first), so
+        whoever holds ``job`` owns them. ``job.coalesced`` keeps their ids.
+        """
+        job.coalesced = []
+        if not job.sender:
+            return
+        later = list(
+            WebhookJob.objects.filter(sender=job.sender, pk__gt=job.pk).order_by('id').values_list('id', 'payload')
+        )
+        if not later:
+            return
+        job.coalesced = [job_id for job_id, _ in later]
+        WebhookJob.objects.filter(pk__in=job.coalesced).update(status=WebhookJob.STATUS_RUNNING, locked_at=now)
+        job.payload = merge_payloads([job.payload] + [payload for _, payload in later])
+        logger.info("Job %s takes along %s later job(s) from the same customer", job.pk, len(later))
+
+    def complete(self, job):
+        WebhookJob.objects.filter(pk__in=[job.pk, *getattr(job, 'coalesced', [])]).delete()
+
+    def fail(self, job, error):
+        coalesced = getattr(job, 'coalesced', [])
+        if job.attempts >= settings.CSA_QUEUE_MAX_ATTEMPTS:
+            with transaction.atomic():
+                DeadLetterJob.objects.create(
+                    payload=job.payload,
+                    attempts=job.attempts,
+                    last_error=error,
+                    enqueued_at=job.created_at,
+                )
+                WebhookJob.objects.filter(pk__in=[job.pk, *coalesced]).delete()
+            logger.error("Job %s moved to dead letters after %s attempts: %s", job.pk, job.attempts, error)
+            return
+
+        delay = retry_delay(job.attempts)
+        with transaction.atomic():
+            # The retry carries the merged payload, the jobs it took along are done
+            WebhookJob.objects.filter(pk=job.pk).update(
+                status=WebhookJob.STATUS_PENDING,
+                payload=job.payload,
+                locked_at=None,
+                last_error=error,
+                available_at=timezone.now() + timedelta(seconds=delay),
+            )
+            WebhookJob.objects.filter(pk__in=coalesced).delete()
+        logger.warning("Job %s failed (attempt %s), retrying in %.1fs: %s", job.pk, job.attempts, delay, error)
+
+    def requeue_dead_letters(self, queryset=None):
+        """Move dead-lettered jobs back onto the queue with a fresh retry budget."""
+        queryset = queryset if queryset is not None else DeadLetterJob.objects.all()
+        count = 0
+        with transaction.atomic():
+            for dead in queryset:
+                for sender, payload in split_by_sender(dead.payload):
+                    WebhookJob.objects.create(payload=payload, sender=sender)
+                dead.delete()
+                count += 1
+        return count
+
+
+class ImmediateQueueBackend(BaseQueueBackend):
+    """Processes the payload inside the request. Handy for local development."""
+
+    def enqueue(self, payload):
+        from .interaction_log import interaction_log
+
+        try:
+            process_job_payload(payload)
+        finally:
+            # The request is over, don't leave its interactions in the buffer
+            interaction_log.flush()
+
+    def claim(self, limit=1):
+        return []
+
+    def complete(self, job):
+        pass
+
+    def fail(self, job, error):
+        pass
+
+
+class _Burst:
+    """Payloads from one customer waiting to be run as a single turn."""
+
+    def __init__(self, now):
+        self.payloads = []
+        self.first_at = self.last_at = now
+
+    def due_at(self):
+        return min(self.last_at + settings.CSA_COALESCE_WINDOW, self.first_at + settings.CSA_COALESCE_MAX_WAIT)
+
+
+class AsyncioQueueBackend(BaseQueueBackend):
+    """Runs the async pipeline as a task on the server's event loop.
+
+    Only for ASGI servers: the view returns right away and one worker process
+    keeps up to ``CSA_ASYNC_MAX_IN_FLIGHT`` conversations waiting on Gemini and
+    the Graph API at once. Nothing is persisted, a job lost to a restart is
+    only retried if WhatsApp redelivers it. Enqueueing from sync code (the
+    admin, management commands) processes the payload in place.
+
+    A customer's messages are held until they have been quiet for
+    ``CSA_COALESCE_WINDOW`` seconds and then run as one payload. Each
+    customer's turns run one at a time, in order.
+
+    There is no ``csa_worker`` in this mode, so a housekeeping task on the
+    loop replays interaction spools left by earlier processes and flushes the
+    interaction buffer every ``CSA_INTERACTION_FLUSH_INTERVAL`` seconds. It
+    starts with the server (or the first webhook when the server does not
+    speak the lifespan protocol), and the buffer is flushed on shutdown.
+    """
+
+    def __init__(self, max_in_flight=None):
+        self.max_in_flight = max_in_flight or settings.CSA_ASYNC_MAX_IN_FLIGHT
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._bursts = {}
+        self._sender_locks = weakref.WeakValueDictionary()
+        # The loop only keeps weak references to tasks
+        self._tasks = set()
+        self._housekeeping_task = None
+
+    def enqueue(self, payload):
+        ImmediateQueueBackend().enqueue(payload)
+
+    async def astart(self):
+        loop = asyncio.get_running_loop()
+        task = self._housekeeping_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._housekeeping_task = loop.create_task(self.housekeeping())
+
+    async def astop(self):
+        """Stop housekeeping, give running turns ``CSA_ASYNC_SHUTDOWN_TIMEOUT`` seconds and flush the interactions."""
+        from .interaction_log import interaction_log
+
+        task, self._housekeeping_task = self._housekeeping_task, None
+        if task is not None:
+            task.cancel()
+        if self._tasks:
+            _, pending = await asyncio.wait(set(self._tasks), timeout=settings.CSA_ASYNC_SHUTDOWN_TIMEOUT)
+            if pending:
+                logger.warning("Shutting down with %s turn(s) still running", len(pending))
+        await sync_to_async(interaction_log.flush)()
+
+    async def housekeeping(self):
+        from .interaction_log import interaction_log
+
+        try:
+            await sync_to_async(interaction_log.recover)()
+        except Exception as e:
+            logger.error("Recovering interaction spools failed: %s", e, exc_info=True)
+
+        while True:
+            await asyncio.sleep(interaction_log.flush_interval)
+            try:
+                await sync_to_async(interaction_log.flush_if_due)()
+            except Exception as e:
+                logger.error("Flushing interactions failed: %s", e, exc_info=True)
+
+    async def aenqueue(self, payload):
+        await self.astart()
+        task = None
+        for sender, part in split_by_sender(payload):
+            if not sender:
+                task = self._spawn(self.run(part))
+                continue
+            now = time.monotonic()
+            burst = self._bursts.get(sender)
+            if burst is None:
+                burst = self._bursts[sender] = _Burst(now)
+                task = self._spawn(self.run_burst(sender, burst))
+            burst.payloads.append(part)
+            burst.last_at = now
+        return task
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def run_burst(self, sender, burst):
+        while time.monotonic() < burst.due_at():
+            await asyncio.sleep(burst.due_at() - time.monotonic())
+
+        lock = self._sender_locks.get(sender)
+        if lock is None:
+            lock = self._sender_locks[sender] = asyncio.Lock()
+        # Messages that arrive while the customer's previous turn runs join this burst
+        async with lock:
+            if self._bursts.get(sender) is burst:
+                del self._bursts[sender]
+            await self.run(merge_payloads(burst.payloads))
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+        return semaphore
+
+    async def run(self, payload):
+        from .async_handler import aprocess_webhook_payload
+        from .interaction_log import interaction_log
+
+        async with self._semaphore():
+            try:
+                await aprocess_webhook_payload(payload)
+            except Exception as e:
+                logger.error("Error processing webhook payload: %s", e, exc_info=True)
+            finally:
+                await sync_to_async(interaction_log.flush_if_due)()
+
+    def claim(self, limit=1):
+        return []
+
+    def complete(self, job):
+        pass
+
+    def fail(self, job, error):
+        pass
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_queue_backend():
+    """Return the process-wide backend configured by ``CSA_QUEUE_BACKEND``."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.CSA_QUEUE_BACKEND)()
+    return _backend
+
+
+def lifespan(application):
+    """Wrap an ASGI application so the queue backend starts and stops with the server.
+
+    Handles the ASGI lifespan protocol (uvicorn, hypercorn) and passes every
+    other scope to ``application``.
+    """
+    async def app(scope, receive, send):
+        if scope["type"] != "lifespan":
+            return await application(scope, receive, send)
+
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await get_queue_backend().astart()
+                except Exception as e:
+                    logger.error("Queue backend failed to start: %s", e, exc_info=True)
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                try:
+                    await get_queue_backend().astop()
+                except Exception as e:
+                    logger.error("Queue backend failed to stop: %s", e, exc_info=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    return app
+
+
+def enqueue_webhook(payload):
+    return get_queue_backend().enqueue(payload)
+
+
+async def aenqueue_webhook(payload):
+    return await get_queue_backend().aenqueue(payload)
+
+
+def spool_webhook(payload):
+    """Write a webhook that could not be queued to ``CSA_WEBHOOK_SPOOL_DIR``. Returns the file path.
+
+    The file is written under a temporary name and renamed, so the worker never
+    replays half a payload.
+    """
+    os.makedirs(settings.CSA_WEBHOOK_SPOOL_DIR, exist_ok=True)
+    name = f"{time.time_ns()}-{os.getpid()}-{threading.get_ident()}.json"
+    path = os.path.join(settings.CSA_WEBHOOK_SPOOL_DIR, name)
+    with open(path + ".tmp", "w") as f:
+        json.dump(payload, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+    return path
+
+
+async def aspool_webhook(payload):
+    return await sync_to_async(spool_webhook, thread_sensitive=False)(payload)
+
+
+def replay_spooled_webhooks(backend=None):
+    """Queue the spooled webhooks, oldest first. Stops at the first one that still can't be queued."""
+    directory = settings.CSA_WEBHOOK_SPOOL_DIR
+    if not os.path.isdir(directory):
+        return 0
+    backend = backend or get_queue_backend()
+    replayed = 0
+    for name in sorted(name for name in os.listdir(directory) if name.endswith(".json")):
+        path = os.path.join(directory, name)
+        try:
+            with open(path) as f:
+                payload = json.load(f)
+        except ValueError as e:
+            logger.error("Skipping unreadable spooled webhook %s: %s", path, e)
+            os.replace(path, path + ".bad")
+            continue
+        try:
+            backend.enqueue(payload)
+        except Exception as e:
+            logger.warning("Spooled webhooks still can't be queued: %s", e)
+            break
+        os.remove(path)
+        replayed += 1
+    if replayed:
+        logger.info("Queued %s spooled webhook(s)", replayed)
+    return replayed
+
+
+class Worker:
+    """Pulls webhook jobs from the queue and runs them on a thread pool."""
+
+    def __init__(self, backend=None, concurrency=None, poll_interval=None):
+        self.backend = backend or get_queue_backend()
+        self.concurrency = concurrency or settings.CSA_WORKER_CONCURRENCY
+        self.poll_interval = poll_interval or settings.CSA_WORKER_POLL_INTERVAL
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def housekeeping(self):
+        """Periodic cleanup run by the worker loop."""
+        from .dedup import prune_processed_messages
+        from .interaction_log import interaction_log
+
+        try:
+            prune_processed_messages()
+            interaction_log.recover()
+        except Exception as e:
+            logger.error("Worker housekeeping failed: %s", e, exc_info=True)
+
+    def run_job(self, job):
+        try:
+            with correlation(job_id=job.pk, request_id=job.request_id):
+                process_job_payload(job.payload, job_id=job.pk)
+        except Exception as e:
+            logger.error("Error processing job %s: %s", job.pk, e, exc_info=True)
+            self.backend.fail(job, str(e))
+        else:
+            self.backend.complete(job)
+        finally:
+            close_old_connections()
+
+    def run(self, once=False):
+        """Process jobs until stopped. With ``once`` the queue is drained and the call returns."""
+        from .interaction_log import interaction_log
+
+        logger.info("Worker started with concurrency %s", self.concurrency)
+        in_flight = set()
+        next_housekeeping = next_replay = 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='csa-worker') as pool:
+            while not self._stop.is_set():
+                if time.monotonic() >= next_housekeeping:
+                    self.housekeeping()
+                    next_housekeeping = time.monotonic() + settings.CSA_WORKER_HOUSEKEEPING_INTERVAL
+                if time.monotonic() >= next_replay:
+                    try:
+                        replay_spooled_webhooks(self.backend)
+                    except Exception as e:
+                        logger.error("Replaying spooled webhooks failed: %s", e, exc_info=True)
+                    next_replay = time.monotonic() + settings.CSA_WEBHOOK_SPOOL_INTERVAL
+
+                free_slots = self.concurrency - len(in_flight)
+                jobs = self.backend.claim(limit=free_slots) if free_slots else []
+                close_old_connections()
+
+                for job in jobs:
+                    in_flight.add(pool.submit(self.run_job, job))
+
+                interaction_log.flush_if_due()
+
+                if in_flight:
+                    _, in_flight = wait(in_flight, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                elif once:
+                    break
+                else:
+                    self._stop.wait(self.poll_interval)
+
+            wait(in_flight)
+
+        interaction_log.flush()
+        logger.info("Worker stopped")